@@ -107,6 +107,11 @@ function defaultSyncState() {
     lastSyncedAt: null,
     lastStatus: '',
     lastError: '',
+    token: '',
+    // Record-level merge: server cursor, time of the last push, and deletions not yet pushed.
+    cursor: null,
+    pushedAt: 0,
+    pendingDeletes: [],
   };
 }
 
@@ -127,7 +132,7 @@ function ensureMigrations(parsed) {
   });
   if (!parsed.insightsMonth) parsed.insightsMonth = new Date().toISOString().slice(0, 7);
   if (parsed.onboarded === undefined) parsed.onboarded = false;
-  if (!parsed.sync) parsed.sync = defaultSyncState();
+  parsed.sync = { ...defaultSyncState(), ...parsed.sync };
   return parsed;
 }
 
@@ -207,18 +212,58 @@ function bindIntakeTabs() {
   });
 }
 
+const CATALOG_KEY = 'calorie-tracker-catalog';
+
+// The backend's /api/catalog (data.json plus foods added on the server) is preferred:
+// with the version we hold it answers with only the foods changed since, and an
+// unchanged response revalidates as a 304. data.json is the offline fallback.
 async function loadCatalog() {
+  let cached = null;
   try {
-    const res = await fetch('data.json');
-    catalogs = await res.json();
+    cached = JSON.parse(localStorage.getItem(CATALOG_KEY) || 'null');
   } catch (e) {
-    console.warn('Could not load catalog', e);
-    catalogs = { foods: [], activities: [] };
+    cached = null;
+  }
+  try {
+    catalogs = await fetchBackendCatalog(cached);
+  } catch (e) {
+    console.warn('Catalog endpoint unavailable, using data.json', e);
+    catalogs = cached || (await fetchStaticCatalog());
   }
   populateFoodSelect();
   populateActivitySelect();
 }
 
+async function fetchStaticCatalog() {
+  try {
+    const res = await fetch('data.json');
+    return await res.json();
+  } catch (e) {
+    console.warn('Could not load catalog', e);
+    return { foods: [], activities: [] };
+  }
+}
+
+async function fetchBackendCatalog(cached) {
+  const endpoint = (state.sync.endpoint || DEFAULT_SYNC_ENDPOINT).replace(/\/$/, '');
+  const query = cached?.version ? `?since=${encodeURIComponent(cached.version)}` : '';
+  const res = await fetch(`${endpoint}/api/catalog${query}`);
+  if (!res.ok) throw new Error(`Catalog request failed (${res.status})`);
+  const payload = await res.json();
+  const next = payload.since ? applyCatalogDelta(cached, payload) : payload;
+  localStorage.setItem(CATALOG_KEY, JSON.stringify(next));
+  return next;
+}
+
+function applyCatalogDelta(cached, delta) {
+  const changed = new Set([...delta.foods.upsert.map((f) => f.name), ...delta.foods.delete]);
+  return {
+    version: delta.version,
+    foods: [...cached.foods.filter((f) => !changed.has(f.name)), ...delta.foods.upsert],
+    activities: cached.activities,
+  };
+}
+
 function getUser() {
   return state.users[state.activeUserId];
 }
@@ -283,6 +328,8 @@ function bindSyncControls() {
   const syncBtn = document.getElementById('sync-now');
   const fetchBtn = document.getElementById('fetch-remote');
   const statusEl = document.getElementById('sync-status');
+  const passwordInput = document.getElementById('sync-password');
+  const signInBtn = document.getElementById('sync-sign-in');
 
   if (!endpointInput || !syncBtn || !fetchBtn || !statusEl) return;
 
@@ -319,21 +366,96 @@ function bindSyncControls() {
     renderAll();
   });
 
+  signInBtn?.addEventListener('click', async () => {
+    await signInToBackend(passwordInput?.value || '');
+    if (passwordInput) passwordInput.value = '';
+    renderStatus();
+  });
+
   renderStatus();
 }
 
-async function syncToBackend() {
+function syncHeaders() {
+  const headers = { 'Content-Type': 'application/json' };
+  if (state.sync.token) headers.Authorization = `Bearer ${state.sync.token}`;
+  return headers;
+}
+
+async function signInToBackend(password) {
   const user = getUser();
   const endpoint = (state.sync.endpoint || DEFAULT_SYNC_ENDPOINT).replace(/\/$/, '');
   if (!endpoint) return;
   try {
-    const res = await fetch(`${endpoint}/api/sync-state`, {
+    const res = await fetch(`${endpoint}/api/login`, {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ username: user.profile.name || 'default', password }),
+    });
+    if (!res.ok) throw new Error(await res.text());
+    const payload = await res.json();
+    // Only the signed token is kept; the password never reaches localStorage.
+    state.sync.token = payload.token;
+    state.sync.lastStatus = `Signed in as ${payload.username}`;
+    state.sync.lastError = '';
+    saveState();
+  } catch (err) {
+    console.error('Sign-in failed', err);
+    state.sync.token = '';
+    state.sync.lastError = err?.message || 'Sign-in failed';
+    saveState();
+  }
+}
+
+const SYNC_COLLECTIONS = { foods: 'id', exercises: 'id', weights: 'date' };
+
+// Only records changed since the last push (everything on the first merge) and
+// pending deletions are sent; the server answers with what other devices changed.
+function collectChanges(user) {
+  const firstMerge = state.sync.cursor === null;
+  const changes = {};
+  Object.keys(SYNC_COLLECTIONS).forEach((collection) => {
+    const upsert = user[collection]
+      .filter((r) => firstMerge || (r.updatedAt || 0) > state.sync.pushedAt)
+      .map((r) => ({ ...r, updatedAt: r.updatedAt || 0 }));
+    const del = state.sync.pendingDeletes
+      .filter((d) => d.collection === collection)
+      .map(({ collection: _, ...d }) => d);
+    if (upsert.length || del.length) changes[collection] = { upsert, delete: del };
+  });
+  return changes;
+}
+
+function applyPulledRecords(user, pull) {
+  Object.entries(pull || {}).forEach(([collection, records]) => {
+    const key = SYNC_COLLECTIONS[collection];
+    if (!key) return;
+    const byKey = new Map(user[collection].map((r) => [r[key], r]));
+    records.forEach((r) => {
+      if (r.deleted) byKey.delete(r[key]);
+      else byKey.set(r[key], r);
+    });
+    user[collection] = [...byKey.values()];
+  });
+  user.weights.sort((a, b) => a.date.localeCompare(b.date));
+}
+
+async function syncToBackend() {
+  const user = getUser();
+  const endpoint = (state.sync.endpoint || DEFAULT_SYNC_ENDPOINT).replace(/\/$/, '');
+  if (!endpoint) return;
+  const startedAt = Date.now();
+  const sentDeletes = state.sync.pendingDeletes.length;
+  const { foods, exercises, weights, ...rest } = user;
+  try {
+    const res = await fetch(`${endpoint}/api/sync-state/merge`, {
+      method: 'POST',
+      headers: syncHeaders(),
       body: JSON.stringify({
         username: user.profile.name || 'default',
+        since: state.sync.cursor,
+        changes: collectChanges(user),
         state: {
-          user,
+          user: rest,
           activeUserId: state.activeUserId,
           insightsMonth: state.insightsMonth,
         },
@@ -341,10 +463,15 @@ async function syncToBackend() {
     });
     if (!res.ok) throw new Error(await res.text());
     const payload = await res.json();
+    applyPulledRecords(user, payload.pull);
+    state.sync.cursor = payload.cursor;
+    state.sync.pushedAt = startedAt;
+    state.sync.pendingDeletes = state.sync.pendingDeletes.slice(sentDeletes);
     state.sync.lastSyncedAt = new Date().toISOString();
     state.sync.lastStatus = `Synced ${payload.username}`;
     state.sync.lastError = '';
     saveState();
+    if (Object.keys(payload.pull || {}).length) renderAll();
   } catch (err) {
     console.error('Sync failed', err);
     state.sync.lastError = err?.message || 'Sync failed';
@@ -357,7 +484,9 @@ async function fetchFromBackend() {
   const endpoint = (state.sync.endpoint || DEFAULT_SYNC_ENDPOINT).replace(/\/$/, '');
   if (!endpoint) return;
   try {
-    const res = await fetch(`${endpoint}/api/sync-state/${encodeURIComponent(user.profile.name || 'default')}`);
+    const res = await fetch(`${endpoint}/api/sync-state/${encodeURIComponent(user.profile.name || 'default')}`, {
+      headers: syncHeaders(),
+    });
     if (!res.ok) throw new Error(await res.text());
     const payload = await res.json();
     if (payload.state?.user) {
@@ -463,6 +592,7 @@ function bindFoodControls() {
       protein: +(macros.protein * qty).toFixed(1),
       fat: +(macros.fat * qty).toFixed(1),
       carbs: +(macros.carbs * qty).toFixed(1),
+      updatedAt: Date.now(),
     });
 
     if (!selectedFood && !savedFood && name && kcal) {
@@ -519,6 +649,7 @@ function bindExerciseControls() {
       mins,
       kcalBurn: +kcalBurn.toFixed(1),
       label: getMetLabel(met),
+      updatedAt: Date.now(),
     });
     saveState();
     document.getElementById('exercise-mins').value = '';
@@ -571,7 +702,7 @@ function bindWeightControls() {
       if (!weight) return;
       const u = getUser();
       u.weights = u.weights.filter((w) => w.date !== date);
-      u.weights.push({ date, weight });
+      u.weights.push({ date, weight, updatedAt: Date.now() });
       u.weights.sort((a, b) => a.date.localeCompare(b.date));
       u.profile.weight = weight;
       if (!u.profile.initialWeight) u.profile.initialWeight = weight;
@@ -662,7 +793,7 @@ function bindJournalControls() {
 
     if (Number.isFinite(weightInput) && weightInput > 0) {
       u.weights = u.weights.filter((w) => w.date !== date);
-      u.weights.push({ date, weight: weightInput });
+      u.weights.push({ date, weight: weightInput, updatedAt: Date.now() });
       u.weights.sort((a, b) => a.date.localeCompare(b.date));
       u.profile.weight = weightInput;
       if (!u.profile.initialWeight) u.profile.initialWeight = weightInput;
@@ -1424,6 +1555,7 @@ function getPredictionForDate(date, base, exercise, intake) {
 function deleteFood(id) {
   const user = getUser();
   user.foods = user.foods.filter((f) => f.id !== id);
+  recordDeletion('foods', { id });
   saveState();
   renderAll();
 }
@@ -1431,10 +1563,15 @@ function deleteFood(id) {
 function deleteExercise(id) {
   const user = getUser();
   user.exercises = user.exercises.filter((f) => f.id !== id);
+  recordDeletion('exercises', { id });
   saveState();
   renderAll();
 }
 
+function recordDeletion(collection, key) {
+  state.sync.pendingDeletes.push({ collection, ...key, updatedAt: Date.now() });
+}
+
 function clearFoodInputs() {
   document.getElementById('food-qty').value = '1';
   document.getElementById('food-name').value = '';
@@ -0,0 +1,50 @@
+"""Move old food and exercise entries into compressed monthly archive partitions.
+
+    python scripts/archive_logs.py                      # older than WEIGHT_TRACKER_ARCHIVE_AFTER_DAYS, else 365
+    python scripts/archive_logs.py --days 180 --user alice
+    python scripts/archive_logs.py status --user alice
+
+Only whole months before the cutoff are archived. Archived days still count in
+trends; entry lists include them with ``include_archive=True``.
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from weight_tracker import archive, services  # noqa: E402
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", nargs="?", choices=("archive", "status"), default="archive")
+    parser.add_argument(
+        "--days", type=int, default=archive.ARCHIVE_AFTER_DAYS or 365, help="archive entries older than this"
+    )
+    parser.add_argument("--user", help="only this username")
+    args = parser.parse_args(argv)
+
+    user_id = None
+    if args.user:
+        user = services.get_user(args.user)
+        if not user:
+            print(f"No such user: {args.user}")
+            return 1
+        user_id = user.id
+    if args.command == "status":
+        if user_id is None:
+            parser.error("status needs --user")
+        for kind, stats in archive.archive_stats(user_id).items():
+            print(f"{kind:>9}: {stats['partitions']} partitions, {stats['rows']} entries, {stats['bytes']:,} bytes")
+        return 0
+    counts = services.archive_old_logs(args.days, user_id=user_id)
+    print(", ".join(f"{key}: {value}" for key, value in counts.items()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
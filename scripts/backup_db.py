@@ -0,0 +1,83 @@
+"""Back up, verify, list and restore the SQLite databases while the app keeps running.
+
+    python scripts/backup_db.py backup [--dir data/backups] [--no-compress] [--keep 7] [--step-pages 256]
+    python scripts/backup_db.py list [--dir data/backups]
+    python scripts/backup_db.py verify <set>
+    python scripts/backup_db.py restore <set> [--shard main --shard shard-01 ...]
+
+``<set>`` is a backup set directory, or ``latest``. Restoring overwrites the live
+databases page by page; stop writers first if the restored data must not be mixed
+with writes that land during the restore. A running backend keeps serving the
+profiles, series and shard placements it cached before the restore, so restart it
+afterwards.
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from weight_tracker import backup  # noqa: E402
+
+
+def _resolve(name: str, root: Path) -> Path:
+    if name == "latest":
+        sets = backup.list_backups(root)
+        if not sets:
+            raise SystemExit(f"No backups under {root}")
+        return sets[0]
+    return Path(name)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dir", type=Path, default=backup.BACKUP_DIR, help="backup root directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+    backup_parser = commands.add_parser("backup")
+    backup_parser.add_argument("--no-compress", action="store_true")
+    backup_parser.add_argument("--keep", type=int, default=backup.BACKUP_KEEP, help="sets to keep (0 keeps all)")
+    backup_parser.add_argument("--step-pages", type=int, default=backup.STEP_PAGES)
+    commands.add_parser("list")
+    verify_parser = commands.add_parser("verify")
+    verify_parser.add_argument("set")
+    restore_parser = commands.add_parser(
+        "restore", help="copy a backup set over the live databases; restart the backend afterwards"
+    )
+    restore_parser.add_argument("set")
+    restore_parser.add_argument("--shard", action="append", help="only these databases ('main' or a shard name)")
+    args = parser.parse_args(argv)
+
+    if args.command == "backup":
+        directory = backup.backup_all(args.dir, compress=not args.no_compress, keep=args.keep, pages=args.step_pages)
+        for entry in backup.verify_backup(directory):
+            print(
+                f"{entry['shard']:>12}  {entry['raw_bytes']:,} -> {entry['bytes']:,} bytes  "
+                f"{entry['steps']} steps, {entry['restarts']} restarts, {entry['seconds']:.2f} s"
+            )
+        print(directory)
+        return 0
+    if args.command == "list":
+        for directory in backup.list_backups(args.dir):
+            print(directory)
+        return 0
+    directory = _resolve(args.set, args.dir)
+    try:
+        if args.command == "verify":
+            entries = backup.verify_backup(directory)
+            print(f"{directory}: {len(entries)} files OK")
+            return 0
+        restored = backup.restore_backup(directory, shards=args.shard)
+    except backup.BackupError as exc:
+        print(exc)
+        return 1
+    print(f"restored {', '.join(restored) or 'nothing'} from {directory}")
+    if restored:
+        print("restart the backend so it drops what it cached from the old databases")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+"""Online backup throughput and the longest writer stall it causes.
+
+    python scripts/bench_backup.py [rows] [step_pages ...]
+
+Fills a throwaway database with ``rows`` food entries (default 200000), then backs
+it up with each step size (default 64, 256, 1024 and -1, i.e. one step) while a
+writer thread keeps logging weights, timing every write. Step sizes only matter
+with ``WEIGHT_TRACKER_SQLITE_WAL=0``; a WAL database is always copied in one step.
+"""
+from __future__ import annotations
+
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from sqlalchemy import insert  # noqa: E402
+
+from weight_tracker import db  # noqa: E402
+
+# Point the app at a throwaway database before services binds and seeds it
+# (a file: the backup API copies files).
+_tmpdir = tempfile.TemporaryDirectory()
+db.configure(f"sqlite:///{Path(_tmpdir.name) / 'bench.db'}")
+
+from weight_tracker import backup, models, services  # noqa: E402
+
+
+def fill(user_id: int, rows: int) -> None:
+    start = date(2015, 1, 1)
+    batch = [
+        {
+            "user_id": user_id,
+            "entry_date": start + timedelta(days=i // 8),
+            "food_name": f"Food {i % 500}",
+            "measure": "1 serving",
+            "qty": 1.0,
+            "kcal": 100.0 + i % 300,
+            "protein": 5.0,
+            "fat": 3.0,
+            "carbs": 20.0,
+        }
+        for i in range(rows)
+    ]
+    with db.get_session() as session:
+        session.execute(insert(models.FoodLog), batch)
+
+
+def run(user_id: int, pages: int, out: Path):
+    stalls = []
+    done = threading.Event()
+
+    def writer():
+        day = date(2030, 1, 1)
+        while not done.is_set():
+            started = time.perf_counter()
+            services.log_weight(user_id=user_id, entry_date=day, weight=80.0)
+            stalls.append(time.perf_counter() - started)
+            day += timedelta(days=1)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    time.sleep(0.2)
+    started = time.perf_counter()
+    entry = backup.backup_database("main", out, compress=False, pages=pages)
+    elapsed = time.perf_counter() - started
+    done.set()
+    thread.join()
+    (out / entry.file).unlink()
+    return entry, elapsed, stalls
+
+
+def main(rows: int = 200_000, *step_pages: int) -> int:
+    user_id = services.create_user("bench", "password").id
+    fill(user_id, rows)
+    size = backup.database_path("main").stat().st_size
+    print(f"database: {size / 1e6:.1f} MB, {'WAL' if db.SQLITE_WAL else 'rollback journal'}")
+    out = Path(_tmpdir.name) / "out"
+    out.mkdir()
+    for pages in step_pages or (64, 256, 1024, -1):
+        entry, elapsed, stalls = run(user_id, pages, out)
+        stalls.sort()
+        print(
+            f"step {pages:>5} pages: {entry.raw_bytes / 1e6 / elapsed:7.1f} MB/s  {entry.steps:>5} steps  "
+            f"{entry.restarts} restarts  writes {len(stalls):>5}  "
+            f"p50 {1000 * stalls[len(stalls) // 2]:6.1f} ms  max stall {1000 * stalls[-1]:7.1f} ms"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(*(int(arg) for arg in sys.argv[1:])))
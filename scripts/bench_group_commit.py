@@ -0,0 +1,73 @@
+"""Concurrent log_food throughput with and without the group-commit queue.
+
+    python scripts/bench_group_commit.py [threads] [writes_per_thread]
+
+Runs against a throwaway database in a temporary directory.
+"""
+from __future__ import annotations
+
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from weight_tracker import db  # noqa: E402
+
+# Point the app at a throwaway database before services binds and seeds it. A file,
+# not :memory:, because the writers run concurrently.
+_tmpdir = tempfile.TemporaryDirectory()
+db.configure(f"sqlite:///{Path(_tmpdir.name) / 'bench.db'}")
+
+from weight_tracker import services  # noqa: E402
+from weight_tracker.writebehind import GroupCommitQueue  # noqa: E402
+
+
+def run(user_ids, writes: int) -> float:
+    def writer(user_id: int):
+        for i in range(writes):
+            services.log_food(
+                user_id=user_id,
+                entry_date=date(2026, 1, 1 + i % 28),
+                food_name="Oats",
+                measure="1 cup",
+                qty=1.0,
+                kcal=150.0,
+                protein=5.0,
+                fat=3.0,
+                carbs=27.0,
+            )
+
+    threads = [threading.Thread(target=writer, args=(user_id,)) for user_id in user_ids]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started
+
+
+def main(threads: int = 16, writes: int = 200) -> int:
+    user_ids = [services.create_user(f"bench{i}", "password").id for i in range(threads)]
+    total = threads * writes
+
+    services.group_commit = None
+    elapsed = run(user_ids, writes)
+    print(f"per-call commit: {total} writes in {elapsed:.2f} s ({total / elapsed:,.0f}/s)")
+
+    queue = GroupCommitQueue()
+    services.group_commit = queue
+    elapsed = run(user_ids, writes)
+    queue.close()
+    print(f"group commit:    {total} writes in {elapsed:.2f} s ({total / elapsed:,.0f}/s)")
+    for key, value in queue.stats().items():
+        print(f"  {key}: {value}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(*(int(arg) for arg in sys.argv[1:3])))
@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import sys
+import timeit
+from dataclasses import asdict
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from starlette.responses import JSONResponse  # noqa: E402
+
+from sample_state import sample_sync_state  # noqa: E402
+from weight_tracker import responses  # noqa: E402
+from weight_tracker.responses import FastJSONResponse  # noqa: E402
+from weight_tracker.services import SyncedStateDTO  # noqa: E402
+
+
+def old_path(dto: SyncedStateDTO) -> bytes:
+    """What the routes did before: a dict built from the DTO, then FastAPI's default encoding."""
+    return JSONResponse(jsonable_encoder(asdict(dto))).body
+
+
+def new_path(dto: SyncedStateDTO) -> bytes:
+    return FastJSONResponse(dto.to_dict()).body
+
+
+def main(days: int = 1095, repeat: int = 5) -> int:
+    state = sample_sync_state(days)
+    dto = SyncedStateDTO(username="bench", state=state, updated_at=datetime.utcnow().isoformat())
+    size = len(new_path(dto))
+    encoder = "orjson" if responses.orjson is not None else "json"
+    print(f"sync blob: {days} days, {len(state['user']['foods'])} foods, {size / 1024:.0f} KiB ({encoder})")
+    timings = {}
+    for label, fn in (("asdict + jsonable_encoder + JSONResponse", old_path), ("to_dict + FastJSONResponse", new_path)):
+        timings[label] = min(timeit.repeat(lambda: fn(dto), number=1, repeat=repeat))
+        print(f"{label:<44}{timings[label] * 1000:>9.1f} ms")
+    old, new = timings.values()
+    print(f"speedup: {old / new:.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 1095))
@@ -0,0 +1,119 @@
+"""Concurrent save_synced_state stress test: the old SELECT-then-write path vs. the single upsert.
+
+    python scripts/bench_sync_upsert.py [threads] [syncs_per_thread] [usernames]
+
+Every thread syncs the same few usernames, starting with none of them saved, so
+first-time syncs race each other. Reports failures and syncs per second for
+each path. Runs against a throwaway database in a temporary directory.
+"""
+from __future__ import annotations
+
+import copy
+from datetime import datetime
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "scripts"))
+
+from sqlalchemy import delete, select  # noqa: E402
+
+from weight_tracker import db  # noqa: E402
+
+# Point the app at a throwaway database before services binds and seeds it. A file,
+# not :memory:, because the syncs run concurrently.
+_tmpdir = tempfile.TemporaryDirectory()
+db.configure(f"sqlite:///{Path(_tmpdir.name) / 'bench.db'}")
+
+from sample_state import sample_sync_state  # noqa: E402
+from weight_tracker import jsondiff, models, services  # noqa: E402
+from weight_tracker.shards import username_session  # noqa: E402
+
+
+def legacy_save(*, username: str, state):
+    """save_synced_state before the upsert: read the row (and the history head), then insert or update."""
+    with username_session(username) as session:
+        existing = session.scalar(select(models.SyncedState).where(models.SyncedState.username == username))
+        now = datetime.utcnow()
+        previous = existing.state if existing else None
+        if existing:
+            existing.state = state
+            existing.updated_at = now
+        else:
+            session.add(models.SyncedState(username=username, state=state, updated_at=now))
+        Version = models.SyncedStateVersion
+        latest = session.execute(
+            select(Version.version, Version.base_version, Version.depth)
+            .where(Version.username == username)
+            .order_by(Version.version.desc())
+            .limit(1)
+        ).first()
+        version = latest.version + 1 if latest else 1
+        if latest and previous is not None and latest.depth + 1 < services.SYNC_SNAPSHOT_EVERY:
+            payload, base_version, depth, snapshot = jsondiff.diff(previous, state), latest.base_version, latest.depth + 1, False
+        else:
+            payload, base_version, depth, snapshot = state, version, 0, True
+        session.add(
+            Version(
+                username=username,
+                version=version,
+                base_version=base_version,
+                depth=depth,
+                is_snapshot=snapshot,
+                payload=payload,
+                created_at=now,
+            )
+        )
+        session.get(models.SyncCursor, username)
+
+
+def run(save, threads: int, syncs: int, usernames: int, states) -> tuple:
+    failures = []
+    lock = threading.Lock()
+
+    def worker(index: int):
+        for i in range(syncs):
+            try:
+                save(username=f"bench{(index + i) % usernames}", state=states[(index + i) % len(states)])
+            except Exception as exc:
+                with lock:
+                    failures.append(type(exc).__name__)
+
+    workers = [threading.Thread(target=worker, args=(index,)) for index in range(threads)]
+    started = time.perf_counter()
+    for worker_thread in workers:
+        worker_thread.start()
+    for worker_thread in workers:
+        worker_thread.join()
+    return time.perf_counter() - started, failures
+
+
+def reset() -> None:
+    with db.get_session() as session:
+        session.execute(delete(models.SyncedStateVersion))
+        session.execute(delete(models.SyncedState))
+    services._history_heads.clear()
+
+
+def main(threads: int = 16, syncs: int = 50, usernames: int = 4) -> int:
+    base = sample_sync_state(days=30)
+    states = []
+    for i in range(8):
+        state = copy.deepcopy(base)
+        state["user"]["profile"]["weight"] = 80 - i / 10
+        states.append(state)
+    total = threads * syncs
+    for label, save in (("SELECT then INSERT/UPDATE", legacy_save), ("single upsert", services.save_synced_state)):
+        reset()
+        elapsed, failures = run(save, threads, syncs, usernames, states)
+        kinds = ", ".join(f"{name} x{failures.count(name)}" for name in sorted(set(failures))) or "none"
+        print(f"{label:<26}{total} syncs in {elapsed:.2f} s ({(total - len(failures)) / elapsed:,.0f}/s), failures: {kinds}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(*(int(arg) for arg in sys.argv[1:4])))
@@ -0,0 +1,62 @@
+"""Delete a user account and all its data, optionally exporting it first.
+
+    python scripts/delete_account.py alice --export alice.jsonl.gz
+    python scripts/delete_account.py alice --export-only --export alice.jsonl
+    python scripts/delete_account.py alice --yes
+
+The export is JSON Lines (gzip-compressed when the file name ends in ``.gz``).
+Deletion runs in chunks of ``--chunk-size`` rows and can be re-run if interrupted.
+"""
+from __future__ import annotations
+
+import argparse
+import gzip
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from weight_tracker import accounts, services  # noqa: E402
+
+
+def _open_export(path: Path):
+    if path.suffix == ".gz":
+        return gzip.open(path, "wt", encoding="utf-8")
+    return open(path, "w", encoding="utf-8")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("username")
+    parser.add_argument("--export", type=Path, help="write the account's data here first")
+    parser.add_argument("--export-only", action="store_true", help="export without deleting")
+    parser.add_argument("--yes", action="store_true", help="don't ask for confirmation")
+    parser.add_argument("--chunk-size", type=int, default=accounts.CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    user = services.get_user(args.username)
+    if not user:
+        print(f"No such user: {args.username}")
+        return 1
+    if args.export_only:
+        if not args.export:
+            parser.error("--export-only needs --export")
+        with _open_export(args.export) as out:
+            lines = accounts.export_account(user.id, user.username, out, chunk_size=args.chunk_size)
+        print(f"exported {lines} lines to {args.export}")
+        return 0
+    if not args.yes and input(f"Delete {user.username} and all their data? [y/N] ").strip().lower() != "y":
+        print("Aborted")
+        return 1
+    if args.export:
+        with _open_export(args.export) as out:
+            counts = services.delete_account(user.username, export_to=out, chunk_size=args.chunk_size)
+    else:
+        counts = services.delete_account(user.username, chunk_size=args.chunk_size)
+    print(", ".join(f"{key}: {value}" for key, value in counts.items() if value))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import secrets
+import sys
+from datetime import date, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from weight_tracker import db  # noqa: E402
+
+# Point the app at a throwaway in-memory database before services binds and seeds it.
+db.configure(db.create_memory_engine())
+
+from reflex.constants.state import FIELD_MARKER  # noqa: E402
+from reflex.state import State  # noqa: E402
+from reflex.utils.format import json_dumps  # noqa: E402
+
+from weight_tracker import services  # noqa: E402
+from weight_tracker.state import (  # noqa: E402
+    AppState,
+    AuthState,
+    CatalogState,
+    ProfileState,
+    SummaryState,
+    WeightState,
+)
+
+DASHBOARD_STATES = (AppState, AuthState, ProfileState, SummaryState, CatalogState, WeightState)
+
+
+def seed(username: str, password: str, days: int) -> int:
+    catalog = json.loads((ROOT / "docs" / "data.json").read_text(encoding="utf-8"))
+    for food in catalog.get("foods", []):
+        try:
+            services.add_food_item(
+                user_id=None,
+                name=food["name"],
+                measure="1 serving",
+                kcal=food.get("kcal", 0),
+                protein=food.get("protein", 0),
+                fat=food.get("fat", 0),
+                carbs=food.get("carbs", 0),
+                category=food.get("category", "Other"),
+                make_global=True,
+            )
+        except ValueError:
+            continue
+    user = services.create_user(username, password)
+    services.upsert_profile(user.id, age=35, gender="Female", height_cm=168, weight_kg=80.0, activity="Light", deficit=500)
+    start = date.today() - timedelta(days=days)
+    for offset in range(days):
+        services.log_weight(user_id=user.id, entry_date=start + timedelta(days=offset), weight=80.0 - offset * 0.01)
+    for _ in range(6):
+        services.log_food(
+            user_id=user.id,
+            entry_date=date.today(),
+            food_name="Oatmeal",
+            measure="1 cup",
+            qty=1,
+            kcal=150,
+            protein=5,
+            fat=3,
+            carbs=27,
+        )
+    return user.id
+
+
+def _summary_dict(values: dict) -> dict:
+    return {
+        "food_log": values["summary_food_log"],
+        "exercise_log": values["summary_exercise_log"],
+        "macros": {
+            "protein": values["summary_macro_protein"],
+            "fat": values["summary_macro_fat"],
+            "carbs": values["summary_macro_carbs"],
+        },
+    }
+
+
+def flat_size(root: State, scope: str) -> int:
+    """Bytes the single flat AppState sent for an event of the given scope.
+
+    ``reload`` events went through the old ``load_user_state``, which reassigned
+    every dashboard var; ``summary`` events (``set_today``) reassigned the summary
+    fields. Both also re-sent the ``summary`` dict duplicating those fields.
+    """
+    values = {}
+    for state_cls in DASHBOARD_STATES:
+        substate = root.get_substate(state_cls.get_full_name().split("."))
+        values.update({name: substate.get_value(name) for name in state_cls.base_vars})
+    if scope == "summary":
+        values = {name: value for name, value in values.items() if name.startswith("summary_") or name == "today_date"}
+    values["summary"] = _summary_dict(values)
+    delta = {AppState.get_full_name(): {name + FIELD_MARKER: value for name, value in values.items()}}
+    return len(json_dumps(delta))
+
+
+async def measure(days: int) -> list[tuple[str, int, int]]:
+    username = f"delta_{secrets.token_hex(4)}"
+    password = secrets.token_hex(8)
+    seed(username, password, days)
+
+    root = State(_reflex_internal_init=True)
+    auth = root.get_substate(AuthState.get_full_name().split("."))
+    summary = root.get_substate(SummaryState.get_full_name().split("."))
+    catalog = root.get_substate(CatalogState.get_full_name().split("."))
+    weights = root.get_substate(WeightState.get_full_name().split("."))
+
+    async def run(label: str, handler, *args, scope: str = "reload"):
+        result = handler(*args)
+        if asyncio.iscoroutine(result):
+            await result
+        delta = len(json_dumps(root.get_delta()))
+        # Keystroke handlers never reloaded, so the flat state sent the same single field.
+        rows.append((label, delta if scope == "field" else flat_size(root, scope), delta))
+        root._clean()
+
+    rows: list[tuple[str, int, int]] = []
+    auth.login_username = username
+    auth.login_password = password
+    root._clean()
+    await run("login", auth.login)
+    await run("update_custom_kcal", catalog.update_custom_kcal, "120", scope="field")
+    summary.food_choice = str(catalog.food_items[0]["id"])
+    root._clean()
+    await run("log_food_entry", summary.log_food_entry)
+    await run("delete_food_entry", summary.delete_food_entry, summary.summary_food_log[0]["id"])
+    await run("log_exercise_entry", summary.log_exercise_entry)
+    await run("set_today", summary.set_today, (date.today() - timedelta(days=1)).isoformat(), scope="summary")
+    await run("log_weight_entry", weights.log_weight_entry)
+    return rows
+
+
+def main(days: int = 730) -> int:
+    rows = asyncio.run(measure(days))
+    print(f"{'event':<22}{'flat bytes':>12}{'split bytes':>13}{'saved':>8}")
+    for label, flat, split in rows:
+        saved = 100 * (1 - split / flat) if flat else 0.0
+        print(f"{label:<22}{flat:>12}{split:>13}{saved:>7.1f}%")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 730))
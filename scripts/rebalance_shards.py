@@ -0,0 +1,85 @@
+"""Inspect and change where users' per-user tables live.
+
+    python scripts/rebalance_shards.py status
+    python scripts/rebalance_shards.py move <username> <shard>    # e.g. shard-03, user-42 or main
+    python scripts/rebalance_shards.py rebalance [--mode N|per-user] [--dry-run]
+
+``rebalance`` moves every user whose shard differs from their home shard under the
+given mode (default: ``WEIGHT_TRACKER_SHARDS``), which is how existing users leave
+``data/app.db`` after sharding is enabled or move when the shard count changes.
+Run it while the backend is stopped; see ``shards.move_user``.
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from sqlalchemy import select  # noqa: E402
+
+from weight_tracker import db, models  # noqa: E402
+from weight_tracker.shards import MAIN_SHARD, ShardRouter, move_user, placement_counts, router  # noqa: E402
+
+
+def status() -> int:
+    for shard, count in sorted(placement_counts().items()):
+        print(f"{shard:>12}  {count} users")
+    orphaned = set(router.shards_on_disk()) - set(placement_counts())
+    if orphaned:
+        print(f"shard files without users: {', '.join(sorted(orphaned))}")
+    return 0
+
+
+def move(username: str, shard: str) -> int:
+    with db.get_session() as session:
+        user_id = session.scalar(select(models.User.id).where(models.User.username == username.strip().lower()))
+    if user_id is None:
+        print(f"No such user: {username}")
+        return 1
+    moved = move_user(user_id, shard)
+    print(f"{username}: {router.shard_of(user_id)} {moved or '(already there)'}")
+    return 0
+
+
+def rebalance(mode: str, dry_run: bool) -> int:
+    target_router = ShardRouter(mode=mode)
+    with db.get_session() as session:
+        user_ids = session.scalars(select(models.User.id).order_by(models.User.id)).all()
+    moves = 0
+    for user_id in user_ids:
+        current, target = router.shard_of(user_id), target_router.home_shard(user_id)
+        if current == target:
+            continue
+        moves += 1
+        print(f"user {user_id}: {current} -> {target}")
+        if not dry_run:
+            move_user(user_id, target)
+    print(f"{moves} of {len(user_ids)} users {'would move' if dry_run else 'moved'}")
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("status")
+    move_parser = commands.add_parser("move")
+    move_parser.add_argument("username")
+    move_parser.add_argument("shard", help=f"shard name, or '{MAIN_SHARD}' for data/app.db")
+    rebalance_parser = commands.add_parser("rebalance")
+    rebalance_parser.add_argument("--mode", default=router.mode, help="shard count or 'per-user'")
+    rebalance_parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args(argv)
+
+    db.init_db()
+    if args.command == "status":
+        return status()
+    if args.command == "move":
+        return move(args.username, args.shard)
+    return rebalance(args.mode, args.dry_run)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,48 @@
+"""Rebuild the recent/frequent foods index from the food log.
+
+    python scripts/rebuild_food_usage.py               # every user
+    python scripts/rebuild_food_usage.py --user alice
+    python scripts/rebuild_food_usage.py top --user alice -k 20
+
+``log_food`` and ``log_meal`` keep the index up to date; a rebuild is only needed
+for entries written before it existed or by hand.
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from weight_tracker import services  # noqa: E402
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", nargs="?", choices=("rebuild", "top"), default="rebuild")
+    parser.add_argument("--user", help="only this username")
+    parser.add_argument("-k", type=int, default=services.TOP_FOODS, help="foods to list with 'top'")
+    args = parser.parse_args(argv)
+
+    user_id = None
+    if args.user:
+        user = services.get_user(args.user)
+        if not user:
+            print(f"No such user: {args.user}")
+            return 1
+        user_id = user.id
+    if args.command == "top":
+        if user_id is None:
+            parser.error("top needs --user")
+        for food in services.top_foods(user_id, args.k):
+            print(f"{food['weight']:8.2f}  {food['uses']:5d} uses  last {food['last_used']}  {food['food_name']}")
+        return 0
+    counts = services.rebuild_food_usage(user_id)
+    print(", ".join(f"{key}: {value}" for key, value in counts.items()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,60 @@
+"""Re-derive logged exercise burns over a date range.
+
+    python scripts/recompute_burns.py 2025-01-01 2025-12-31
+    python scripts/recompute_burns.py 2025-01-01 2025-12-31 --user alice --met Jogging=8 --profile-weight
+
+By default every user's entries are recomputed from the activity catalog's METs
+and the weigh-in closest before each entry; ``--met`` overrides a MET value and
+``--profile-weight`` uses the current profile weight instead of weight history.
+"""
+from __future__ import annotations
+
+import argparse
+from datetime import date
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from weight_tracker import services  # noqa: E402
+
+
+def _met_override(value: str):
+    name, _, met = value.partition("=")
+    if not name or not met:
+        raise argparse.ArgumentTypeError("expected NAME=MET")
+    return name, float(met)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("start", type=date.fromisoformat)
+    parser.add_argument("end", type=date.fromisoformat)
+    parser.add_argument("--user", help="only this username")
+    parser.add_argument("--met", type=_met_override, action="append", default=[], help="NAME=MET override")
+    parser.add_argument("--profile-weight", action="store_true", help="ignore weight history")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    user_id = None
+    if args.user:
+        user = services.get_user(args.user)
+        if not user:
+            print(f"No such user: {args.user}")
+            return 1
+        user_id = user.id
+    counts = services.recompute_exercise_burns(
+        args.start,
+        args.end,
+        user_id=user_id,
+        met_overrides=dict(args.met),
+        use_weight_history=not args.profile_weight,
+        chunk_size=args.chunk_size,
+    )
+    print(", ".join(f"{key}: {value}" for key, value in counts.items()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
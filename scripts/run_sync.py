@@ -1,18 +1,31 @@
 from __future__ import annotations
 
 import json
+import os
 import sys
 import urllib.request
 from urllib.error import HTTPError, URLError
 
 
-def main(endpoint: str, username: str) -> int:
+def _post(url: str, body: dict, token: str | None = None) -> dict:
+    headers = {"Content-Type": "application/json"}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    req = urllib.request.Request(url, data=json.dumps(body).encode(), headers=headers)
+    with urllib.request.urlopen(req) as resp:
+        return json.loads(resp.read().decode())
+
+
+def main(endpoint: str, username: str, password: str) -> int:
     endpoint = endpoint.rstrip("/")
-    payload = json.dumps({"username": username, "state": {"info": "scheduled sync"}}).encode()
-    req = urllib.request.Request(f"{endpoint}/api/sync-state", data=payload, headers={"Content-Type": "application/json"})
     try:
-        with urllib.request.urlopen(req) as resp:
-            print(resp.read().decode())
+        session = _post(f"{endpoint}/api/login", {"username": username, "password": password})
+        result = _post(
+            f"{endpoint}/api/sync-state",
+            {"username": username, "state": {"info": "scheduled sync"}},
+            token=session["token"],
+        )
+        print(json.dumps(result))
     except HTTPError as e:
         print(f"HTTP error: {e.code} {e.reason}")
         return 1
@@ -24,6 +37,7 @@ def main(endpoint: str, username: str) -> int:
 
 if __name__ == "__main__":
     if len(sys.argv) < 3:
-        print("Usage: run_sync.py <endpoint> <username>")
+        print("Usage: run_sync.py <endpoint> <username> [password]  (or set SYNC_PASSWORD)")
         sys.exit(1)
-    sys.exit(main(sys.argv[1], sys.argv[2]))
+    password = sys.argv[3] if len(sys.argv) > 3 else os.environ.get("SYNC_PASSWORD", "")
+    sys.exit(main(sys.argv[1], sys.argv[2], password))
@@ -0,0 +1,62 @@
+"""Synthetic static-app (PWA) sync payloads for the benchmark scripts."""
+from __future__ import annotations
+
+import random
+import uuid
+from datetime import date, timedelta
+from typing import Any, Dict
+
+
+def sample_sync_state(days: int = 1095, foods_per_day: int = 5, seed: int = 7) -> Dict[str, Any]:
+    """A ``{"user": ..., "activeUserId": ..., "insightsMonth": ...}`` blob shaped like ``syncToBackend`` sends."""
+    rng = random.Random(seed)
+    start = date.today() - timedelta(days=days)
+    foods, exercises, weights = [], [], []
+    weight = 92.0
+    for offset in range(days):
+        day = (start + timedelta(days=offset)).isoformat()
+        for _ in range(foods_per_day):
+            qty = rng.choice([0.5, 1, 1, 1.5, 2])
+            foods.append(
+                {
+                    "id": str(uuid.UUID(int=rng.getrandbits(128))),
+                    "date": day,
+                    "time": f"{rng.randint(6, 22):02d}:{rng.randint(0, 59):02d}",
+                    "name": rng.choice(["Oatmeal", "Chicken breast", "Rice", "Apple", "Greek yogurt", "Salmon"]),
+                    "qty": qty,
+                    "kcal": round(rng.uniform(80, 700) * qty, 1),
+                    "protein": round(rng.uniform(0, 45) * qty, 1),
+                    "fat": round(rng.uniform(0, 30) * qty, 1),
+                    "carbs": round(rng.uniform(0, 90) * qty, 1),
+                }
+            )
+        if rng.random() < 0.5:
+            mins = rng.choice([20, 30, 45, 60])
+            exercises.append(
+                {
+                    "id": str(uuid.UUID(int=rng.getrandbits(128))),
+                    "date": day,
+                    "time": "18:00",
+                    "met": 7,
+                    "mins": mins,
+                    "kcalBurn": round(7 * 3.5 * weight / 200 * mins, 1),
+                    "label": "Jogging",
+                }
+            )
+        weight += rng.uniform(-0.15, 0.1)
+        weights.append({"date": day, "weight": round(weight, 1)})
+    return {
+        "user": {
+            "profile": {"name": "bench", "age": 35, "gender": "Female", "height": 168, "weight": round(weight, 1), "activity": "Light"},
+            "foods": foods,
+            "exercises": exercises,
+            "weights": weights,
+            "detox": {"items": [], "daily": [], "streakStart": start.isoformat()},
+            "savedFoods": [],
+            "recentFoods": [],
+            "fitness": {"strength": [], "cardio": []},
+            "journal": [],
+        },
+        "activeUserId": "bench",
+        "insightsMonth": date.today().isoformat()[:7],
+    }
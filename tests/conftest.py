@@ -0,0 +1,22 @@
+import os
+
+# Before weight_tracker is imported: every test process (each pytest-xdist worker
+# included) gets a private in-memory database, and no signing key is written to data/.
+os.environ.setdefault("WEIGHT_TRACKER_DATABASE_URL", "sqlite://")
+os.environ.setdefault("WEIGHT_TRACKER_TOKEN_SECRET", "test-secret")
+
+import pytest  # noqa: E402
+
+from weight_tracker import db  # noqa: E402
+
+
+@pytest.fixture
+def database(request, tmp_path):
+    """A fresh database with the schema created, discarded after the test.
+
+    In memory by default. Tests that write from several threads at once ask for a
+    temporary file with ``@pytest.mark.parametrize("database", ["file"], indirect=True)``.
+    """
+    url = f"sqlite:///{tmp_path / 'test.db'}" if getattr(request, "param", None) == "file" else None
+    with db.isolated_database(url) as engine:
+        yield engine
@@ -0,0 +1,89 @@
+from datetime import date, time
+
+from weight_tracker import archive, services
+from weight_tracker.timeseries import series_cache
+
+TODAY = date(2024, 6, 15)
+OLD_DAYS = [date(2023, 1, 5), date(2023, 1, 20), date(2023, 2, 3)]
+RECENT = date(2024, 6, 1)
+
+
+def _food(user_id, day, kcal):
+    services.log_food(
+        user_id=user_id, entry_date=day, food_name="Oats", measure="1 cup", qty=1, kcal=kcal, protein=5, fat=3, carbs=27
+    )
+
+
+def _exercise(user_id, day, kcal_burn):
+    services.log_exercise(
+        user_id=user_id, entry_date=day, ex_type="Walking", start=time(8), end=time(9), mins=60, kcal_burn=kcal_burn
+    )
+
+
+def _user():
+    user_id = services.create_user("ada", "correct horse").id
+    for n, day in enumerate(OLD_DAYS + [RECENT]):
+        _food(user_id, day, 100 + n)
+        _exercise(user_id, day, 200 + n)
+    return user_id
+
+
+def _without_ids(entries):
+    return [{key: value for key, value in entry.items() if key not in ("id", "archived")} for entry in entries]
+
+
+def test_archived_entries_round_trip(database):
+    user_id = _user()
+    before = services.get_log_range(user_id, OLD_DAYS[0], RECENT)
+    intake_before = list(series_cache.get(user_id).intake)
+
+    counts = services.archive_old_logs(180, user_id=user_id, today=TODAY)
+    assert counts == {"users": 1, "food": 3, "exercise": 3, "partitions": 4}
+
+    live = services.get_log_range(user_id, OLD_DAYS[0], RECENT)
+    assert [entry["date"] for entry in live["food"]] == [RECENT.isoformat()]
+    merged = services.get_log_range(user_id, OLD_DAYS[0], RECENT, include_archive=True)
+    for kind in ("food", "exercise"):
+        assert _without_ids(merged[kind]) == _without_ids(before[kind])
+        assert [entry["archived"] for entry in merged[kind]] == [True, True, True, False]
+    # Archived days still count in the series, from the partitions' day totals.
+    assert list(series_cache.get(user_id).intake) == intake_before
+    assert archive.archive_stats(user_id)["food"]["rows"] == 3
+
+
+def test_rows_logged_into_an_archived_month_are_merged(database):
+    user_id = _user()
+    services.archive_old_logs(180, user_id=user_id, today=TODAY)
+    _food(user_id, OLD_DAYS[0], 50)
+    services.archive_old_logs(180, user_id=user_id, today=TODAY)
+
+    stats = archive.archive_stats(user_id)
+    assert (stats["food"]["partitions"], stats["food"]["rows"]) == (2, 4)
+    day = services.get_log_range(user_id, OLD_DAYS[0], OLD_DAYS[0], include_archive=True)["food"]
+    assert sorted(entry["kcal"] for entry in day) == [50, 100]
+
+
+def test_pack_and_unpack_keep_rows():
+    columns = ("id", "date", "kcal")
+    rows = [(1, date(2023, 1, 5), 100.0), (2, date(2023, 1, 6), None)]
+    assert archive.unpack(archive.pack(columns, rows)) == [
+        {"id": 1, "date": "2023-01-05", "kcal": 100.0},
+        {"id": 2, "date": "2023-01-06", "kcal": None},
+    ]
+
+
+def test_clearing_an_archived_day_removes_its_archived_entries(database):
+    user_id = _user()
+    services.archive_old_logs(180, user_id=user_id, today=TODAY)
+    _food(user_id, OLD_DAYS[0], 50)
+
+    assert services.clear_day(user_id, OLD_DAYS[0], exercise=False) == {"food": 2, "exercise": 0}
+    day = services.get_log_range(user_id, OLD_DAYS[0], OLD_DAYS[0], include_archive=True)
+    assert day["food"] == [] and len(day["exercise"]) == 1
+    assert archive.archive_stats(user_id)["food"]["rows"] == 2
+    assert series_cache.get(user_id).intake[0] == 0
+
+    # Clearing the last archived day of a month drops its partition.
+    services.clear_day(user_id, OLD_DAYS[2])
+    stats = archive.archive_stats(user_id)
+    assert (stats["food"]["partitions"], stats["exercise"]["partitions"]) == (1, 1)
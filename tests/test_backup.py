@@ -0,0 +1,17 @@
+import pytest
+
+from weight_tracker import backup, services
+
+PROFILE = dict(age=40, gender="female", height_cm=170, activity="sedentary", deficit=500)
+
+
+@pytest.mark.parametrize("database", ["file"], indirect=True)
+def test_restore_drops_rows_cached_before_it(database, tmp_path):
+    user_id = services.create_user("ada", "correct horse").id
+    services.upsert_profile(user_id, weight_kg=80.0, **PROFILE)
+    directory = backup.backup_all(tmp_path / "backups", keep=None)
+
+    services.upsert_profile(user_id, weight_kg=75.0, **PROFILE)
+    assert services.load_profile(user_id).weight_kg == 75.0
+    assert backup.restore_backup(directory) == ["main"]
+    assert services.load_profile(user_id).weight_kg == 80.0
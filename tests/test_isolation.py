@@ -0,0 +1,52 @@
+from datetime import date
+
+import pytest
+
+from weight_tracker import db, services, tokens
+from weight_tracker.cache import MISSING
+from weight_tracker.shards import router
+from weight_tracker.timeseries import series_cache
+
+
+def _make_user(username="alice"):
+    user = services.create_user(username, "correct horse")
+    services.upsert_profile(
+        user.id, age=30, gender="Female", height_cm=170, weight_kg=70.0, activity="Sedentary", deficit=500
+    )
+    services.record_weight(user_id=user.id, entry_date=date(2024, 1, 1), weight=70.0)
+    return user
+
+
+@pytest.mark.parametrize("run", [1, 2])
+def test_each_test_starts_empty(database, run):
+    # Both runs create the same username; a shared database would reject the second.
+    assert services.get_user("alice") is None
+    user = _make_user()
+    assert services.get_user("alice").id == user.id
+
+
+def test_nested_databases_do_not_share_rows(database):
+    outer = _make_user()
+    with db.isolated_database():
+        assert services.get_user("alice") is None
+        inner = _make_user("bob")
+    assert services.get_user("bob") is None
+    assert services.get_user("alice").id == outer.id
+    assert inner.id == outer.id  # ids restart in each database
+
+
+def test_switching_resets_caches(database):
+    user = _make_user()
+    assert services.load_profile(user.id) is not None
+    assert len(series_cache.get(user.id)) == 1
+    assert router.user_id_for("alice") == user.id
+    tokens.revoke_user(user.id, user.username)
+
+    with db.isolated_database():
+        # Same user id, different database: nothing cached for the old one may leak in.
+        assert len(router._placements) == 0
+        assert services.profile_cache.get(user.id) is MISSING
+        assert services.load_profile(user.id) is None
+        assert series_cache.peek(user.id) is None
+        assert router.user_id_for("alice") is None
+        assert tokens.revoked_users.get((user.id, user.username)) is MISSING
@@ -0,0 +1,52 @@
+from weight_tracker import services
+
+
+def _merge(since, foods=(), deletes=(), state=None):
+    return services.merge_synced_state(
+        username="ada", since=since, changes={"foods": {"upsert": list(foods), "delete": list(deletes)}}, state=state
+    )
+
+
+def _foods():
+    return services.load_synced_state("ada").state["user"]["foods"]
+
+
+def test_newer_change_wins_and_older_loses(database):
+    phone = _merge(0, [{"id": "f1", "name": "Oats", "updatedAt": 1000}])
+    laptop = _merge(0, [{"id": "f1", "name": "Porridge", "updatedAt": 2000}])
+    assert laptop.applied == {"foods": 1} and laptop.conflicts == {}
+
+    stale = _merge(phone.cursor, [{"id": "f1", "name": "Granola", "updatedAt": 1500}])
+    assert stale.applied == {"foods": 0}
+    assert stale.conflicts == {"foods": ["f1"]}
+    assert stale.pull["foods"] == [{"id": "f1", "name": "Porridge", "updatedAt": 2000}]
+    assert [food["name"] for food in _foods()] == ["Porridge"]
+
+
+def test_equal_timestamps_break_ties_by_hash_in_any_order(database):
+    first = {"id": "f1", "name": "Apple", "updatedAt": 5000}
+    second = {"id": "f1", "name": "Banana", "updatedAt": 5000}
+    expected = max((first, second), key=services._record_hash)["name"]
+
+    _merge(0, [first])
+    _merge(0, [second])
+    assert [food["name"] for food in _foods()] == [expected]
+
+    services.merge_synced_state(username="bob", since=0, changes={"foods": {"upsert": [second]}})
+    services.merge_synced_state(username="bob", since=0, changes={"foods": {"upsert": [first]}})
+    assert [food["name"] for food in services.load_synced_state("bob").state["user"]["foods"]] == [expected]
+
+
+def test_deletes_are_pulled_by_other_devices(database):
+    phone = _merge(0, [{"id": "f1", "name": "Oats", "updatedAt": 1000}, {"id": "f2", "name": "Tea", "updatedAt": 1000}])
+    laptop = _merge(phone.cursor, deletes=[{"id": "f2", "updatedAt": 3000}])
+    assert laptop.applied == {"foods": 1}
+    assert [food["id"] for food in _foods()] == ["f1"]
+    assert _merge(phone.cursor).pull == {"foods": [{"id": "f2", "deleted": True, "updatedAt": 3000.0}]}
+
+
+def test_unchanged_merge_adds_no_history(database):
+    _merge(0, [{"id": "f1", "name": "Oats", "updatedAt": 1000}], state={"user": {"name": "Ada"}})
+    versions = services.list_synced_state_versions("ada")
+    _merge(0, [{"id": "f1", "name": "Oats", "updatedAt": 1000}])
+    assert services.list_synced_state_versions("ada") == versions
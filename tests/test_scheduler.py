@@ -0,0 +1,60 @@
+from datetime import datetime
+
+import pytest
+
+from weight_tracker.scheduler import Cron, Scheduler, _parse_field
+
+
+@pytest.mark.parametrize(
+    "spec, expected",
+    [
+        ("*", set(range(0, 60))),
+        ("*/15", {0, 15, 30, 45}),
+        ("0-30/10", {0, 10, 20, 30}),
+        ("5,10-12", {5, 10, 11, 12}),
+        ("50/5", {50, 55}),
+    ],
+)
+def test_parse_field(spec, expected):
+    assert _parse_field(spec, 0, 59) == expected
+
+
+@pytest.mark.parametrize("expression", ["61 * * * *", "* * *", "5-1 * * * *", "*/0 * * * *", "* * 0 * *", "x * * * *"])
+def test_invalid_expressions_are_rejected(expression):
+    with pytest.raises(ValueError):
+        Cron(expression)
+
+
+@pytest.mark.parametrize(
+    "expression, after, expected",
+    [
+        ("*/15 * * * *", datetime(2024, 1, 1, 10, 7, 30), datetime(2024, 1, 1, 10, 15)),
+        ("*/15 * * * *", datetime(2024, 1, 1, 10, 15), datetime(2024, 1, 1, 10, 30)),
+        ("0 4 * * *", datetime(2024, 1, 1, 5, 0), datetime(2024, 1, 2, 4, 0)),
+        # 2024-01-01 is a Monday; 0 and 7 are both Sunday.
+        ("30 4 * * 0", datetime(2024, 1, 1), datetime(2024, 1, 7, 4, 30)),
+        ("30 4 * * 7", datetime(2024, 1, 1), datetime(2024, 1, 7, 4, 30)),
+        ("0 0 1 1 *", datetime(2024, 6, 1), datetime(2025, 1, 1)),
+        ("0 12 29 2 *", datetime(2023, 3, 1), datetime(2024, 2, 29, 12, 0)),
+        # Restricted day and weekday: either one matching is enough (Friday the 5th comes first).
+        ("0 0 13 * 5", datetime(2024, 1, 1), datetime(2024, 1, 5)),
+        ("0 0 13 * 5", datetime(2024, 1, 12, 1), datetime(2024, 1, 13)),
+    ],
+)
+def test_next_after(expression, after, expected):
+    assert Cron(expression).next_after(after) == expected
+
+
+def test_expression_that_never_matches():
+    with pytest.raises(ValueError):
+        Cron("0 0 31 2 *").next_after(datetime(2024, 1, 1))
+
+
+def test_only_one_scheduler_holds_the_lock(tmp_path):
+    lock_path = tmp_path / "scheduler.lock"
+    first, second = Scheduler(lock_path=lock_path), Scheduler(lock_path=lock_path)
+    assert first.try_lock()
+    assert not second.try_lock()
+    first.unlock()
+    assert second.try_lock()
+    second.unlock()
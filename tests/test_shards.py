@@ -0,0 +1,25 @@
+import pytest
+
+from weight_tracker import services
+from weight_tracker.shards import MAIN_SHARD, router
+
+
+@pytest.fixture
+def sharded(database, tmp_path, monkeypatch):
+    monkeypatch.setattr(router, "mode", "2")
+    monkeypatch.setattr(router, "shard_dir", tmp_path / "shards")
+    yield
+    router.reset()
+
+
+@pytest.mark.parametrize("database", ["file"], indirect=True)
+def test_state_synced_before_registering_moves_to_the_new_shard(sharded):
+    services.save_synced_state(username="ada", state={"user": {"name": "Ada"}})
+    services.merge_synced_state(username="ada", since=0, changes={"foods": {"upsert": [{"id": "f1", "updatedAt": 1}]}})
+    before = services.load_synced_state("ada").state
+
+    user_id = services.create_user("ada", "correct horse").id
+    assert router.shard_of(user_id) != MAIN_SHARD
+    assert services.load_synced_state("ada").state == before
+    assert [entry["version"] for entry in services.list_synced_state_versions("ada")] == [1, 2]
+    assert services.merge_synced_state(username="ada", since=0, changes={}).pull["foods"][0]["id"] == "f1"
@@ -0,0 +1,49 @@
+from datetime import datetime, timedelta
+import threading
+
+import pytest
+from sqlalchemy import func, select
+
+from weight_tracker import db, models, services
+
+THREADS = 8
+SAVES = 10
+
+
+@pytest.mark.parametrize("database", ["file"], indirect=True)
+def test_concurrent_saves_keep_one_row_and_every_version(database):
+    errors = []
+    start = threading.Barrier(THREADS)
+
+    def sync(thread):
+        start.wait()
+        for i in range(SAVES):
+            try:
+                services.save_synced_state(username="Ada", state={"profile": {"thread": thread, "save": i}})
+            except Exception as exc:  # noqa: BLE001 - every failure is reported below
+                errors.append(exc)
+
+    threads = [threading.Thread(target=sync, args=(n,)) for n in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    with db.get_session() as session:
+        assert session.scalar(select(func.count()).select_from(models.SyncedState)) == 1
+    versions = [entry["version"] for entry in services.list_synced_state_versions("ada")]
+    assert versions == list(range(1, THREADS * SAVES + 1))
+    # The stored state is the one the newest version rebuilds to.
+    current = services.load_synced_state("ada")
+    newest = services.load_synced_state_at("ada", datetime.utcnow() + timedelta(days=1))
+    assert newest.state == current.state
+
+
+def test_resaving_the_same_state_adds_no_version(database):
+    state = {"profile": {"weight": 70}}
+    services.save_synced_state(username="ada", state=state)
+    services.save_synced_state(username="ada", state=state)
+    services.save_synced_state(username="ada", state={"profile": {"weight": 69}})
+    assert [entry["version"] for entry in services.list_synced_state_versions("ada")] == [1, 2]
+    assert services.load_synced_state("ada").state == {"profile": {"weight": 69}}
@@ -0,0 +1,65 @@
+import copy
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select, update
+
+from weight_tracker import db, jsondiff, models, services
+
+PAIRS = [
+    ({"a": 1, "b": 2}, {"a": 1, "c": 3}),
+    ({"log": [1, 2, 3]}, {"log": [1, 2, 3, 4]}),
+    ({"log": [1, 2, 3, 4]}, {"log": [1, 9, 4]}),
+    ({"nested": {"x": [1, {"y": 2}]}}, {"nested": {"x": [1, {"y": 3}], "z": None}}),
+    ([1, 2], {"now": "a dict"}),
+    ({"same": [1]}, {"same": [1]}),
+]
+
+
+@pytest.mark.parametrize("old, new", PAIRS)
+def test_diff_then_apply_rebuilds_the_new_document(old, new):
+    ops = jsondiff.diff(old, new)
+    assert jsondiff.apply(copy.deepcopy(old), ops) == new
+
+
+def test_appending_to_a_long_list_is_one_small_splice():
+    old = {"log": list(range(1000))}
+    new = {"log": list(range(1001))}
+    assert jsondiff.diff(old, new) == [["splice", ["log"], 1000, 1000, [1000]]]
+    assert jsondiff.diff(old, old) == []
+
+
+def _state(version):
+    return {"profile": {"version": version}, "log": list(range(version))}
+
+
+def test_compaction_thins_old_history_and_keeps_surviving_states(database):
+    now = datetime(2024, 6, 1, 12, 0)
+    for version in range(1, 41):
+        services.save_synced_state(username="ada", state=_state(version))
+    # Versions 1-36 were saved three a day starting 95 days ago; 37-40 today.
+    saved_at = {
+        version: now - timedelta(days=95 - (version - 1) // 3, minutes=3 - (version - 1) % 3) for version in range(1, 37)
+    }
+    saved_at.update({version: now - timedelta(minutes=41 - version) for version in range(37, 41)})
+    Version = models.SyncedStateVersion
+    with db.get_session() as session:
+        for version, created_at in saved_at.items():
+            session.execute(update(Version).where(Version.version == version).values(created_at=created_at))
+
+    totals = services.compact_synced_history(now=now)
+    assert totals["usernames"] == 1 and totals["removed"] > 0
+
+    with db.get_session() as session:
+        remaining = session.scalars(select(Version.version).order_by(Version.version)).all()
+    retention = now - timedelta(days=services.SYNC_HISTORY_RETENTION_DAYS)
+    # Versions before the last old snapshot (33) are rewritten; it and the later ones are untouched.
+    rewritten = [version for version in remaining if version < 33]
+    assert rewritten and all(saved_at[version] >= retention for version in rewritten)
+    assert set(range(33, 41)) <= set(remaining)
+    for version in remaining:
+        assert services.load_synced_state_at("ada", saved_at[version]).state == _state(version)
+    # At most one old version per day survives.
+    old_days = [saved_at[version].date() for version in rewritten]
+    assert len(old_days) == len(set(old_days))
+    assert services.compact_synced_history(now=now)["removed"] == 0
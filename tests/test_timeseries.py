@@ -0,0 +1,100 @@
+from datetime import date
+import threading
+
+import pytest
+
+from weight_tracker import services, timeseries
+from weight_tracker.timeseries import series_cache
+
+DAY = date(2024, 3, 1)
+
+
+def _user(username="sam"):
+    return services.create_user(username, "correct horse").id
+
+
+def _log(user_id, kcal):
+    services.log_food(
+        user_id=user_id, entry_date=DAY, food_name="Oats", measure="1 cup", qty=1, kcal=kcal, protein=0, fat=0, carbs=0
+    )
+
+
+def _intake(user_id):
+    series = series_cache.get(user_id)
+    lo, hi = series.bounds(DAY, DAY)
+    return sum(series.intake[lo:hi])
+
+
+class GatedLoads:
+    """Replaces ``load_series``: each call reads the database, then waits for its gate."""
+
+    def __init__(self, monkeypatch):
+        self.gates = []
+        self._read = threading.Semaphore(0)
+        self._real = timeseries.load_series
+        monkeypatch.setattr(timeseries, "load_series", self)
+
+    def __call__(self, user_id):
+        series = self._real(user_id)
+        gate = threading.Event()
+        self.gates.append(gate)
+        self._read.release()
+        assert gate.wait(5)
+        return series
+
+    def start(self, user_id):
+        """Run ``series_cache.get`` on a thread and return once its load has read the database."""
+        thread = threading.Thread(target=series_cache.get, args=(user_id,))
+        thread.start()
+        assert self._read.acquire(timeout=5)
+        return thread
+
+
+@pytest.fixture
+def gated(database, monkeypatch):
+    return GatedLoads(monkeypatch)
+
+
+def test_load_between_commit_and_patch_is_not_counted_twice(database, monkeypatch):
+    user_id = _user()
+    _log(user_id, 100)
+    real_record = series_cache.record_food
+
+    def record_after_another_load(*args, **kwargs):
+        # Another thread loads (and would cache) the series after the commit, before the patch.
+        reader = threading.Thread(target=series_cache.get, args=(user_id,))
+        reader.start()
+        reader.join()
+        real_record(*args, **kwargs)
+
+    monkeypatch.setattr(series_cache, "record_food", record_after_another_load)
+    _log(user_id, 250)
+    monkeypatch.undo()
+    assert _intake(user_id) == 350
+
+
+def test_overlapping_loads_do_not_cache_a_stale_series(gated):
+    user_id = _user()
+    _log(user_id, 100)
+    first = gated.start(user_id)  # read the day before the write below
+    _log(user_id, 250)
+    second = gated.start(user_id)  # read it after
+    gated.gates[0].set()
+    first.join()
+    assert series_cache.peek(user_id) is None
+    gated.gates[1].set()
+    second.join()
+    assert _intake(user_id) == 350
+
+
+def test_cached_series_is_patched_by_later_writes(database):
+    user_id = _user()
+    _log(user_id, 100)
+    assert _intake(user_id) == 100
+    _log(user_id, 40)
+    services.record_weight(user_id=user_id, entry_date=DAY, weight=71.5)
+    series = series_cache.peek(user_id)
+    assert series is not None
+    assert _intake(user_id) == 140
+    assert list(series.weight) == [71.5]
+    assert series_cache.nbytes == series.nbytes
@@ -0,0 +1,33 @@
+from datetime import date, timedelta
+
+import pytest
+
+from weight_tracker import services
+
+MONDAY = date(2024, 1, 1)
+
+
+def _tdee(profile, weight):
+    bmr = services.mifflin_st_jeor(weight, profile.height_cm, profile.age, profile.gender)
+    return services.calc_tdee(bmr, profile.activity)
+
+
+def test_each_day_uses_the_weight_as_of_that_day(database):
+    user_id = services.create_user("ada", "correct horse").id
+    services.upsert_profile(
+        user_id, age=40, gender="Female", height_cm=170, weight_kg=90.0, activity="Sedentary", deficit=500
+    )
+    services.record_weight(user_id=user_id, entry_date=MONDAY - timedelta(days=3), weight=90.0)
+    services.record_weight(user_id=user_id, entry_date=MONDAY + timedelta(days=2), weight=80.0)
+    for offset in range(4):
+        day = MONDAY + timedelta(days=offset)
+        services.log_food(
+            user_id=user_id, entry_date=day, food_name="Oats", measure="1 cup", qty=1, kcal=1000, protein=5, fat=3, carbs=27
+        )
+    profile = services.load_profile(user_id)
+    assert profile.weight_kg == 80.0
+
+    trends = services.get_trends(user_id, MONDAY, MONDAY + timedelta(days=6), profile)
+    expected = 2 * _tdee(profile, 90.0) + 2 * _tdee(profile, 80.0) - 4 * 1000
+    assert trends.days_logged == 4
+    assert trends.buckets[0]["deficit_total"] == pytest.approx(round(expected, 1))
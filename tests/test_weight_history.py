@@ -0,0 +1,39 @@
+from datetime import date, timedelta
+
+import pytest
+
+from weight_tracker import services
+from weight_tracker.services import _lttb
+
+
+def test_lttb_keeps_the_ends_and_the_spike():
+    xs = list(range(100))
+    ys = [70.0] * 100
+    ys[37] = 90.0
+    indices = _lttb(xs, ys, 10)
+    assert len(indices) == 10
+    assert indices[0] == 0 and indices[-1] == 99
+    assert indices == sorted(set(indices))
+    assert 37 in indices
+
+
+@pytest.mark.parametrize("threshold", [2, 100, 500])
+def test_lttb_returns_every_point_when_it_cannot_reduce(threshold):
+    assert _lttb(list(range(100)), [1.0] * 100, threshold) == list(range(100))
+
+
+def test_weight_history_downsamples_only_when_asked(database):
+    user_id = services.create_user("lin", "correct horse").id
+    first = date(2024, 1, 1)
+    for day in range(60):
+        services.record_weight(user_id=user_id, entry_date=first + timedelta(days=day), weight=80 - day * 0.1)
+
+    full = services.get_weight_history(user_id)
+    assert full.total_points == 60 and len(full.entries) == 60
+    sampled = services.get_weight_history(user_id, max_points=12)
+    assert sampled.total_points == 60 and len(sampled.entries) == 12
+    assert sampled.entries[0] == full.entries[0] and sampled.entries[-1] == full.entries[-1]
+    zoomed = services.get_weight_history(user_id, start=first, end=first + timedelta(days=9), max_points=12)
+    assert len(zoomed.entries) == 10
+    with pytest.raises(ValueError):
+        services.get_weight_history(user_id, max_points=2)
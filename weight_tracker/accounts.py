@@ -0,0 +1,133 @@
+"""Streaming export and chunked deletion of everything stored for one account.
+
+Per-user tables may live in a shard file that has no ``users`` table, so rows
+cannot be removed by ``ON DELETE CASCADE`` foreign keys. Deletion instead runs
+set-based ``DELETE ... WHERE id IN (SELECT id ... LIMIT n)`` statements, one
+short transaction per chunk: nothing is loaded into the session, memory stays
+flat and other writers get the lock between chunks.
+
+The export is JSON Lines: a header line, then one ``{"table", "row"}`` line per
+row, read with keyset pagination so memory is bounded by one chunk (or one
+archived month, whose entries are exported unpacked as ``food_logs`` or
+``exercise_logs`` rows marked ``"archived": true``).
+"""
+from __future__ import annotations
+
+import base64
+from datetime import date, datetime, time
+import json
+import os
+from typing import Any, Dict, Iterator
+
+from sqlalchemy import delete, select
+
+from . import db, models
+from .archive import unpack
+from .shards import SHARDED_MODELS, router, user_filter
+
+CHUNK_SIZE = int(os.environ.get("WEIGHT_TRACKER_ACCOUNT_CHUNK", 1000))
+EXPORT_FORMAT = "weight-tracker-export/1"
+
+
+def _jsonable(value: Any) -> Any:
+    if isinstance(value, (date, datetime, time)):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        return base64.b64encode(value).decode("ascii")
+    return value
+
+
+def _line(document: Dict[str, Any]) -> str:
+    return json.dumps(document, separators=(",", ":"), default=_jsonable) + "\n"
+
+
+def _rows(factory, model, where, chunk_size: int) -> Iterator[Dict[str, Any]]:
+    """Rows of ``model`` matching ``where``, ``chunk_size`` at a time by primary key."""
+    table = model.__table__
+    if "id" not in table.c:
+        with db.session_scope(factory) as session:
+            rows = session.execute(select(table).where(where)).mappings().all()
+        yield from rows
+        return
+    last = 0
+    while True:
+        # A session per chunk, so a slow reader never holds a transaction open.
+        with db.session_scope(factory) as session:
+            chunk = (
+                session.execute(select(table).where(where, table.c.id > last).order_by(table.c.id).limit(chunk_size))
+                .mappings()
+                .all()
+            )
+        yield from chunk
+        if len(chunk) < chunk_size:
+            return
+        last = chunk[-1]["id"]
+
+
+def iter_export(user_id: int, username: str, *, chunk_size: int = CHUNK_SIZE) -> Iterator[str]:
+    """The account's data as JSON Lines, produced lazily."""
+    with db.get_session() as session:
+        user = session.get(models.User, user_id)
+        if user is None:
+            raise ValueError("User not found")
+        header = {"format": EXPORT_FORMAT, "username": user.username, "user_id": user_id, "created_at": user.created_at}
+    yield _line({**header, "exported_at": datetime.utcnow()})
+
+    factory = router.factory(router.shard_of(user_id))
+    for model in SHARDED_MODELS:
+        name = model.__tablename__
+        for row in _rows(factory, model, user_filter(model, user_id, username), chunk_size):
+            if model is models.LogArchive:
+                kind = "food_logs" if row["kind"] == "food" else "exercise_logs"
+                for entry in unpack(row["payload"]):
+                    yield _line({"table": kind, "archived": True, "row": entry})
+                continue
+            yield _line({"table": name, "row": dict(row)})
+
+    owned = models.FoodItem.owner_id == user_id
+    for row in _rows(db.SessionLocal, models.FoodItem, owned, chunk_size):
+        yield _line({"table": "food_items", "row": dict(row)})
+        with db.get_session() as session:
+            recipe = session.execute(
+                select(models.Recipe.__table__).where(models.Recipe.food_item_id == row["id"])
+            ).mappings().first()
+            ingredients = []
+            if recipe is not None:
+                ingredients = session.execute(
+                    select(models.RecipeIngredient.__table__).where(models.RecipeIngredient.recipe_id == recipe["id"])
+                ).mappings().all()
+        if recipe is not None:
+            yield _line({"table": "recipes", "row": {**recipe, "ingredients": [dict(item) for item in ingredients]}})
+
+
+def export_account(user_id: int, username: str, out, *, chunk_size: int = CHUNK_SIZE) -> int:
+    """Write the JSON Lines export to the text stream ``out``; returns the number of lines."""
+    count = 0
+    for line in iter_export(user_id, username, chunk_size=chunk_size):
+        out.write(line)
+        count += 1
+    return count
+
+
+def _delete_chunked(factory, model, where, chunk_size: int) -> int:
+    table = model.__table__
+    if "id" not in table.c:
+        with db.session_scope(factory) as session:
+            return session.execute(delete(table).where(where)).rowcount
+    deleted = 0
+    while True:
+        with db.session_scope(factory) as session:
+            ids = select(table.c.id).where(where).limit(chunk_size).scalar_subquery()
+            count = session.execute(delete(table).where(table.c.id.in_(ids))).rowcount
+        deleted += count
+        if count < chunk_size:
+            return deleted
+
+
+def purge_user_rows(user_id: int, username: str, *, chunk_size: int = CHUNK_SIZE) -> Dict[str, int]:
+    """Delete the account's rows from its shard (or the main DB), table by table, in chunks."""
+    factory = router.factory(router.shard_of(user_id))
+    return {
+        model.__tablename__: _delete_chunked(factory, model, user_filter(model, user_id, username), chunk_size)
+        for model in SHARDED_MODELS
+    }
@@ -0,0 +1,88 @@
+"""Server-side MET activity catalog, loaded from the static app's ``docs/data.json``.
+
+Activities are keyed by name (the label without its ``(x METs)`` suffix, so
+``"Walking (3.5 METs)"`` is ``"Walking"``) for O(1) lookups from logged exercise
+types, and grouped by category for pickers.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+import json
+import os
+from pathlib import Path
+import re
+from typing import Dict, List, Optional, Tuple
+
+from .db import ROOT
+
+CATALOG_PATH = Path(os.environ.get("WEIGHT_TRACKER_ACTIVITY_CATALOG", ROOT / "docs" / "data.json"))
+DEFAULT_MET = 3.5
+
+_MET_SUFFIX = re.compile(r"\s*\(\s*[\d.]+\s*METs?\s*\)\s*$", re.IGNORECASE)
+
+# Used when the catalog file is missing, so exercise logging keeps working.
+_FALLBACK = (
+    ("Cardio", "Walking", 3.5),
+    ("Cardio", "Jogging", 7.0),
+    ("Cycling", "Cycling", 6.0),
+    ("Strength", "Weightlifting", 4.0),
+)
+
+
+@dataclass(frozen=True, slots=True)
+class Activity:
+    name: str
+    category: str
+    met: float
+
+
+def exercise_kcal(met: float, weight_kg: float, mins: float) -> float:
+    """Calories burned: ``MET * 3.5 * kg / 200`` per minute."""
+    return met * 3.5 * weight_kg / 200 * mins
+
+
+class ActivityCatalog:
+    def __init__(self, activities: List[Activity]):
+        self.activities: Tuple[Activity, ...] = tuple(activities)
+        self._by_name: Dict[str, Activity] = {activity.name.lower(): activity for activity in self.activities}
+        self._by_category: Dict[str, List[Activity]] = {}
+        for activity in self.activities:
+            self._by_category.setdefault(activity.category, []).append(activity)
+
+    @classmethod
+    def load(cls, path: Path = CATALOG_PATH) -> "ActivityCatalog":
+        try:
+            raw = json.loads(path.read_text(encoding="utf-8")).get("activities", [])
+        except (OSError, ValueError):
+            raw = []
+        activities = [
+            Activity(
+                name=_MET_SUFFIX.sub("", entry["label"]).strip(),
+                category=entry.get("category", "Other"),
+                met=float(entry["met"]),
+            )
+            for entry in raw
+            if entry.get("label") and entry.get("met") is not None
+        ]
+        if not activities:
+            activities = [Activity(name=name, category=category, met=met) for category, name, met in _FALLBACK]
+        return cls(activities)
+
+    def get(self, name: str) -> Optional[Activity]:
+        return self._by_name.get(name.strip().lower())
+
+    def met(self, name: str, default: float = DEFAULT_MET) -> float:
+        activity = self.get(name)
+        return activity.met if activity else default
+
+    def names(self) -> List[str]:
+        return [activity.name for activity in self.activities]
+
+    def by_category(self) -> Dict[str, List[Activity]]:
+        return {category: list(items) for category, items in self._by_category.items()}
+
+    def met_table(self) -> Dict[str, float]:
+        return {activity.name: activity.met for activity in self.activities}
+
+
+activity_catalog = ActivityCatalog.load()
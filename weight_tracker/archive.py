@@ -0,0 +1,194 @@
+"""Cold archival of old food and exercise log rows into compressed monthly partitions.
+
+Rows dated before the archive cutoff move out of ``food_logs``/``exercise_logs``
+into ``log_archives``: one row per user, kind and calendar month whose ``payload``
+is the zlib-compressed JSON of the entries. Each partition also keeps per-day
+totals, so the series cache (and every trend built on it) still covers archived
+days without decompressing anything. Entry-level reads include archived rows only
+when asked (``services.get_log_range(..., include_archive=True)``).
+"""
+from __future__ import annotations
+
+from datetime import date, datetime, time, timedelta
+import json
+import os
+import zlib
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import delete, func, select
+
+from .shards import user_session
+from . import models
+
+# 0 (the default) leaves archival off; scripts/archive_logs.py can still be run by hand.
+ARCHIVE_AFTER_DAYS = int(os.environ.get("WEIGHT_TRACKER_ARCHIVE_AFTER_DAYS", 0))
+FOOD, EXERCISE = "food", "exercise"
+
+_KINDS = {
+    FOOD: (models.FoodLog, ("id", "date", "food_name", "measure", "qty", "kcal", "protein", "fat", "carbs", "created_at")),
+    EXERCISE: (models.ExerciseLog, ("id", "date", "type", "start", "end", "mins", "kcal_burn", "created_at")),
+}
+
+
+def _json_value(value: Any) -> Any:
+    if isinstance(value, (date, datetime, time)):
+        return value.isoformat()
+    return value
+
+
+def pack(columns: Tuple[str, ...], rows: List[Tuple]) -> bytes:
+    document = {"columns": list(columns), "rows": [[_json_value(value) for value in row] for row in rows]}
+    return zlib.compress(json.dumps(document, separators=(",", ":")).encode("utf-8"), 6)
+
+
+def unpack(payload: bytes) -> List[Dict[str, Any]]:
+    """Rows of a partition as dicts; dates and times stay ISO strings."""
+    document = json.loads(zlib.decompress(payload))
+    columns = document["columns"]
+    return [dict(zip(columns, row)) for row in document["rows"]]
+
+
+def _day_totals(kind: str, rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    totals: Dict[str, Any] = {}
+    for row in rows:
+        if kind == FOOD:
+            day = totals.setdefault(row["date"], [0, 0.0, 0.0, 0.0, 0.0])
+            day[0] += 1
+            day[1] += row["kcal"] or 0.0
+            day[2] += row["protein"] or 0.0
+            day[3] += row["fat"] or 0.0
+            day[4] += row["carbs"] or 0.0
+        else:
+            totals[row["date"]] = totals.get(row["date"], 0.0) + (row["kcal_burn"] or 0.0)
+    return totals
+
+
+def archive_cutoff(older_than_days: int, today: Optional[date] = None) -> date:
+    """First day of the month holding ``today - older_than_days``: only whole months are archived."""
+    boundary = (today or date.today()) - timedelta(days=older_than_days)
+    return boundary.replace(day=1)
+
+
+def _next_month(day: date) -> date:
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def archive_user(user_id: int, cutoff: date) -> Dict[str, int]:
+    """Move a user's food and exercise rows dated before ``cutoff`` into monthly partitions.
+
+    Each month is its own transaction, so memory and lock time stay bounded by one
+    month of one user's entries. Months archived earlier are merged with any rows
+    logged into them since.
+    """
+    counts = {"food": 0, "exercise": 0, "partitions": 0}
+    for kind, (model, columns) in _KINDS.items():
+        while True:
+            with user_session(user_id) as session:
+                oldest = session.scalar(select(func.min(model.date)).where(model.user_id == user_id, model.date < cutoff))
+                if oldest is None:
+                    break
+                start = oldest.replace(day=1)
+                end = min(_next_month(start), cutoff)
+                rows = session.execute(
+                    select(*(getattr(model, column) for column in columns))
+                    .where(model.user_id == user_id, model.date >= start, model.date < end)
+                    .order_by(model.date.asc(), model.id.asc())
+                ).all()
+                month = start.isoformat()[:7]
+                partition = session.scalar(
+                    select(models.LogArchive).where(
+                        models.LogArchive.user_id == user_id,
+                        models.LogArchive.kind == kind,
+                        models.LogArchive.month == month,
+                    )
+                )
+                if partition is None:
+                    partition = models.LogArchive(user_id=user_id, kind=kind, month=month)
+                    session.add(partition)
+                    archived = [tuple(row) for row in rows]
+                else:
+                    previous = unpack(partition.payload)
+                    archived = [tuple(entry[column] for column in columns) for entry in previous] + [tuple(row) for row in rows]
+                partition.payload = pack(columns, archived)
+                partition.row_count = len(archived)
+                partition.day_totals = _day_totals(kind, [dict(zip(columns, map(_json_value, row))) for row in archived])
+                partition.updated_at = datetime.utcnow()
+                session.execute(delete(model).where(model.user_id == user_id, model.date >= start, model.date < end))
+            counts[kind] += len(rows)
+            counts["partitions"] += 1
+    return counts
+
+
+def delete_archived_day(session, user_id: int, kind: str, day: date) -> int:
+    """Remove the archived entries of ``kind`` dated ``day`` from their partition; returns how many.
+
+    The month's payload and day totals are rewritten (or the partition dropped when
+    it empties) inside the caller's transaction.
+    """
+    partition = session.scalar(
+        select(models.LogArchive).where(
+            models.LogArchive.user_id == user_id,
+            models.LogArchive.kind == kind,
+            models.LogArchive.month == day.isoformat()[:7],
+        )
+    )
+    if partition is None:
+        return 0
+    entries = unpack(partition.payload)
+    kept = [entry for entry in entries if entry["date"] != day.isoformat()]
+    if len(kept) == len(entries):
+        return 0
+    if not kept:
+        session.delete(partition)
+    else:
+        columns = _KINDS[kind][1]
+        partition.payload = pack(columns, [tuple(entry[column] for column in columns) for entry in kept])
+        partition.row_count = len(kept)
+        partition.day_totals = _day_totals(kind, kept)
+        partition.updated_at = datetime.utcnow()
+    return len(entries) - len(kept)
+
+
+def archived_day_totals(session, user_id: int, kind: str) -> Iterator[Tuple[date, Any]]:
+    """``(day, totals)`` for every archived day; food totals are ``[count, kcal, protein, fat, carbs]``."""
+    rows = session.execute(
+        select(models.LogArchive.day_totals).where(models.LogArchive.user_id == user_id, models.LogArchive.kind == kind)
+    ).scalars()
+    for totals in rows:
+        for day, value in totals.items():
+            yield date.fromisoformat(day), value
+
+
+def archived_rows(session, user_id: int, kind: str, start: date, end: date) -> List[Dict[str, Any]]:
+    """Archived rows of ``kind`` dated ``start..end``; only the partitions for those months are unpacked."""
+    payloads = session.execute(
+        select(models.LogArchive.payload)
+        .where(
+            models.LogArchive.user_id == user_id,
+            models.LogArchive.kind == kind,
+            models.LogArchive.month >= start.isoformat()[:7],
+            models.LogArchive.month <= end.isoformat()[:7],
+        )
+        .order_by(models.LogArchive.month.asc())
+    ).scalars()
+    first, last = start.isoformat(), end.isoformat()
+    return [row for payload in payloads for row in unpack(payload) if first <= row["date"] <= last]
+
+
+def archive_stats(user_id: int) -> Dict[str, Dict[str, int]]:
+    """Partitions, archived rows and compressed bytes per kind for one user."""
+    stats = {kind: {"partitions": 0, "rows": 0, "bytes": 0} for kind in _KINDS}
+    with user_session(user_id) as session:
+        rows = session.execute(
+            select(
+                models.LogArchive.kind,
+                func.count(models.LogArchive.id),
+                func.sum(models.LogArchive.row_count),
+                func.sum(func.length(models.LogArchive.payload)),
+            )
+            .where(models.LogArchive.user_id == user_id)
+            .group_by(models.LogArchive.kind)
+        ).all()
+    for kind, partitions, count, size in rows:
+        stats[kind] = {"partitions": partitions, "rows": count or 0, "bytes": size or 0}
+    return stats
@@ -0,0 +1,224 @@
+"""Online backup and restore of the SQLite databases (the main file and every shard).
+
+Backups use SQLite's online backup API. In WAL mode (the default, see
+``db.SQLITE_WAL``) the copy reads one consistent snapshot while writers carry on
+appending to the log, so it runs in a single step. With a rollback journal the
+source is locked while a step runs, so pages are copied ``pages`` at a time and
+writers wait for one step at most instead of the whole copy. A write from another
+connection between steps restarts the copy; after ``max_restarts`` restarts the
+rest is done in one step so a busy database still gets backed up.
+
+A backup set is a timestamped directory with one file per database (gzip-compressed
+with ``compress=True``) and a ``manifest.json`` holding each file's SHA-256.
+Databases are copied one after another, so each file is consistent on its own.
+"""
+from __future__ import annotations
+
+from dataclasses import asdict, dataclass
+from datetime import datetime
+import gzip
+import hashlib
+import json
+import os
+from pathlib import Path
+import shutil
+import sqlite3
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+from . import db
+from .db import DATA_DIR
+from .shards import MAIN_SHARD, router
+
+BACKUP_DIR = Path(os.environ.get("WEIGHT_TRACKER_BACKUP_DIR", DATA_DIR / "backups"))
+BACKUP_KEEP = int(os.environ.get("WEIGHT_TRACKER_BACKUP_KEEP", 7))
+STEP_PAGES = int(os.environ.get("WEIGHT_TRACKER_BACKUP_STEP_PAGES", 256))
+STEP_SLEEP = float(os.environ.get("WEIGHT_TRACKER_BACKUP_STEP_SLEEP_MS", 5)) / 1000
+MANIFEST = "manifest.json"
+_CHUNK = 1024 * 1024
+
+
+class BackupError(RuntimeError):
+    """A backup set that is missing files or fails its checksums."""
+
+
+@dataclass(frozen=True, slots=True)
+class BackupFile:
+    shard: str
+    file: str
+    bytes: int
+    raw_bytes: int
+    sha256: str
+    pages: int
+    steps: int
+    restarts: int
+    seconds: float
+
+
+class _Abort(Exception):
+    pass
+
+
+def database_path(shard: str) -> Path:
+    return Path(router.engine(shard).url.database)
+
+
+def copy_database(
+    source: Path,
+    target: Path,
+    *,
+    pages: int = STEP_PAGES,
+    sleep: float = STEP_SLEEP,
+    max_restarts: int = 3,
+) -> Dict[str, int]:
+    """Copy ``source`` into ``target`` with the online backup API; returns page/step/restart counts.
+
+    ``pages`` only applies to rollback-journal sources; WAL sources are copied in one step.
+    """
+    counts = {"pages": 0, "steps": 0, "restarts": 0}
+    previous = [None]
+
+    def progress(status, remaining, total):
+        counts["steps"] += 1
+        counts["pages"] = total
+        if previous[0] is not None and remaining > previous[0]:
+            counts["restarts"] += 1
+            if counts["restarts"] > max_restarts:
+                raise _Abort()
+        previous[0] = remaining
+
+    src = sqlite3.connect(str(source))
+    dst = sqlite3.connect(str(target))
+    try:
+        if src.execute("PRAGMA journal_mode").fetchone()[0] == "wal":
+            pages = -1
+        try:
+            src.backup(dst, pages=pages, progress=progress, sleep=sleep)
+        except _Abort:
+            # Writes keep restarting the stepped copy: take it in one step instead.
+            src.backup(dst, pages=-1, progress=progress)
+    finally:
+        dst.close()
+        src.close()
+    return counts
+
+
+def backup_database(shard: str, directory: Path, *, compress: bool = False, **options) -> BackupFile:
+    """Back up one database (``"main"`` or a shard name) into ``directory``."""
+    source = database_path(shard)
+    name = f"{shard}.db.gz" if compress else f"{shard}.db"
+    started = time.perf_counter()
+    with tempfile.TemporaryDirectory(dir=directory) as scratch:
+        raw = Path(scratch) / f"{shard}.db"
+        counts = copy_database(source, raw, **options)
+        raw_bytes = raw.stat().st_size
+        if compress:
+            with open(raw, "rb") as reader, gzip.open(directory / name, "wb") as writer:
+                shutil.copyfileobj(reader, writer, _CHUNK)
+        else:
+            raw.replace(directory / name)
+    # The checksum covers the file as stored, so a set can be verified without unpacking it.
+    checksum = _file_sha256(directory / name)
+    return BackupFile(
+        shard=shard,
+        file=name,
+        bytes=(directory / name).stat().st_size,
+        raw_bytes=raw_bytes,
+        sha256=checksum,
+        seconds=round(time.perf_counter() - started, 3),
+        **counts,
+    )
+
+
+def backup_all(
+    root: Path = BACKUP_DIR,
+    *,
+    compress: bool = True,
+    keep: Optional[int] = BACKUP_KEEP,
+    **options,
+) -> Path:
+    """Back up the main database and every shard into a new set under ``root``; returns its directory.
+
+    Sets beyond the newest ``keep`` are deleted afterwards.
+    """
+    directory = root / datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+    partial = directory.with_name(directory.name + ".partial")
+    partial.mkdir(parents=True)
+    try:
+        files = [
+            backup_database(shard, partial, compress=compress, **options)
+            for shard in [MAIN_SHARD] + router.shards_on_disk()
+        ]
+        manifest = {"created_at": datetime.utcnow().isoformat(), "files": [asdict(entry) for entry in files]}
+        (partial / MANIFEST).write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+        # Only complete sets carry the final name, so an interrupted backup is never restored.
+        partial.rename(directory)
+    except Exception:
+        shutil.rmtree(partial, ignore_errors=True)
+        raise
+    if keep:
+        for old in list_backups(root)[keep:]:
+            shutil.rmtree(old)
+    return directory
+
+
+def list_backups(root: Path = BACKUP_DIR) -> List[Path]:
+    """Complete backup sets, newest first."""
+    if not root.exists():
+        return []
+    return sorted((path for path in root.iterdir() if (path / MANIFEST).exists()), reverse=True)
+
+
+def _file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as stored:
+        while chunk := stored.read(_CHUNK):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def verify_backup(directory: Path) -> List[Dict]:
+    """Check every file of a set against its manifest; returns the manifest entries."""
+    try:
+        manifest = json.loads((directory / MANIFEST).read_text(encoding="utf-8"))
+    except (OSError, ValueError) as exc:
+        raise BackupError(f"{directory}: unreadable manifest ({exc})") from exc
+    for entry in manifest["files"]:
+        path = directory / entry["file"]
+        if not path.exists():
+            raise BackupError(f"{path}: missing")
+        if _file_sha256(path) != entry["sha256"]:
+            raise BackupError(f"{path}: checksum mismatch")
+    return manifest["files"]
+
+
+def restore_backup(directory: Path, *, shards: Optional[List[str]] = None, pages: int = -1) -> List[str]:
+    """Restore a verified backup set (optionally only ``shards``) over the live databases.
+
+    The copy goes through the backup API as well, so open connections see the
+    restored pages instead of a file swapped out under them; by default each file
+    goes in one step, the fastest way. Returns the restored names.
+
+    Afterwards this process's caches (profiles, series, shard placements, revoked
+    users, the catalog) are dropped through :func:`db.reset_caches`. Other processes
+    keep theirs, so after a restore from ``scripts/backup_db.py`` restart the backend.
+    """
+    entries = verify_backup(directory)
+    if shards is not None:
+        entries = [entry for entry in entries if entry["shard"] in shards]
+    restored = []
+    for entry in entries:
+        source = directory / entry["file"]
+        with tempfile.TemporaryDirectory() as scratch:
+            if entry["file"].endswith(".gz"):
+                unpacked = Path(scratch) / f"{entry['shard']}.db"
+                with gzip.open(source, "rb") as reader, open(unpacked, "wb") as writer:
+                    shutil.copyfileobj(reader, writer, _CHUNK)
+                source = unpacked
+            copy_database(source, database_path(entry["shard"]), pages=pages, sleep=0)
+        restored.append(entry["shard"])
+    if restored:
+        # Everything cached so far was read from the rows the restore just replaced.
+        db.reset_caches()
+    return restored
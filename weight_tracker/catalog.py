@@ -0,0 +1,172 @@
+"""The merged global food and activity catalog served to the static app (``GET /api/catalog``).
+
+The catalog is ``docs/data.json`` with the global food items of the database
+(``owner_id`` NULL) merged over it by name. Its version is ``"<base>.<seq>"``:
+``base`` is a hash of ``data.json`` and ``seq`` the last ``catalog_changes`` row,
+which every write to a global item appends in its own transaction. Each version
+is serialized and gzip-compressed once, with strong ETags over the exact bytes;
+a client that sends the version it holds gets only the foods changed since.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+import gzip
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, insert, select
+
+from . import models
+from .activities import CATALOG_PATH
+from .cache import MISSING, LRUCache
+from .db import get_session, on_configure
+from .responses import dumps
+
+# Deltas are cached per (since, version); clients a few versions behind share them.
+DELTA_CACHE_SIZE = int(os.environ.get("WEIGHT_TRACKER_CATALOG_DELTAS", 64))
+FOOD_FIELDS = ("name", "measure", "kcal", "protein", "fat", "carbs", "category")
+
+
+@dataclass(frozen=True, slots=True)
+class CatalogBody:
+    """One encoded catalog response: the JSON bytes and their gzip, each with its strong ETag."""
+
+    version: str
+    body: bytes
+    etag: str
+    gzip_body: bytes
+    gzip_etag: str
+
+
+def _encode(version: str, document: Dict[str, Any]) -> CatalogBody:
+    body = dumps(document)
+    # mtime=0 keeps the compressed bytes, and so the ETag, the same in every process.
+    compressed = gzip.compress(body, 9, mtime=0)
+    return CatalogBody(
+        version=version,
+        body=body,
+        etag=f'"{hashlib.sha256(body).hexdigest()[:20]}"',
+        gzip_body=compressed,
+        gzip_etag=f'"{hashlib.sha256(compressed).hexdigest()[:20]}-gz"',
+    )
+
+
+def _load_static(path=CATALOG_PATH) -> Tuple[str, List[Dict[str, Any]], List[Dict[str, Any]]]:
+    try:
+        raw = path.read_bytes()
+        document = json.loads(raw)
+    except (OSError, ValueError):
+        raw, document = b"", {}
+    return hashlib.sha256(raw).hexdigest()[:8], list(document.get("foods", [])), list(document.get("activities", []))
+
+
+def record_changes(session, names: Iterable[str]) -> None:
+    """Bump the catalog version for global items ``names`` (in ``session``'s transaction)."""
+    rows = [{"food_name": name} for name in sorted(set(names))]
+    if rows:
+        session.execute(insert(models.CatalogChange), rows)
+
+
+def _global_foods(session, names: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, Any]]:
+    stmt = (
+        select(*(getattr(models.FoodItem, field) for field in FOOD_FIELDS))
+        .where(models.FoodItem.owner_id.is_(None))
+        .order_by(models.FoodItem.id.asc())
+    )
+    if names is not None:
+        stmt = stmt.where(models.FoodItem.name.in_(list(names)))
+    # Later rows win, as they do in the merged catalog.
+    return {row.name: dict(row._mapping) for row in session.execute(stmt)}
+
+
+class Catalog:
+    """Encoded catalog bodies, built at most once per version and per (since, version)."""
+
+    def __init__(self, path=CATALOG_PATH, delta_cache_size: int = DELTA_CACHE_SIZE):
+        self.base, self._static_foods, self._activities = _load_static(path)
+        self._static_by_name = {food["name"]: food for food in self._static_foods if food.get("name")}
+        self._full: Optional[CatalogBody] = None
+        self._deltas = LRUCache(maxsize=delta_cache_size)
+        self._lock = threading.Lock()
+        self.builds = 0
+
+    def version(self, session) -> str:
+        seq = session.scalar(select(func.max(models.CatalogChange.id))) or 0
+        return f"{self.base}.{seq}"
+
+    def _seq(self, version: str) -> Optional[int]:
+        base, _, seq = version.partition(".")
+        if base != self.base or not seq.isdigit():
+            return None
+        return int(seq)
+
+    def full(self) -> CatalogBody:
+        with get_session() as session:
+            version = self.version(session)
+            cached = self._full
+            if cached is not None and cached.version == version:
+                return cached
+            with self._lock:
+                if self._full is not None and self._full.version == version:
+                    return self._full
+                merged = {**self._static_by_name, **_global_foods(session)}
+                self._full = _encode(
+                    version, {"version": version, "foods": list(merged.values()), "activities": self._activities}
+                )
+                self.builds += 1
+                return self._full
+
+    def delta(self, since: str) -> CatalogBody:
+        """Foods changed since version ``since``, or the full catalog if ``since`` is not one we can diff from."""
+        with get_session() as session:
+            version = self.version(session)
+            old, new = self._seq(since), self._seq(version)
+            if old is None or old > new:
+                names = None
+            else:
+                cached = self._deltas.get((since, version))
+                if cached is not MISSING:
+                    return cached
+                names = set(
+                    session.scalars(
+                        select(models.CatalogChange.food_name).where(
+                            models.CatalogChange.id > old, models.CatalogChange.id <= new
+                        )
+                    )
+                )
+                current = _global_foods(session, names)
+        if names is None:
+            return self.full()
+        upsert, removed = [], []
+        for name in sorted(names):
+            food = current.get(name) or self._static_by_name.get(name)
+            if food is None:
+                removed.append(name)
+            else:
+                upsert.append(food)
+        body = _encode(version, {"version": version, "since": since, "foods": {"upsert": upsert, "delete": removed}})
+        self._deltas.set((since, version), body)
+        return body
+
+    def reset(self) -> None:
+        """Forget encoded bodies (the database was switched)."""
+        with self._lock:
+            self._full = None
+        self._deltas.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        full = self._full
+        return {
+            "version": full.version if full else None,
+            "builds": self.builds,
+            "bytes": len(full.body) if full else 0,
+            "gzip_bytes": len(full.gzip_body) if full else 0,
+            "deltas": self._deltas.stats(),
+        }
+
+
+catalog = Catalog()
+on_configure(catalog.reset)
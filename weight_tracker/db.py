@@ -1,32 +1,148 @@
 from __future__ import annotations
 
 from contextlib import contextmanager
+import logging
+import os
 from pathlib import Path
+import sqlite3
+import threading
+from typing import Callable, List, Optional, Union
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.engine import Engine, make_url
 from sqlalchemy.orm import DeclarativeBase, sessionmaker
+from sqlalchemy.pool import StaticPool
+
+logger = logging.getLogger(__name__)
 
 ROOT = Path(__file__).resolve().parent.parent
 DATA_DIR = ROOT / "data"
 DATA_DIR.mkdir(exist_ok=True)
 DATABASE_PATH = DATA_DIR / "app.db"
-DATABASE_URL = f"sqlite:///{DATABASE_PATH}"
+# WEIGHT_TRACKER_DATABASE_URL=sqlite:// runs a process (a test worker, a benchmark)
+# against a private in-memory database instead of data/app.db.
+DATABASE_URL = os.environ.get("WEIGHT_TRACKER_DATABASE_URL") or f"sqlite:///{DATABASE_PATH}"
+
+# Write-ahead logging lets readers (including online backups) run alongside the
+# single writer instead of blocking it; WEIGHT_TRACKER_SQLITE_WAL=0 keeps the
+# rollback journal.
+SQLITE_WAL = os.environ.get("WEIGHT_TRACKER_SQLITE_WAL", "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+def is_memory_url(url: str) -> bool:
+    return make_url(url).database in (None, "", ":memory:")
+
+
+def create_sqlite_engine(url: str) -> Engine:
+    """Engine for one SQLite file, shared by the main database and every shard."""
+    if is_memory_url(url):
+        return create_memory_engine(schema=False)
+    engine = create_engine(url, echo=False, connect_args={"check_same_thread": False})
+    if SQLITE_WAL:
 
-engine = create_engine(
-    DATABASE_URL,
-    echo=False,
-    connect_args={"check_same_thread": False},
-)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        @event.listens_for(engine, "connect")
+        def _use_wal(dbapi_connection, connection_record):
+            dbapi_connection.execute("PRAGMA journal_mode=WAL")
+
+    return engine
 
 
 class Base(DeclarativeBase):
     """Base declarative class for ORM."""
 
 
+_template: Optional[sqlite3.Connection] = None
+_template_lock = threading.Lock()
+
+
+def _schema_template() -> sqlite3.Connection:
+    """An in-memory database holding the empty schema, built once per process."""
+    global _template
+    with _template_lock:
+        if _template is None:
+            from . import models  # noqa: F401  Ensure model metadata is registered
+
+            template = create_engine(
+                "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+            )
+            Base.metadata.create_all(bind=template)
+            _template = template.raw_connection().driver_connection
+        return _template
+
+
+def create_memory_engine(*, schema: bool = True) -> Engine:
+    """Engine for a private in-memory database, empty or with every table and index created.
+
+    All sessions share its single connection (a second one would open another,
+    empty database), so it suits one thread at a time; concurrent benchmarks
+    should use a temporary file. The schema is copied from a per-process
+    template with SQLite's backup API, which takes well under a millisecond.
+    """
+
+    def connect() -> sqlite3.Connection:
+        connection = sqlite3.connect(":memory:", check_same_thread=False)
+        if schema:
+            _schema_template().backup(connection)
+        return connection
+
+    return create_engine("sqlite://", echo=False, creator=connect, poolclass=StaticPool)
+
+
+engine = create_sqlite_engine(DATABASE_URL)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+
+# Called after configure() switched databases, or reset_caches() after their contents
+# were replaced, to drop state that refers to the old rows.
+_configure_hooks: List[Callable[[], None]] = []
+
+
+def on_configure(hook: Callable[[], None]) -> Callable[[], None]:
+    _configure_hooks.append(hook)
+    return hook
+
+
+def reset_caches() -> None:
+    """Run the ``on_configure`` hooks, dropping this process's caches of rows and shard placements."""
+    for hook in _configure_hooks:
+        hook()
+
+
+def configure(target: Union[str, Engine]) -> Engine:
+    """Point the app (``engine``, ``SessionLocal`` and every session helper) at another database.
+
+    ``target`` is a URL or an engine. Returns the previous engine; schema creation
+    is left to the caller (``init_db``), as is disposing of the old engine.
+    """
+    global engine
+    previous = engine
+    engine = create_sqlite_engine(target) if isinstance(target, str) else target
+    SessionLocal.configure(bind=engine)
+    reset_caches()
+    return previous
+
+
 @contextmanager
-def get_session():
-    session = SessionLocal()
+def isolated_database(url: Optional[str] = None):
+    """Run the block against a fresh database, in memory unless ``url`` is given, then switch back.
+
+    Usable directly as a pytest fixture body (``with db.isolated_database(): yield``);
+    each pytest-xdist worker process gets databases of its own.
+    """
+    fresh = create_memory_engine() if url is None else create_sqlite_engine(url)
+    previous = configure(fresh)
+    try:
+        if url is not None:
+            init_db()
+        yield fresh
+    finally:
+        configure(previous)
+        fresh.dispose()
+
+
+@contextmanager
+def session_scope(factory: sessionmaker):
+    """Commit on success, roll back on error, always close; shared by every session helper."""
+    session = factory()
     try:
         yield session
         session.commit()
@@ -37,7 +153,59 @@ def get_session():
         session.close()
 
 
+@contextmanager
+def get_session():
+    with session_scope(SessionLocal) as session:
+        yield session
+
+
 def init_db():
     from . import models  # noqa: F401  Ensure model metadata is registered
 
     Base.metadata.create_all(bind=engine)
+    create_missing_indexes(engine, Base.metadata.sorted_tables)
+
+
+def _dedupe_weight_logs(connection) -> None:
+    """Migration for ``ux_weight_logs_user_date``: keep the last weigh-in of each ``(user_id, date)``.
+
+    Before that index, a day could hold several weigh-ins; record_weight now upserts
+    one per day, and the latest one written is what it would have kept.
+    """
+    deleted = connection.execute(
+        text(
+            "DELETE FROM weight_logs WHERE rowid NOT IN "
+            "(SELECT MAX(rowid) FROM weight_logs GROUP BY user_id, date)"
+        )
+    ).rowcount
+    if deleted:
+        logger.warning(
+            "Removed %d duplicate weigh-ins (kept the last one of each user and day) for ux_weight_logs_user_date",
+            deleted,
+        )
+
+
+# One-time data migrations run right before a missing index of this name is built.
+INDEX_MIGRATIONS = {"ux_weight_logs_user_date": _dedupe_weight_logs}
+
+
+def create_missing_indexes(bind: Engine, tables) -> None:
+    """Add indexes that ``create_all`` skipped because their table already existed.
+
+    An index listed in ``INDEX_MIGRATIONS`` gets its migration first, in the same
+    transaction. Any other unique index is built as is, so rows that violate it
+    make startup fail instead of being deleted.
+    """
+    inspector = inspect(bind)
+    for table in tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            with bind.begin() as connection:
+                migration = INDEX_MIGRATIONS.get(index.name)
+                if migration is not None:
+                    migration(connection)
+                index.create(bind=connection)
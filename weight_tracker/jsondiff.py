@@ -0,0 +1,73 @@
+"""Compact structural diffs between JSON documents (used for synced-state history).
+
+A diff is a list of operations, each a JSON list so it can be stored as-is:
+
+- ``["set", path, value]``   replace (or add) the value at ``path``
+- ``["del", path]``          remove the dict key at ``path``
+- ``["splice", path, start, end, items]``  replace ``list[start:end]`` with ``items``
+
+Dicts are diffed key by key. Lists are diffed by trimming their common prefix and
+suffix, so appending entries to a long history, or editing one entry in the
+middle, produces a single small splice.
+"""
+from __future__ import annotations
+
+from typing import Any, List, Sequence
+
+Op = List[Any]
+
+
+def diff(old: Any, new: Any) -> List[Op]:
+    ops: List[Op] = []
+    _diff(old, new, [], ops)
+    return ops
+
+
+def _diff(old: Any, new: Any, path: List[Any], ops: List[Op]) -> None:
+    if old == new:
+        return
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key in old:
+            if key not in new:
+                ops.append(["del", path + [key]])
+        for key, value in new.items():
+            if key not in old:
+                ops.append(["set", path + [key], value])
+            else:
+                _diff(old[key], value, path + [key], ops)
+        return
+    if isinstance(old, list) and isinstance(new, list):
+        limit = min(len(old), len(new))
+        start = 0
+        while start < limit and old[start] == new[start]:
+            start += 1
+        end_old, end_new = len(old), len(new)
+        while end_old > start and end_new > start and old[end_old - 1] == new[end_new - 1]:
+            end_old -= 1
+            end_new -= 1
+        ops.append(["splice", path, start, end_old, new[start:end_new]])
+        return
+    ops.append(["set", path, new])
+
+
+def apply(document: Any, ops: Sequence[Op]) -> Any:
+    """Apply ``ops`` to ``document`` in place (returns the result, which may be a new root)."""
+    for op in ops:
+        kind, path = op[0], op[1]
+        if not path:
+            if kind != "set":
+                document[op[2]:op[3]] = op[4]
+            else:
+                document = op[2]
+            continue
+        parent = document
+        for key in path[:-1]:
+            parent = parent[key]
+        key = path[-1]
+        if kind == "set":
+            parent[key] = op[2]
+        elif kind == "del":
+            del parent[key]
+        else:
+            parent[key][op[2]:op[3]] = op[4]
+    return document
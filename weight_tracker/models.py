@@ -1,9 +1,22 @@
 from __future__ import annotations
 
 from datetime import datetime, date, time
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional
 
-from sqlalchemy import JSON, Date, DateTime, Float, ForeignKey, Integer, String, Time, UniqueConstraint
+from sqlalchemy import (
+    JSON,
+    Boolean,
+    Date,
+    DateTime,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    LargeBinary,
+    String,
+    Time,
+    UniqueConstraint,
+)
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from .db import Base
@@ -25,6 +38,15 @@ class User(Base):
     food_items: Mapped[List["FoodItem"]] = relationship(back_populates="owner", cascade="all, delete-orphan")
 
 
+class UserShard(Base):
+    """Directory entry naming the shard that holds a user's per-user tables (see ``shards.py``)."""
+
+    __tablename__ = "user_shards"
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), primary_key=True)
+    shard: Mapped[str] = mapped_column(String(64), nullable=False)
+
+
 class Profile(Base):
     __tablename__ = "profiles"
 
@@ -58,6 +80,47 @@ class FoodItem(Base):
     __table_args__ = (UniqueConstraint("name", "owner_id", name="uq_fooditem_name_owner"),)
 
 
+class Recipe(Base):
+    """A ``FoodItem`` whose per-serving macros are rolled up from ingredient items."""
+
+    __tablename__ = "recipes"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    food_item_id: Mapped[int] = mapped_column(ForeignKey("food_items.id"), unique=True)
+    servings: Mapped[float] = mapped_column(Float, default=1.0)
+
+    food_item: Mapped[FoodItem] = relationship()
+    ingredients: Mapped[List["RecipeIngredient"]] = relationship(back_populates="recipe", cascade="all, delete-orphan")
+
+
+class RecipeIngredient(Base):
+    __tablename__ = "recipe_ingredients"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    recipe_id: Mapped[int] = mapped_column(ForeignKey("recipes.id"), index=True)
+    # Indexed so a changed item finds the recipes that depend on it.
+    ingredient_id: Mapped[int] = mapped_column(ForeignKey("food_items.id"), index=True)
+    qty: Mapped[float] = mapped_column(Float, default=1.0)
+
+    recipe: Mapped[Recipe] = relationship(back_populates="ingredients")
+
+    __table_args__ = (UniqueConstraint("recipe_id", "ingredient_id", name="uq_recipe_ingredient"),)
+
+
+class CatalogChange(Base):
+    """A global food item name whose catalog entry was added, changed or removed.
+
+    The highest ``id`` is the catalog's version; the names above a client's version
+    are what ``catalog.delta`` sends it.
+    """
+
+    __tablename__ = "catalog_changes"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    food_name: Mapped[str] = mapped_column(String(120), nullable=False)
+    changed_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
 class FoodLog(Base):
     __tablename__ = "food_logs"
 
@@ -75,6 +138,8 @@ class FoodLog(Base):
 
     user: Mapped[User] = relationship(back_populates="food_logs")
 
+    __table_args__ = (Index("ix_food_logs_user_date", "user_id", "date"),)
+
 
 class ExerciseLog(Base):
     __tablename__ = "exercise_logs"
@@ -91,6 +156,8 @@ class ExerciseLog(Base):
 
     user: Mapped[User] = relationship(back_populates="exercise_logs")
 
+    __table_args__ = (Index("ix_exercise_logs_user_date", "user_id", "date"),)
+
 
 class WeightEntry(Base):
     __tablename__ = "weight_logs"
@@ -102,6 +169,54 @@ class WeightEntry(Base):
 
     user: Mapped[User] = relationship(back_populates="weight_logs")
 
+    # One weigh-in per day; services.record_weight upserts on it.
+    __table_args__ = (Index("ux_weight_logs_user_date", "user_id", "date", unique=True),)
+
+
+class LogArchive(Base):
+    """A month of one user's food or exercise entries moved out of the hot log tables.
+
+    ``payload`` is the zlib-compressed JSON of the rows; ``day_totals`` keeps the
+    per-day sums the series cache needs, so trends never decompress a partition.
+    """
+
+    __tablename__ = "log_archives"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
+    kind: Mapped[str] = mapped_column(String(10), nullable=False)
+    month: Mapped[str] = mapped_column(String(7), nullable=False)
+    row_count: Mapped[int] = mapped_column(Integer, default=0)
+    day_totals: Mapped[Dict] = mapped_column(JSON, default=dict)
+    payload: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (UniqueConstraint("user_id", "kind", "month", name="uq_log_archive_partition"),)
+
+
+class FoodUsage(Base):
+    """How often and how recently a user logs a food, kept up to date by every food log write.
+
+    ``score`` is an exponentially decayed count stored in growing units: an entry
+    dated ``d`` adds ``2 ** (days(d) / half_life)``, so older scores never need
+    rewriting and ordering by ``score`` ranks foods by their decayed counts.
+    """
+
+    __tablename__ = "food_usage"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
+    food_name: Mapped[str] = mapped_column(String(120), nullable=False)
+    measure: Mapped[str] = mapped_column(String(100), default="1 serving")
+    uses: Mapped[int] = mapped_column(Integer, default=0)
+    score: Mapped[float] = mapped_column(Float, default=0.0)
+    last_used: Mapped[date] = mapped_column(Date, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "food_name", name="uq_food_usage_user_food"),
+        Index("ix_food_usage_user_score", "user_id", "score"),
+    )
+
 
 class SyncedState(Base):
     __tablename__ = "synced_states"
@@ -110,3 +225,63 @@ class SyncedState(Base):
     username: Mapped[str] = mapped_column(String(50), unique=True, nullable=False, index=True)
     state: Mapped[Dict] = mapped_column(JSON, default=dict)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class SyncedStateVersion(Base):
+    """One entry in a username's synced-state history: a full snapshot or a diff from the previous version.
+
+    ``base_version`` is the snapshot a diff chain starts from, so a version is rebuilt
+    from the rows ``base_version..version``; ``depth`` is the number of diffs since it.
+    """
+
+    __tablename__ = "synced_state_versions"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    username: Mapped[str] = mapped_column(String(50), nullable=False)
+    version: Mapped[int] = mapped_column(Integer, nullable=False)
+    base_version: Mapped[int] = mapped_column(Integer, nullable=False)
+    depth: Mapped[int] = mapped_column(Integer, default=0)
+    is_snapshot: Mapped[bool] = mapped_column(Boolean, default=False)
+    payload: Mapped[Any] = mapped_column(JSON, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint("username", "version", name="uq_synced_state_version"),
+        Index("ix_synced_state_versions_user_created", "username", "created_at"),
+    )
+
+
+class SyncedRecord(Base):
+    """One food, exercise or weight record of a username's synced state, for record-level merges.
+
+    ``updated_at`` is the client's last-writer-wins timestamp (ms since the epoch);
+    ``seq`` is the username's change sequence number when the row last changed, so
+    the records a device has not seen are those with ``seq`` above its cursor.
+    Deleted records stay as tombstones (``deleted``, no ``data``).
+    """
+
+    __tablename__ = "synced_records"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    username: Mapped[str] = mapped_column(String(50), nullable=False)
+    collection: Mapped[str] = mapped_column(String(20), nullable=False)
+    record_key: Mapped[str] = mapped_column(String(64), nullable=False)
+    record_hash: Mapped[str] = mapped_column(String(40), nullable=False)
+    updated_at: Mapped[float] = mapped_column(Float, nullable=False)
+    seq: Mapped[int] = mapped_column(Integer, nullable=False)
+    deleted: Mapped[bool] = mapped_column(Boolean, default=False)
+    data: Mapped[Optional[Dict]] = mapped_column(JSON, nullable=True)
+
+    __table_args__ = (
+        UniqueConstraint("username", "collection", "record_key", name="uq_synced_record"),
+        Index("ix_synced_records_user_seq", "username", "seq"),
+    )
+
+
+class SyncCursor(Base):
+    """Per-username change sequence for ``SyncedRecord``; bumped once per merge."""
+
+    __tablename__ = "sync_cursors"
+
+    username: Mapped[str] = mapped_column(String(50), primary_key=True)
+    seq: Mapped[int] = mapped_column(Integer, default=0)
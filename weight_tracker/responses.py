@@ -0,0 +1,34 @@
+"""Fast JSON encoding for the API routes.
+
+Returning a ``Response`` instance makes FastAPI skip ``jsonable_encoder``, which
+walks every value of large sync blobs in Python before encoding. Bodies are
+encoded with ``orjson`` when it is installed and compact stdlib ``json`` otherwise.
+"""
+from __future__ import annotations
+
+import json
+from typing import Any
+
+from starlette.responses import Response
+
+try:  # Optional speedup; the stdlib path produces equivalent JSON.
+    import orjson
+except ImportError:  # pragma: no cover - depends on environment
+    orjson = None
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), allow_nan=False, check_circular=False).encode("utf-8")
+
+
+def loads(data: bytes):
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
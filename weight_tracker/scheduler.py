@@ -0,0 +1,268 @@
+"""Small asyncio job scheduler that runs inside the backend's event loop.
+
+Jobs run on an interval or a five-field cron expression (``minute hour day month
+weekday``, with ``*``, ``*/n``, ``a-b``, ``a-b/n`` and lists). Plain functions run
+in a worker thread so they never block request handling; coroutine functions are
+awaited on the loop. A job never overlaps itself: if a run is still going when the
+next one is due, that run is skipped and counted. ``jitter`` adds up to that many
+seconds to each start.
+
+:func:`Scheduler.lifespan` is registered as a Reflex lifespan task, so jobs start
+with the backend and, on shutdown, in-flight runs get ``shutdown_timeout`` seconds
+to finish. With ``lock_path`` set, only the process holding an exclusive lock on
+that file runs jobs; the other backend workers retry every ``lock_retry`` seconds
+and take over if the holder exits. Without ``fcntl`` (Windows) the lock is not
+available and every process runs its jobs.
+"""
+from __future__ import annotations
+
+import asyncio
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+import inspect
+import logging
+import os
+import random
+from pathlib import Path
+import time
+from typing import Any, Callable, Dict, IO, List, Optional, Set, Union
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_field(spec: str, low: int, high: int) -> Set[int]:
+    values: Set[int] = set()
+    for part in spec.split(","):
+        base, _, step_spec = part.partition("/")
+        step = int(step_spec) if step_spec else 1
+        if base == "*":
+            start, end = low, high
+        elif "-" in base:
+            start, end = (int(value) for value in base.split("-", 1))
+        else:
+            start = int(base)
+            end = high if step_spec else start
+        if step < 1 or start < low or end > high or start > end:
+            raise ValueError(f"invalid cron field {spec!r}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class Cron:
+    """``minute hour day month weekday`` with weekday 0-6 = Sunday-Saturday (7 is also Sunday)."""
+
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError("cron expressions need five fields: minute hour day month weekday")
+        self.expression = expression
+        self.minutes = _parse_field(fields[0], 0, 59)
+        self.hours = _parse_field(fields[1], 0, 23)
+        self.days = _parse_field(fields[2], 1, 31)
+        self.months = _parse_field(fields[3], 1, 12)
+        self.weekdays = {day % 7 for day in _parse_field(fields[4], 0, 7)}
+        # As in cron, a restricted day-of-month and day-of-week match if either does.
+        self._any_day = fields[2] == "*"
+        self._any_weekday = fields[4] == "*"
+
+    def _day_matches(self, moment: datetime) -> bool:
+        day_ok = moment.day in self.days
+        weekday_ok = (moment.isoweekday() % 7) in self.weekdays
+        if self._any_day or self._any_weekday:
+            return day_ok and weekday_ok
+        return day_ok or weekday_ok
+
+    def next_after(self, moment: datetime) -> datetime:
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = candidate + timedelta(days=366 * 5)
+        while candidate < limit:
+            if candidate.month not in self.months:
+                year, month = divmod(candidate.month, 12)
+                candidate = candidate.replace(year=candidate.year + year, month=month + 1, day=1, hour=0, minute=0)
+            elif not self._day_matches(candidate):
+                candidate = (candidate + timedelta(days=1)).replace(hour=0, minute=0)
+            elif candidate.hour not in self.hours:
+                candidate = (candidate + timedelta(hours=1)).replace(minute=0)
+            elif candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+            else:
+                return candidate
+        raise ValueError(f"cron expression {self.expression!r} never matches")
+
+    def delay(self, now: datetime) -> float:
+        return (self.next_after(now) - now).total_seconds()
+
+
+@dataclass
+class Interval:
+    seconds: float
+
+    def delay(self, now: datetime) -> float:
+        return self.seconds
+
+
+@dataclass
+class Job:
+    name: str
+    func: Callable[[], Any]
+    trigger: Union[Interval, Cron]
+    jitter: float = 0.0
+    run_at_start: bool = False
+    runs: int = 0
+    failures: int = 0
+    skipped: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+    last_seconds: Optional[float] = None
+    last_started: Optional[str] = None
+    last_error: Optional[str] = None
+    next_run: Optional[str] = None
+    _running: Optional[asyncio.Task] = field(default=None, repr=False)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "trigger": self.trigger.expression if isinstance(self.trigger, Cron) else f"every {self.trigger.seconds:g}s",
+            "running": self._running is not None and not self._running.done(),
+            "runs": self.runs,
+            "failures": self.failures,
+            "skipped": self.skipped,
+            "avg_ms": round(1000 * self.total_seconds / self.runs, 3) if self.runs else 0.0,
+            "max_ms": round(1000 * self.max_seconds, 3),
+            "last_ms": round(1000 * self.last_seconds, 3) if self.last_seconds is not None else None,
+            "last_started": self.last_started,
+            "last_error": self.last_error,
+            "next_run": self.next_run,
+        }
+
+
+class Scheduler:
+    def __init__(self, shutdown_timeout: float = 30.0, lock_path: Optional[Path] = None, lock_retry: float = 60.0):
+        self.shutdown_timeout = shutdown_timeout
+        self.lock_path = lock_path
+        self.lock_retry = lock_retry
+        self.jobs: Dict[str, Job] = {}
+        self._loops: List[asyncio.Task] = []
+        self._lock_file: Optional[IO[bytes]] = None
+
+    def add_job(
+        self,
+        name: str,
+        func: Callable[[], Any],
+        *,
+        seconds: Optional[float] = None,
+        cron: Optional[str] = None,
+        jitter: float = 0.0,
+        run_at_start: bool = False,
+    ) -> Job:
+        if (seconds is None) == (cron is None):
+            raise ValueError("Give exactly one of seconds or cron")
+        if seconds is not None and seconds <= 0:
+            raise ValueError("seconds must be positive")
+        if name in self.jobs:
+            raise ValueError(f"Job {name!r} already exists")
+        trigger = Interval(seconds) if seconds is not None else Cron(cron)
+        job = Job(name=name, func=func, trigger=trigger, jitter=jitter, run_at_start=run_at_start)
+        self.jobs[name] = job
+        return job
+
+    async def run_job(self, job: Job) -> bool:
+        """Run ``job`` once unless it is already running; returns whether it ran."""
+        if job._running is not None and not job._running.done():
+            job.skipped += 1
+            return False
+        job._running = asyncio.current_task()
+        job.last_started = datetime.now().isoformat(timespec="seconds")
+        started = time.perf_counter()
+        try:
+            if inspect.iscoroutinefunction(job.func):
+                await job.func()
+            else:
+                await asyncio.to_thread(job.func)
+            job.last_error = None
+        except Exception as exc:
+            job.failures += 1
+            job.last_error = f"{type(exc).__name__}: {exc}"
+            logger.exception("Scheduled job %s failed", job.name)
+        finally:
+            elapsed = time.perf_counter() - started
+            job.runs += 1
+            job.total_seconds += elapsed
+            job.max_seconds = max(job.max_seconds, elapsed)
+            job.last_seconds = elapsed
+            job._running = None
+        return True
+
+    async def _loop(self, job: Job) -> None:
+        if job.run_at_start:
+            asyncio.create_task(self.run_job(job), name=f"job|{job.name}")
+        while True:
+            now = datetime.now()
+            delay = job.trigger.delay(now) + random.uniform(0, job.jitter)
+            job.next_run = (now + timedelta(seconds=delay)).isoformat(timespec="seconds")
+            await asyncio.sleep(delay)
+            # The run is a separate task so a slow job cannot delay its own schedule;
+            # run_job skips the run if the previous one has not finished.
+            asyncio.create_task(self.run_job(job), name=f"job|{job.name}")
+
+    def start(self) -> None:
+        if self._loops:
+            return
+        self._loops = [asyncio.create_task(self._loop(job), name=f"schedule|{job.name}") for job in self.jobs.values()]
+
+    async def stop(self) -> None:
+        """Stop scheduling and give in-flight runs ``shutdown_timeout`` seconds to finish."""
+        for task in self._loops:
+            task.cancel()
+        self._loops = []
+        running = [job._running for job in self.jobs.values() if job._running is not None and not job._running.done()]
+        if running:
+            done, pending = await asyncio.wait(running, timeout=self.shutdown_timeout)
+            for task in pending:
+                logger.warning("Cancelling %s after %.0fs shutdown timeout", task.get_name(), self.shutdown_timeout)
+                task.cancel()
+
+    def try_lock(self) -> bool:
+        """Take the cross-process lock on ``lock_path``; returns whether this process holds it."""
+        if self._lock_file is not None or self.lock_path is None or fcntl is None:
+            return True
+        handle = open(self.lock_path, "ab")
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+        self._lock_file = handle
+        return True
+
+    def unlock(self) -> None:
+        if self._lock_file is not None:
+            self._lock_file.close()  # closing the file releases the lock
+            self._lock_file = None
+
+    async def _lead(self) -> None:
+        while not self.try_lock():
+            await asyncio.sleep(self.lock_retry)
+        logger.info("Scheduler lock taken by pid %d; starting %d job(s)", os.getpid(), len(self.jobs))
+        self.start()
+
+    @asynccontextmanager
+    async def lifespan(self):
+        leader = asyncio.create_task(self._lead(), name="schedule|lock")
+        try:
+            yield
+        finally:
+            leader.cancel()
+            await self.stop()
+            self.unlock()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: job.stats() for name, job in self.jobs.items()}
+
+
+scheduler = Scheduler()
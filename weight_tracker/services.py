@@ -1,18 +1,39 @@
 from __future__ import annotations
 
+from array import array
+from bisect import bisect_right
 import csv
 import hashlib
+import json
+import math
+import os
 import secrets
 from dataclasses import dataclass
-from datetime import date, datetime, time
+from datetime import date, datetime, time, timedelta, timezone
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Sequence
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set
 
-from sqlalchemy import func, or_, select
+from sqlalchemy import delete, func, insert, literal, or_, select, true, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.exc import IntegrityError
 
-from .db import DATA_DIR, get_session, init_db
-from . import models
+from .activities import activity_catalog, exercise_kcal
+from .archive import (
+    ARCHIVE_AFTER_DAYS,
+    EXERCISE,
+    FOOD,
+    archive_cutoff,
+    archive_user,
+    archived_rows,
+    delete_archived_day,
+)
+from .cache import MISSING, LRUCache
+from .db import DATA_DIR, get_session, init_db, on_configure, session_scope
+from .shards import MAIN_SHARD, router as shard_router, user_session, username_session
+from .timeseries import series_cache
+from .writebehind import group_commit
+from .tokens import revoke_user
+from . import accounts, catalog, jsondiff, models
 
 
 ACTIVITY_MULTIPLIERS = {
@@ -23,15 +44,25 @@ ACTIVITY_MULTIPLIERS = {
 }
 
 
-@dataclass
-class UserDTO:
+class _DTO:
+    """Base for the slotted, frozen service DTOs."""
+
+    __slots__ = ()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Shallow dict of the fields; unlike ``asdict`` nothing is deep-copied."""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+@dataclass(frozen=True, slots=True)
+class UserDTO(_DTO):
     id: int
     username: str
     created_at: str
 
 
-@dataclass
-class ProfileDTO:
+@dataclass(frozen=True, slots=True)
+class ProfileDTO(_DTO):
     age: int
     gender: str
     height_cm: int
@@ -42,8 +73,8 @@ class ProfileDTO:
     tdee: float
 
 
-@dataclass
-class DailySummary:
+@dataclass(frozen=True, slots=True)
+class DailySummary(_DTO):
     date: str
     intake_kcal: float
     burn_kcal: float
@@ -55,23 +86,78 @@ class DailySummary:
     exercise_log: List[Dict]
 
 
-@dataclass
-class WeightHistory:
+@dataclass(frozen=True, slots=True)
+class WeightHistory(_DTO):
     entries: List[Dict]
-
-@dataclass
-class SyncedStateDTO:
+    total_points: int = 0
+
+
+@dataclass(frozen=True, slots=True)
+class WeighIn(_DTO):
+    point: Dict
+    replaced: bool
+    change_kg: Optional[float]
+    total_points: int
+    latest: bool
+    profile: Optional[ProfileDTO]
+
+
+@dataclass(frozen=True, slots=True)
+class TrendSummary(_DTO):
+    start: str
+    end: str
+    period: str
+    buckets: List[Dict]
+    days_logged: int
+    avg_intake: float
+    avg_burn: float
+    avg_deficit: float
+    longest_streak: int
+    current_streak: int
+
+
+@dataclass(frozen=True, slots=True)
+class SyncedStateDTO(_DTO):
     username: str
     state: Dict[str, Any]
     updated_at: str
 
 
-MET_VALUES = {
-    "Walking": 3.5,
-    "Jogging": 7,
-    "Cycling": 6,
-    "Weightlifting": 4,
-}
+# Synced-state history: a full snapshot at least every SYNC_SNAPSHOT_EVERY versions;
+# compaction keeps one version per day after SYNC_HISTORY_FULL_DAYS and none after
+# SYNC_HISTORY_RETENTION_DAYS.
+SYNC_SNAPSHOT_EVERY = int(os.environ.get("WEIGHT_TRACKER_SYNC_SNAPSHOT_EVERY", 16))
+SYNC_HISTORY_FULL_DAYS = int(os.environ.get("WEIGHT_TRACKER_SYNC_HISTORY_FULL_DAYS", 7))
+SYNC_HISTORY_RETENTION_DAYS = int(os.environ.get("WEIGHT_TRACKER_SYNC_HISTORY_DAYS", 90))
+
+# Latest synced-state version this process wrote per username, with its state, so the next
+# save diffs against it without reading it back: (version, base_version, depth, state).
+# States are held by reference, so a saved state must not be mutated afterwards.
+_history_heads = LRUCache(maxsize=int(os.environ.get("WEIGHT_TRACKER_SYNC_HISTORY_HEADS", 256)))
+
+# Per-user ProfileDTO (including BMR/TDEE); upsert_profile writes through.
+profile_cache = LRUCache(
+    maxsize=int(os.environ.get("WEIGHT_TRACKER_PROFILE_CACHE_SIZE", 4096)),
+    ttl=float(os.environ.get("WEIGHT_TRACKER_PROFILE_CACHE_TTL", 600)),
+)
+
+
+@on_configure
+def _forget_cached_rows() -> None:
+    """Cached profiles, series and history heads describe rows of the previous database."""
+    profile_cache.clear()
+    _history_heads.clear()
+    series_cache.invalidate()
+
+
+MET_VALUES = activity_catalog.met_table()
+
+# Food usage (recent/frequent foods): a use's weight halves every FOOD_USAGE_HALF_LIFE_DAYS.
+# Scores grow by 2 ** (days since FOOD_USAGE_EPOCH / half-life), which stays a finite
+# float for about 1000 half-lives (~40 years at the default).
+FOOD_USAGE_HALF_LIFE_DAYS = float(os.environ.get("WEIGHT_TRACKER_FOOD_USAGE_HALF_LIFE_DAYS", 14))
+FOOD_USAGE_EPOCH = date(2024, 1, 1)
+TOP_FOODS = int(os.environ.get("WEIGHT_TRACKER_TOP_FOODS", 12))
 
 
 def _hash_password(password: str) -> tuple[str, str]:
@@ -110,6 +196,7 @@ def create_user(username: str, password: str) -> UserDTO:
             session.flush()
         except IntegrityError as exc:  # pragma: no cover - depends on DB
             raise ValueError("Username already exists") from exc
+        shard_router.assign(session, user.id)
         return UserDTO(id=user.id, username=user.username, created_at=user.created_at.isoformat())
 
 
@@ -122,8 +209,31 @@ def authenticate_user(username: str, password: str) -> Optional[UserDTO]:
     return None
 
 
-def upsert_profile(user_id: int, *, age: int, gender: str, height_cm: int, weight_kg: float, activity: str, deficit: int) -> ProfileDTO:
+def get_user(username: str) -> Optional[UserDTO]:
     with get_session() as session:
+        user = session.scalar(select(models.User).where(models.User.username == username.strip().lower()))
+        if not user:
+            return None
+        return UserDTO(id=user.id, username=user.username, created_at=user.created_at.isoformat())
+
+
+def _profile_dto(profile: models.Profile) -> ProfileDTO:
+    bmr = mifflin_st_jeor(profile.weight_kg, profile.height_cm, profile.age, profile.gender)
+    tdee = calc_tdee(bmr, profile.activity)
+    return ProfileDTO(
+        age=profile.age,
+        gender=profile.gender,
+        height_cm=profile.height_cm,
+        weight_kg=profile.weight_kg,
+        activity=profile.activity,
+        deficit=profile.deficit,
+        bmr=bmr,
+        tdee=tdee,
+    )
+
+
+def upsert_profile(user_id: int, *, age: int, gender: str, height_cm: int, weight_kg: float, activity: str, deficit: int) -> ProfileDTO:
+    with user_session(user_id) as session:
         user = session.get(models.User, user_id)
         if not user:
             raise ValueError("User not found")
@@ -136,38 +246,23 @@ def upsert_profile(user_id: int, *, age: int, gender: str, height_cm: int, weigh
         profile.deficit = deficit
         session.add(profile)
         session.flush()
-        bmr = mifflin_st_jeor(profile.weight_kg, profile.height_cm, profile.age, profile.gender)
-        tdee = calc_tdee(bmr, profile.activity)
-        return ProfileDTO(
-            age=profile.age,
-            gender=profile.gender,
-            height_cm=profile.height_cm,
-            weight_kg=profile.weight_kg,
-            activity=profile.activity,
-            deficit=profile.deficit,
-            bmr=bmr,
-            tdee=tdee,
-        )
+        dto = _profile_dto(profile)
+    profile_cache.set(user_id, dto)
+    return dto
 
 
 def load_profile(user_id: int) -> Optional[ProfileDTO]:
-    with get_session() as session:
+    """Return the user's profile and metrics, served from ``profile_cache`` when warm."""
+    cached = profile_cache.get(user_id)
+    if cached is not MISSING:
+        return cached
+    with user_session(user_id) as session:
         stmt = select(models.Profile).where(models.Profile.user_id == user_id)
         profile = session.scalar(stmt)
-        if not profile:
-            return None
-        bmr = mifflin_st_jeor(profile.weight_kg, profile.height_cm, profile.age, profile.gender)
-        tdee = calc_tdee(bmr, profile.activity)
-        return ProfileDTO(
-            age=profile.age,
-            gender=profile.gender,
-            height_cm=profile.height_cm,
-            weight_kg=profile.weight_kg,
-            activity=profile.activity,
-            deficit=profile.deficit,
-            bmr=bmr,
-            tdee=tdee,
-        )
+        dto = _profile_dto(profile) if profile else None
+    # Users without a profile are cached too, so their refreshes skip the table as well.
+    profile_cache.set(user_id, dto)
+    return dto
 
 
 def list_food_items(user_id: Optional[int] = None) -> List[Dict]:
@@ -222,14 +317,217 @@ def add_food_item(
             session.flush()
         except IntegrityError as exc:
             raise ValueError("Food item already exists") from exc
+        if item.owner_id is None:
+            catalog.record_changes(session, [item.name])
 
 
 def delete_food_items(user_id: int, item_ids: Sequence[int]) -> None:
     with get_session() as session:
-        stmt = select(models.FoodItem).where(models.FoodItem.id.in_(item_ids))
-        for item in session.scalars(stmt):
-            if item.owner_id == user_id:
-                session.delete(item)
+        owned = session.scalars(
+            select(models.FoodItem.id).where(models.FoodItem.id.in_(item_ids), models.FoodItem.owner_id == user_id)
+        ).all()
+        if not owned:
+            return
+        dependents = _dependent_recipe_items(session, owned)
+        recipe_ids = select(models.Recipe.id).where(models.Recipe.food_item_id.in_(owned)).scalar_subquery()
+        session.execute(
+            delete(models.RecipeIngredient).where(
+                or_(models.RecipeIngredient.ingredient_id.in_(owned), models.RecipeIngredient.recipe_id.in_(recipe_ids))
+            )
+        )
+        session.execute(delete(models.Recipe).where(models.Recipe.food_item_id.in_(owned)))
+        session.execute(delete(models.FoodItem).where(models.FoodItem.id.in_(owned)))
+        _refresh_recipes(session, dependents - set(owned))
+
+
+RECIPE_MACROS = ("kcal", "protein", "fat", "carbs")
+
+
+def _dependent_recipe_items(session, item_ids: Iterable[int]) -> Set[int]:
+    """Food item ids of every recipe that uses ``item_ids``, directly or through other recipes."""
+    found: Set[int] = set()
+    frontier = set(item_ids)
+    while frontier:
+        rows = session.scalars(
+            select(models.Recipe.food_item_id)
+            .join(models.RecipeIngredient, models.RecipeIngredient.recipe_id == models.Recipe.id)
+            .where(models.RecipeIngredient.ingredient_id.in_(frontier))
+        ).all()
+        frontier = set(rows) - found
+        found |= frontier
+    return found
+
+
+def _refresh_recipes(session, recipe_item_ids: Set[int]) -> None:
+    """Recompute and store per-serving macros, ingredients-before-recipes."""
+    if not recipe_item_ids:
+        return
+    session.flush()
+    recipes = {
+        recipe.food_item_id: recipe
+        for recipe in session.scalars(select(models.Recipe).where(models.Recipe.food_item_id.in_(recipe_item_ids)))
+    }
+    edges = session.execute(
+        select(models.Recipe.food_item_id, models.RecipeIngredient.ingredient_id)
+        .join(models.RecipeIngredient, models.RecipeIngredient.recipe_id == models.Recipe.id)
+        .where(
+            models.Recipe.food_item_id.in_(recipes),
+            models.RecipeIngredient.ingredient_id.in_(recipes),
+        )
+    ).all()
+    catalog.record_changes(
+        session, [recipe.food_item.name for recipe in recipes.values() if recipe.food_item.owner_id is None]
+    )
+    waiting_on: Dict[int, Set[int]] = {item_id: set() for item_id in recipes}
+    for recipe_item_id, ingredient_id in edges:
+        waiting_on[recipe_item_id].add(ingredient_id)
+    while waiting_on:
+        ready = [item_id for item_id, deps in waiting_on.items() if not deps]
+        if not ready:  # pragma: no cover - save_recipe rejects cycles
+            raise ValueError("Recipe ingredients form a cycle")
+        for item_id in ready:
+            recipe = recipes[item_id]
+            totals = session.execute(
+                select(*[func.sum(getattr(models.FoodItem, macro) * models.RecipeIngredient.qty) for macro in RECIPE_MACROS])
+                .select_from(models.RecipeIngredient)
+                .join(models.FoodItem, models.FoodItem.id == models.RecipeIngredient.ingredient_id)
+                .where(models.RecipeIngredient.recipe_id == recipe.id)
+            ).one()
+            servings = recipe.servings or 1.0
+            for macro, total in zip(RECIPE_MACROS, totals):
+                setattr(recipe.food_item, macro, round((total or 0.0) / servings, 2))
+            session.flush()
+            del waiting_on[item_id]
+        for deps in waiting_on.values():
+            deps.difference_update(ready)
+
+
+def save_recipe(
+    *,
+    user_id: int,
+    name: str,
+    servings: float,
+    ingredients: Sequence[Dict[str, Any]],
+    measure: str = "1 serving",
+    make_global: bool = False,
+    recipe_item_id: Optional[int] = None,
+) -> Dict:
+    """Create or replace a recipe item whose macros are stored per serving.
+
+    ``ingredients`` are ``{"food_item_id", "qty"}`` dicts referencing catalog items
+    visible to the user (which may themselves be recipes). The rollup is computed
+    once here; recipes built on this one are refreshed through the dependency index.
+    """
+    if servings <= 0:
+        raise ValueError("Servings must be greater than 0")
+    quantities: Dict[int, float] = {}
+    for ingredient in ingredients:
+        qty = float(ingredient.get("qty", 1.0))
+        if qty <= 0:
+            raise ValueError("Ingredient quantities must be greater than 0")
+        item_id = int(ingredient["food_item_id"])
+        quantities[item_id] = quantities.get(item_id, 0.0) + qty
+    if not quantities:
+        raise ValueError("A recipe needs at least one ingredient")
+    with get_session() as session:
+        # Global recipes may only use global items so other users can see every ingredient.
+        owner_filter = models.FoodItem.owner_id.is_(None)
+        if not make_global:
+            owner_filter = or_(models.FoodItem.owner_id == user_id, owner_filter)
+        visible = set(
+            session.scalars(select(models.FoodItem.id).where(models.FoodItem.id.in_(quantities), owner_filter))
+        )
+        if visible != set(quantities):
+            raise ValueError("Unknown ingredient")
+        if recipe_item_id is None:
+            item = models.FoodItem(
+                name=name,
+                measure=measure,
+                category="Recipe",
+                owner_id=None if make_global else user_id,
+            )
+            session.add(item)
+            recipe = models.Recipe(food_item=item, servings=servings)
+            session.add(recipe)
+            try:
+                session.flush()
+            except IntegrityError as exc:
+                raise ValueError("Food item already exists") from exc
+        else:
+            recipe = session.scalar(select(models.Recipe).where(models.Recipe.food_item_id == recipe_item_id))
+            if not recipe or recipe.food_item.owner_id not in (user_id, None):
+                raise ValueError("Recipe not found")
+            if recipe_item_id in quantities or _dependent_recipe_items(session, [recipe_item_id]) & set(quantities):
+                raise ValueError("A recipe cannot contain itself")
+            item = recipe.food_item
+            if item.owner_id is None and item.name != name:
+                # The old name leaves the served catalog.
+                catalog.record_changes(session, [item.name])
+            item.name = name
+            item.measure = measure
+            recipe.servings = servings
+            session.execute(delete(models.RecipeIngredient).where(models.RecipeIngredient.recipe_id == recipe.id))
+        session.add_all(
+            models.RecipeIngredient(recipe_id=recipe.id, ingredient_id=item_id, qty=qty) for item_id, qty in quantities.items()
+        )
+        _refresh_recipes(session, {item.id} | _dependent_recipe_items(session, [item.id]))
+        return {
+            "id": item.id,
+            "name": item.name,
+            "measure": item.measure,
+            "kcal": item.kcal,
+            "protein": item.protein,
+            "fat": item.fat,
+            "carbs": item.carbs,
+            "category": item.category,
+            "owner_id": item.owner_id,
+        }
+
+
+def update_food_item(user_id: int, item_id: int, **fields: Any) -> None:
+    """Edit a user's own catalog item and refresh every recipe that depends on it."""
+    allowed = {"name", "measure", "category", *RECIPE_MACROS}
+    unknown = set(fields) - allowed
+    if unknown:
+        raise ValueError(f"Unknown food item fields: {', '.join(sorted(unknown))}")
+    with get_session() as session:
+        item = session.get(models.FoodItem, item_id)
+        if not item or item.owner_id != user_id:
+            raise ValueError("Food item not found")
+        is_recipe = session.scalar(select(models.Recipe.id).where(models.Recipe.food_item_id == item_id)) is not None
+        if is_recipe and set(fields) & set(RECIPE_MACROS):
+            raise ValueError("Recipe macros are computed from its ingredients")
+        for name, value in fields.items():
+            setattr(item, name, value)
+        if set(fields) & set(RECIPE_MACROS):
+            _refresh_recipes(session, _dependent_recipe_items(session, [item_id]))
+
+
+def get_recipe_ingredients(recipe_item_id: int) -> List[Dict]:
+    with get_session() as session:
+        rows = session.execute(
+            select(models.FoodItem.id, models.FoodItem.name, models.FoodItem.measure, models.RecipeIngredient.qty)
+            .join(models.RecipeIngredient, models.RecipeIngredient.ingredient_id == models.FoodItem.id)
+            .join(models.Recipe, models.Recipe.id == models.RecipeIngredient.recipe_id)
+            .where(models.Recipe.food_item_id == recipe_item_id)
+            .order_by(models.FoodItem.name.asc())
+        ).all()
+    return [{"food_item_id": row.id, "name": row.name, "measure": row.measure, "qty": row.qty} for row in rows]
+
+
+def _write_row(user_id: int, model, row: Dict[str, Any], then: Optional[Callable[[Any], None]] = None) -> None:
+    """Insert one log row, through the group-commit queue when it is enabled.
+
+    Either way the row is committed when this returns, and ``then(session)`` runs
+    in the same transaction (under group commit, the batch's).
+    """
+    if group_commit is not None:
+        group_commit.write(user_id, model, row, after=then)
+        return
+    with user_session(user_id) as session:
+        session.add(model(**row))
+        if then is not None:
+            then(session)
 
 
 def log_food(
@@ -244,20 +542,167 @@ def log_food(
     fat: float,
     carbs: float,
 ) -> None:
-    with get_session() as session:
-        session.add(
-            models.FoodLog(
-                user_id=user_id,
-                date=entry_date,
-                food_name=food_name,
-                measure=measure,
-                qty=qty,
-                kcal=kcal,
-                protein=protein,
-                fat=fat,
-                carbs=carbs,
+    write = series_cache.begin_write(user_id)
+    _write_row(
+        user_id,
+        models.FoodLog,
+        {
+            "user_id": user_id,
+            "date": entry_date,
+            "food_name": food_name,
+            "measure": measure,
+            "qty": qty,
+            "kcal": kcal,
+            "protein": protein,
+            "fat": fat,
+            "carbs": carbs,
+        },
+        then=lambda session: _record_food_usage(session, user_id, entry_date, [(food_name, measure)]),
+    )
+    series_cache.record_food(user_id, entry_date, write=write, kcal=kcal, protein=protein, fat=fat, carbs=carbs)
+
+
+def log_meal(*, user_id: int, entry_date: date, items: Sequence[Dict[str, Any]]) -> int:
+    """Log several foods in one transaction with a single multi-row INSERT.
+
+    Each item carries the same fields as :func:`log_food` (``kcal`` and macros are
+    totals for the quantity). Returns the number of entries written.
+    """
+    if not items:
+        return 0
+    rows = []
+    for item in items:
+        if not item.get("food_name"):
+            raise ValueError("Every meal item needs a food name")
+        row = {
+            "food_name": item["food_name"],
+            "measure": item.get("measure") or "1 serving",
+            "qty": float(item.get("qty", 1.0)),
+            "kcal": float(item.get("kcal", 0.0)),
+            "protein": float(item.get("protein", 0.0)),
+            "fat": float(item.get("fat", 0.0)),
+            "carbs": float(item.get("carbs", 0.0)),
+        }
+        rows.append({"user_id": user_id, "date": entry_date, **row})
+    write = series_cache.begin_write(user_id)
+    with user_session(user_id) as session:
+        session.execute(insert(models.FoodLog), rows)
+        _record_food_usage(session, user_id, entry_date, [(row["food_name"], row["measure"]) for row in rows])
+    series_cache.record_food(
+        user_id,
+        entry_date,
+        write=write,
+        kcal=sum(row["kcal"] for row in rows),
+        protein=sum(row["protein"] for row in rows),
+        fat=sum(row["fat"] for row in rows),
+        carbs=sum(row["carbs"] for row in rows),
+        entries=len(rows),
+    )
+    return len(rows)
+
+
+def _usage_weight(day: date) -> float:
+    return 2.0 ** ((day - FOOD_USAGE_EPOCH).days / FOOD_USAGE_HALF_LIFE_DAYS)
+
+
+def _record_food_usage(session, user_id: int, entry_date: date, foods: Sequence[tuple]) -> None:
+    """Add one use per ``(food_name, measure)`` to the user's food usage, as a single upsert."""
+    counts: Dict[str, List[Any]] = {}
+    for name, measure in foods:
+        entry = counts.setdefault(name, [measure, 0])
+        entry[1] += 1
+    weight = _usage_weight(entry_date)
+    stmt = sqlite_insert(models.FoodUsage)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[models.FoodUsage.user_id, models.FoodUsage.food_name],
+        set_={
+            "measure": stmt.excluded.measure,
+            "uses": models.FoodUsage.uses + stmt.excluded.uses,
+            "score": models.FoodUsage.score + stmt.excluded.score,
+            "last_used": func.max(models.FoodUsage.last_used, stmt.excluded.last_used),
+        },
+    )
+    session.execute(
+        stmt,
+        [
+            {"user_id": user_id, "food_name": name, "measure": measure, "uses": uses, "score": uses * weight, "last_used": entry_date}
+            for name, (measure, uses) in counts.items()
+        ],
+    )
+
+
+def top_foods(user_id: int, k: int = TOP_FOODS, *, today: Optional[date] = None) -> List[Dict[str, Any]]:
+    """The user's ``k`` most used foods by decayed count, most used first.
+
+    Reads ``k`` rows off the ``(user_id, score)`` index. ``weight`` is the decayed
+    count as of ``today``: each use counts 1 on its day and half as much every
+    ``FOOD_USAGE_HALF_LIFE_DAYS`` after.
+    """
+    if k <= 0:
+        return []
+    scale = _usage_weight(today or date.today())
+    with user_session(user_id) as session:
+        rows = session.execute(
+            select(
+                models.FoodUsage.food_name,
+                models.FoodUsage.measure,
+                models.FoodUsage.uses,
+                models.FoodUsage.score,
+                models.FoodUsage.last_used,
             )
-        )
+            .where(models.FoodUsage.user_id == user_id)
+            .order_by(models.FoodUsage.score.desc())
+            .limit(k)
+        ).all()
+    return [
+        {
+            "food_name": row.food_name,
+            "measure": row.measure,
+            "uses": row.uses,
+            "weight": round(row.score / scale, 3),
+            "last_used": row.last_used.isoformat(),
+        }
+        for row in rows
+    ]
+
+
+def rebuild_food_usage(user_id: Optional[int] = None) -> Dict[str, int]:
+    """Recompute food usage from the food log, e.g. for entries logged before the index existed.
+
+    Covers every user unless ``user_id`` is given; archived entries are not counted.
+    """
+    if user_id is None:
+        with get_session() as session:
+            user_ids = session.scalars(select(models.User.id).order_by(models.User.id)).all()
+    else:
+        user_ids = [user_id]
+    totals = {"users": 0, "foods": 0}
+    for uid in user_ids:
+        totals["users"] += 1
+        totals["foods"] += _rebuild_user_food_usage(uid)
+    return totals
+
+
+def _rebuild_user_food_usage(user_id: int) -> int:
+    with user_session(user_id) as session:
+        rows = session.execute(
+            select(models.FoodLog.food_name, models.FoodLog.date, func.count(), func.max(models.FoodLog.measure))
+            .where(models.FoodLog.user_id == user_id)
+            .group_by(models.FoodLog.food_name, models.FoodLog.date)
+        ).all()
+        usage: Dict[str, Dict[str, Any]] = {}
+        for name, day, uses, measure in rows:
+            entry = usage.setdefault(
+                name, {"user_id": user_id, "food_name": name, "measure": measure, "uses": 0, "score": 0.0, "last_used": day}
+            )
+            entry["uses"] += uses
+            entry["score"] += uses * _usage_weight(day)
+            if day >= entry["last_used"]:
+                entry["last_used"], entry["measure"] = day, measure
+        session.execute(delete(models.FoodUsage).where(models.FoodUsage.user_id == user_id))
+        if usage:
+            session.execute(insert(models.FoodUsage), list(usage.values()))
+    return len(usage)
 
 
 def log_exercise(
@@ -270,60 +715,206 @@ def log_exercise(
     mins: float,
     kcal_burn: float,
 ) -> None:
-    with get_session() as session:
-        session.add(
-            models.ExerciseLog(
-                user_id=user_id,
-                date=entry_date,
-                type=ex_type,
-                start=start,
-                end=end,
-                mins=mins,
-                kcal_burn=kcal_burn,
-            )
-        )
+    write = series_cache.begin_write(user_id)
+    _write_row(
+        user_id,
+        models.ExerciseLog,
+        {
+            "user_id": user_id,
+            "date": entry_date,
+            "type": ex_type,
+            "start": start,
+            "end": end,
+            "mins": mins,
+            "kcal_burn": kcal_burn,
+        },
+    )
+    series_cache.record_exercise(user_id, entry_date, write=write, kcal_burn=kcal_burn)
+
+
+def record_weight(*, user_id: int, entry_date: date, weight: float) -> WeighIn:
+    """Record the day's weigh-in (replacing an earlier one that day) in a single transaction.
+
+    The entry is upserted on ``(user_id, date)``. When it is the user's latest
+    weigh-in, ``Profile.weight_kg`` is updated in the same transaction (a profile
+    with defaults is created if there is none), so BMR/TDEE follow. Returns the
+    history point, whether it replaced one, the change from the previous weigh-in,
+    the user's number of entries and the resulting profile metrics. With group
+    commit enabled the transaction is the writer's batch.
+    """
+    if not weight > 0:
+        raise ValueError("Weight must be greater than 0")
+
+    def write(session):
+        return _write_weigh_in(session, user_id, entry_date, weight)
+
+    sequence = series_cache.begin_write(user_id)
+    if group_commit is not None:
+        replaced, previous, total_points, latest, profile = group_commit.write(user_id, None, None, after=write)
+    else:
+        with user_session(user_id) as session:
+            replaced, previous, total_points, latest, profile = write(session)
+    series_cache.record_weight(user_id, entry_date, write=sequence, weight=weight)
+    if profile is not None:
+        profile_cache.set(user_id, profile)
+    else:
+        profile = load_profile(user_id)
+    return WeighIn(
+        point={"date": entry_date.isoformat(), "weight": weight},
+        replaced=replaced,
+        change_kg=round(weight - previous, 2) if previous is not None else None,
+        total_points=total_points,
+        latest=latest,
+        profile=profile,
+    )
 
 
-def log_weight(*, user_id: int, entry_date: date, weight: float) -> None:
-    with get_session() as session:
-        session.add(models.WeightEntry(user_id=user_id, date=entry_date, weight=weight))
+def _write_weigh_in(session, user_id: int, entry_date: date, weight: float) -> tuple:
+    """The statements of :func:`record_weight`: ``(replaced, previous, total_points, latest, profile)``."""
+    Entry = models.WeightEntry
+    upsert = sqlite_insert(Entry).values(user_id=user_id, date=entry_date, weight=weight)
+    upsert = upsert.on_conflict_do_update(index_elements=[Entry.user_id, Entry.date], set_={"weight": upsert.excluded.weight})
+    # That day's earlier weigh-in (if any) and the one before it.
+    recent = session.execute(
+        select(Entry.date, Entry.weight).where(Entry.user_id == user_id, Entry.date <= entry_date).order_by(Entry.date.desc()).limit(2)
+    ).all()
+    replaced = bool(recent) and recent[0].date == entry_date
+    previous = next((row.weight for row in recent if row.date != entry_date), None)
+    session.execute(upsert)
+    total_points, last_date = session.execute(
+        select(func.count(), func.max(Entry.date)).where(Entry.user_id == user_id)
+    ).one()
+    latest = last_date == entry_date
+    profile = None
+    if latest:
+        profile = session.scalar(select(models.Profile).where(models.Profile.user_id == user_id))
+        if profile is None:
+            profile = models.Profile(user_id=user_id)
+            session.add(profile)
+        profile.weight_kg = weight
+        session.flush()
+        profile = _profile_dto(profile)
+    return replaced, previous, total_points, latest, profile
 
 
-def get_daily_summary(user_id: int, target_date: date, profile: ProfileDTO) -> DailySummary:
-    with get_session() as session:
-        food_stmt = select(models.FoodLog).where(
-            models.FoodLog.user_id == user_id,
-            models.FoodLog.date == target_date,
-        )
-        exercise_stmt = select(models.ExerciseLog).where(
-            models.ExerciseLog.user_id == user_id,
-            models.ExerciseLog.date == target_date,
-        )
-        food_entries = session.scalars(food_stmt).all()
-        exercise_entries = session.scalars(exercise_stmt).all()
+def log_weight(*, user_id: int, entry_date: date, weight: float) -> None:
+    """:func:`record_weight` for callers that don't need the result."""
+    record_weight(user_id=user_id, entry_date=entry_date, weight=weight)
 
-    food_log = [
-        {
-            "id": entry.id,
-            "food": entry.food_name,
-            "measure": entry.measure,
-            "qty": entry.qty,
-            "kcal": entry.kcal,
-            "protein": entry.protein,
-            "fat": entry.fat,
-            "carbs": entry.carbs,
-        }
-        for entry in food_entries
-    ]
-    exercise_log = [
-        {
-            "id": entry.id,
-            "type": entry.type,
-            "mins": entry.mins,
-            "kcal_burn": entry.kcal_burn,
-        }
-        for entry in exercise_entries
-    ]
+
+def recompute_exercise_burns(
+    start: date,
+    end: date,
+    *,
+    user_id: Optional[int] = None,
+    met_overrides: Optional[Dict[str, float]] = None,
+    use_weight_history: bool = True,
+    chunk_size: int = 1000,
+) -> Dict[str, int]:
+    """Re-derive ``ExerciseLog.kcal_burn`` for entries dated ``start..end`` (all users by default).
+
+    METs come from the activity catalog, with ``met_overrides`` (activity name ->
+    MET) applied on top, e.g. after a MET table correction. With
+    ``use_weight_history`` each entry uses the user's last weigh-in on or before its
+    date (the first weigh-in for earlier entries); otherwise, or without weigh-ins,
+    the profile weight. Entries whose type is not in the catalog are left alone.
+
+    Rows are read in id order, ``chunk_size`` at a time, and each chunk's changed
+    burns are written with one executemany UPDATE in its own short transaction.
+    Archived entries (see ``archive_old_logs``) are not recomputed.
+    """
+    if start > end:
+        raise ValueError("start must not be after end")
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1")
+    mets = {name.lower(): met for name, met in MET_VALUES.items()}
+    mets.update({name.strip().lower(): float(met) for name, met in (met_overrides or {}).items()})
+    if user_id is None:
+        with get_session() as session:
+            user_ids = session.scalars(select(models.User.id).order_by(models.User.id)).all()
+    else:
+        user_ids = [user_id]
+    totals = {"users": 0, "scanned": 0, "updated": 0, "skipped": 0}
+    for uid in user_ids:
+        counts = _recompute_user_burns(uid, start, end, mets, use_weight_history, chunk_size)
+        totals["users"] += 1
+        for key, value in counts.items():
+            totals[key] += value
+    return totals
+
+
+def _recompute_user_burns(
+    user_id: int, start: date, end: date, mets: Dict[str, float], use_weight_history: bool, chunk_size: int
+) -> Dict[str, int]:
+    profile = load_profile(user_id)
+    profile_weight = profile.weight_kg if profile else 70.0
+    days, weights = array("l"), array("d")
+    if use_weight_history:
+        with user_session(user_id) as session:
+            rows = session.execute(
+                select(models.WeightEntry.date, models.WeightEntry.weight)
+                .where(models.WeightEntry.user_id == user_id, models.WeightEntry.date <= end)
+                .order_by(models.WeightEntry.date.asc(), models.WeightEntry.id.asc())
+            ).all()
+        for day, weight in rows:
+            ordinal = day.toordinal()
+            if days and days[-1] == ordinal:
+                weights[-1] = weight  # last weigh-in of the day wins, as in the series cache
+            else:
+                days.append(ordinal)
+                weights.append(weight)
+
+    counts = {"scanned": 0, "updated": 0, "skipped": 0}
+    last_id = 0
+    while True:
+        with user_session(user_id) as session:
+            chunk = session.execute(
+                select(
+                    models.ExerciseLog.id,
+                    models.ExerciseLog.date,
+                    models.ExerciseLog.type,
+                    models.ExerciseLog.mins,
+                    models.ExerciseLog.kcal_burn,
+                )
+                .where(
+                    models.ExerciseLog.user_id == user_id,
+                    models.ExerciseLog.date >= start,
+                    models.ExerciseLog.date <= end,
+                    models.ExerciseLog.id > last_id,
+                )
+                .order_by(models.ExerciseLog.id.asc())
+                .limit(chunk_size)
+            ).all()
+            updates = []
+            for row in chunk:
+                met = mets.get((row.type or "").lower())
+                if met is None:
+                    counts["skipped"] += 1
+                    continue
+                weight = profile_weight
+                if days:
+                    weight = weights[max(bisect_right(days, row.date.toordinal()) - 1, 0)]
+                kcal_burn = exercise_kcal(met, weight, row.mins)
+                if not math.isclose(kcal_burn, row.kcal_burn or 0.0, abs_tol=1e-9):
+                    updates.append({"id": row.id, "kcal_burn": kcal_burn})
+            if updates:
+                session.execute(update(models.ExerciseLog), updates)
+        counts["scanned"] += len(chunk)
+        counts["updated"] += len(updates)
+        if len(chunk) < chunk_size:
+            break
+        last_id = chunk[-1].id
+    if counts["updated"]:
+        series_cache.invalidate(user_id)
+    return counts
+
+
+def get_daily_summary(
+    user_id: int, target_date: date, profile: ProfileDTO, *, include_archive: bool = False
+) -> DailySummary:
+    logs = get_log_range(user_id, target_date, target_date, include_archive=include_archive)
+    food_log = [{key: value for key, value in entry.items() if key != "date"} for entry in logs["food"]]
+    exercise_log = [{key: value for key, value in entry.items() if key != "date"} for entry in logs["exercise"]]
 
     intake_kcal = sum(entry["kcal"] for entry in food_log)
     burn_kcal = sum(entry["kcal_burn"] for entry in exercise_log)
@@ -348,54 +939,800 @@ def get_daily_summary(user_id: int, target_date: date, profile: ProfileDTO) -> D
     )
 
 
+def _food_entry(row, archived: bool = False) -> Dict[str, Any]:
+    return {
+        "id": row["id"],
+        "archived": archived,
+        "date": _json_date(row["date"]),
+        "food": row["food_name"],
+        "measure": row["measure"],
+        "qty": row["qty"],
+        "kcal": row["kcal"],
+        "protein": row["protein"],
+        "fat": row["fat"],
+        "carbs": row["carbs"],
+    }
+
+
+def _exercise_entry(row, archived: bool = False) -> Dict[str, Any]:
+    return {
+        "id": row["id"],
+        "archived": archived,
+        "date": _json_date(row["date"]),
+        "type": row["type"],
+        "mins": row["mins"],
+        "kcal_burn": row["kcal_burn"],
+    }
+
+
+def _json_date(value) -> str:
+    return value if isinstance(value, str) else value.isoformat()
+
+
+def get_log_range(
+    user_id: int, start: date, end: date, *, include_archive: bool = False
+) -> Dict[str, List[Dict[str, Any]]]:
+    """Food and exercise entries dated ``start..end``, ordered by date.
+
+    Entries older than the archive cutoff live in compressed monthly partitions
+    (see ``archive.py``) and are only included with ``include_archive=True``, which
+    unpacks just the months in range. Those are marked ``archived``: their ids no
+    longer name rows, so they cannot be deleted one by one.
+    """
+    if start > end:
+        raise ValueError("start must not be after end")
+    Food, Exercise = models.FoodLog, models.ExerciseLog
+    with user_session(user_id) as session:
+        food = [
+            _food_entry(row._mapping)
+            for row in session.execute(
+                select(
+                    Food.id, Food.date, Food.food_name, Food.measure, Food.qty, Food.kcal, Food.protein, Food.fat, Food.carbs
+                )
+                .where(Food.user_id == user_id, Food.date >= start, Food.date <= end)
+                .order_by(Food.date.asc(), Food.id.asc())
+            )
+        ]
+        exercise = [
+            _exercise_entry(row._mapping)
+            for row in session.execute(
+                select(Exercise.id, Exercise.date, Exercise.type, Exercise.mins, Exercise.kcal_burn)
+                .where(Exercise.user_id == user_id, Exercise.date >= start, Exercise.date <= end)
+                .order_by(Exercise.date.asc(), Exercise.id.asc())
+            )
+        ]
+        if include_archive:
+            # A day can have both (entries back-dated since the last archival run);
+            # the sort is stable, so archived entries stay ahead of newer ones.
+            food = sorted(
+                [_food_entry(row, True) for row in archived_rows(session, user_id, FOOD, start, end)] + food,
+                key=lambda entry: entry["date"],
+            )
+            exercise = sorted(
+                [_exercise_entry(row, True) for row in archived_rows(session, user_id, EXERCISE, start, end)] + exercise,
+                key=lambda entry: entry["date"],
+            )
+    return {"food": food, "exercise": exercise}
+
+
+def archive_old_logs(
+    older_than_days: int = ARCHIVE_AFTER_DAYS, *, user_id: Optional[int] = None, today: Optional[date] = None
+) -> Dict[str, int]:
+    """Move food and exercise entries older than ``older_than_days`` (rounded to whole months) into the archive."""
+    if older_than_days < 1:
+        raise ValueError("older_than_days must be at least 1")
+    cutoff = archive_cutoff(older_than_days, today)
+    if user_id is None:
+        with get_session() as session:
+            user_ids = session.scalars(select(models.User.id).order_by(models.User.id)).all()
+    else:
+        user_ids = [user_id]
+    totals = {"users": 0, "food": 0, "exercise": 0, "partitions": 0}
+    for uid in user_ids:
+        counts = archive_user(uid, cutoff)
+        if counts["food"] or counts["exercise"]:
+            series_cache.invalidate(uid)
+        totals["users"] += 1
+        for key, value in counts.items():
+            totals[key] += value
+    return totals
+
+
 def delete_food_log_entries(user_id: int, entry_ids: Sequence[int]) -> None:
-    with get_session() as session:
-        stmt = select(models.FoodLog).where(models.FoodLog.id.in_(entry_ids), models.FoodLog.user_id == user_id)
-        for entry in session.scalars(stmt):
-            session.delete(entry)
+    with user_session(user_id) as session:
+        session.execute(
+            delete(models.FoodLog).where(models.FoodLog.id.in_(entry_ids), models.FoodLog.user_id == user_id)
+        )
+    series_cache.invalidate(user_id)
 
 
 def delete_exercise_log_entries(user_id: int, entry_ids: Sequence[int]) -> None:
-    with get_session() as session:
-        stmt = select(models.ExerciseLog).where(models.ExerciseLog.id.in_(entry_ids), models.ExerciseLog.user_id == user_id)
-        for entry in session.scalars(stmt):
-            session.delete(entry)
+    with user_session(user_id) as session:
+        session.execute(
+            delete(models.ExerciseLog).where(models.ExerciseLog.id.in_(entry_ids), models.ExerciseLog.user_id == user_id)
+        )
+    series_cache.invalidate(user_id)
+
 
+def clear_day(user_id: int, entry_date: date, *, food: bool = True, exercise: bool = True) -> Dict[str, int]:
+    """Delete a day's food and/or exercise entries, archived ones included.
 
-def get_weight_history(user_id: int) -> WeightHistory:
+    Live rows go with one ``DELETE ... WHERE`` each; if the day's month was archived,
+    its partition is rewritten without the day in the same transaction.
+    """
+    deleted = {"food": 0, "exercise": 0}
+    with user_session(user_id) as session:
+        if food:
+            result = session.execute(
+                delete(models.FoodLog).where(models.FoodLog.user_id == user_id, models.FoodLog.date == entry_date)
+            )
+            deleted["food"] = result.rowcount + delete_archived_day(session, user_id, FOOD, entry_date)
+        if exercise:
+            result = session.execute(
+                delete(models.ExerciseLog).where(
+                    models.ExerciseLog.user_id == user_id, models.ExerciseLog.date == entry_date
+                )
+            )
+            deleted["exercise"] = result.rowcount + delete_archived_day(session, user_id, EXERCISE, entry_date)
+    series_cache.invalidate(user_id)
+    return deleted
+
+
+def delete_account(username: str, *, export_to=None, chunk_size: int = accounts.CHUNK_SIZE) -> Dict[str, int]:
+    """Delete a user and everything stored for them, optionally writing their export first.
+
+    ``export_to`` is a text stream that receives the JSON Lines export
+    (``accounts.iter_export``); if writing it fails, nothing is deleted. Rows are
+    removed with chunked set-based DELETEs, per-user tables first and the ``users``
+    row last, so an interrupted deletion can be re-run. Returns rows deleted per
+    table (and ``exported`` lines).
+    """
+    user = get_user(username)
+    if not user:
+        raise ValueError("User not found")
+    counts: Dict[str, int] = {}
+    if export_to is not None:
+        counts["exported"] = accounts.export_account(user.id, user.username, export_to, chunk_size=chunk_size)
+    shard = shard_router.shard_of(user.id)
+    counts.update(accounts.purge_user_rows(user.id, user.username, chunk_size=chunk_size))
+    counts["food_items"] = 0
+    while True:
+        with get_session() as session:
+            owned = session.scalars(
+                select(models.FoodItem.id).where(models.FoodItem.owner_id == user.id).limit(chunk_size)
+            ).all()
+        if not owned:
+            break
+        # Also refreshes global recipes that used one of these items.
+        delete_food_items(user.id, owned)
+        counts["food_items"] += len(owned)
     with get_session() as session:
-        stmt = select(models.WeightEntry).where(models.WeightEntry.user_id == user_id).order_by(models.WeightEntry.date.asc())
-        entries = session.scalars(stmt).all()
-    return WeightHistory(entries=[{"date": entry.date.isoformat(), "weight": entry.weight} for entry in entries])
+        session.execute(delete(models.UserShard).where(models.UserShard.user_id == user.id))
+        counts["users"] = session.execute(delete(models.User).where(models.User.id == user.id)).rowcount
+    revoke_user(user.id, user.username)
+    profile_cache.pop(user.id)
+    series_cache.invalidate(user.id)
+    _history_heads.pop(user.username)
+    shard_router.forget(user.id, user.username)
+    if shard == f"user-{user.id}":
+        shard_router.remove_shard(shard)
+    return counts
+
+
+def _lttb(xs: Sequence[float], ys: Sequence[float], threshold: int) -> List[int]:
+    """Largest-Triangle-Three-Buckets: indices of ``threshold`` points preserving the curve's shape."""
+    n = len(xs)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+    every = (n - 2) / (threshold - 2)
+    selected = [0]
+    a = 0
+    for i in range(threshold - 2):
+        avg_start = int((i + 1) * every) + 1
+        avg_end = min(int((i + 2) * every) + 1, n)
+        span = avg_end - avg_start
+        avg_x = sum(xs[avg_start:avg_end]) / span
+        avg_y = sum(ys[avg_start:avg_end]) / span
+        ax, ay = xs[a], ys[a]
+        next_a = range_start = int(i * every) + 1
+        max_area = -1.0
+        for j in range(range_start, int((i + 1) * every) + 1):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > max_area:
+                max_area = area
+                next_a = j
+        selected.append(next_a)
+        a = next_a
+    selected.append(n - 1)
+    return selected
+
+
+def get_weight_history(
+    user_id: int,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    max_points: Optional[int] = None,
+) -> WeightHistory:
+    """Weight entries in ``[start, end]``, LTTB down-sampled to ``max_points`` when given.
+
+    Ranges holding no more than ``max_points`` entries come back at full resolution,
+    so zooming into a short range always shows every weigh-in.
+    """
+    if max_points is not None and max_points < 3:
+        raise ValueError("max_points must be at least 3")
+    stmt = select(models.WeightEntry.date, models.WeightEntry.weight).where(models.WeightEntry.user_id == user_id)
+    if start:
+        stmt = stmt.where(models.WeightEntry.date >= start)
+    if end:
+        stmt = stmt.where(models.WeightEntry.date <= end)
+    with user_session(user_id) as session:
+        rows = session.execute(stmt.order_by(models.WeightEntry.date.asc(), models.WeightEntry.id.asc())).all()
+    indices = range(len(rows))
+    if max_points is not None:
+        indices = _lttb([row.date.toordinal() for row in rows], [row.weight for row in rows], max_points)
+    return WeightHistory(
+        entries=[{"date": rows[i].date.isoformat(), "weight": rows[i].weight} for i in indices],
+        total_points=len(rows),
+    )
+
+
+def _period_start(day: date, period: str) -> date:
+    if period == "month":
+        return day.replace(day=1)
+    return day - timedelta(days=day.weekday())
+
+
+def get_trends(user_id: int, start: date, end: date, profile: ProfileDTO, period: str = "week") -> TrendSummary:
+    """Weekly or monthly intake/burn/deficit aggregates over ``[start, end]``.
+
+    Walks the slice of the user's ``series_cache`` arrays covering the range in
+    Python; nothing is queried once the series is cached. A day counts as logged
+    when it has food entries; the deficit is ``tdee + burn - intake`` and a streak
+    is a run of consecutive logged days meeting the profile's deficit goal. Each
+    day's TDEE uses the weight as of that day (the latest weigh-in on or before it,
+    else the profile's weight) with the profile's current age, height and activity.
+    """
+    if period not in ("week", "month"):
+        raise ValueError("Period must be 'week' or 'month'")
+    if end < start:
+        start, end = end, start
+    series = series_cache.get(user_id)
+    lo, hi = series.bounds(start, end)
+    weight = next(
+        (series.weight[idx] for idx in range(lo - 1, -1, -1) if not math.isnan(series.weight[idx])), profile.weight_kg
+    )
+    tdee_by_weight: Dict[float, float] = {}
+    buckets: Dict[date, Dict[str, float]] = {}
+    longest_streak = current_streak = 0
+    previous_ordinal = None
+    for idx in range(lo, hi):
+        if not math.isnan(series.weight[idx]):
+            weight = series.weight[idx]
+        if not series.food_entries[idx]:
+            continue
+        ordinal = series.days[idx]
+        if previous_ordinal is not None and ordinal != previous_ordinal + 1:
+            current_streak = 0
+        previous_ordinal = ordinal
+        day = date.fromordinal(ordinal)
+        intake = series.intake[idx]
+        burn = series.burn[idx]
+        tdee = tdee_by_weight.get(weight)
+        if tdee is None:
+            bmr = mifflin_st_jeor(weight, profile.height_cm, profile.age, profile.gender)
+            tdee = tdee_by_weight[weight] = calc_tdee(bmr, profile.activity)
+        deficit = tdee + burn - intake
+        bucket = buckets.setdefault(_period_start(day, period), {"days": 0, "intake": 0.0, "burn": 0.0, "deficit": 0.0})
+        bucket["days"] += 1
+        bucket["intake"] += intake
+        bucket["burn"] += burn
+        bucket["deficit"] += deficit
+        current_streak = current_streak + 1 if deficit >= profile.deficit else 0
+        longest_streak = max(longest_streak, current_streak)
+    # A streak is only current if it reaches the end of the range.
+    if previous_ordinal is None or previous_ordinal < end.toordinal():
+        current_streak = 0
+
+    rows = []
+    for period_start in sorted(buckets):
+        bucket = buckets[period_start]
+        days = bucket["days"]
+        rows.append(
+            {
+                "period_start": period_start.isoformat(),
+                "days_logged": days,
+                "intake_total": round(bucket["intake"], 1),
+                "burn_total": round(bucket["burn"], 1),
+                "deficit_total": round(bucket["deficit"], 1),
+                "intake_avg": round(bucket["intake"] / days, 1),
+                "burn_avg": round(bucket["burn"] / days, 1),
+                "deficit_avg": round(bucket["deficit"] / days, 1),
+            }
+        )
+    days_logged = sum(bucket["days"] for bucket in buckets.values())
+    return TrendSummary(
+        start=start.isoformat(),
+        end=end.isoformat(),
+        period=period,
+        buckets=rows,
+        days_logged=days_logged,
+        avg_intake=round(sum(b["intake"] for b in buckets.values()) / days_logged, 1) if days_logged else 0.0,
+        avg_burn=round(sum(b["burn"] for b in buckets.values()) / days_logged, 1) if days_logged else 0.0,
+        avg_deficit=round(sum(b["deficit"] for b in buckets.values()) / days_logged, 1) if days_logged else 0.0,
+        longest_streak=longest_streak,
+        current_streak=current_streak,
+    )
 
 
 def save_synced_state(*, username: str, state: Dict[str, Any]) -> SyncedStateDTO:
+    """Replace a username's synced state with one ``INSERT ... ON CONFLICT DO UPDATE ... RETURNING``.
+
+    Concurrent first syncs for the same username both succeed (the later one wins)
+    instead of racing on the unique constraint, and the same statement reports
+    whether the username also merges records.
+    """
     username = username.strip().lower()
     if not username:
         raise ValueError("Username is required")
-    with get_session() as session:
-        existing = session.scalar(select(models.SyncedState).where(models.SyncedState.username == username))
-        now = datetime.utcnow()
-        if existing:
-            existing.state = state
-            existing.updated_at = now
-            record = existing
-        else:
-            record = models.SyncedState(username=username, state=state, updated_at=now)
-            session.add(record)
-        session.flush()
-        return SyncedStateDTO(username=record.username, state=record.state, updated_at=record.updated_at.isoformat())
+    now = datetime.utcnow()
+    stmt = sqlite_insert(models.SyncedState).values(username=username, state=state, updated_at=now)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[models.SyncedState.username],
+        set_={"state": stmt.excluded.state, "updated_at": stmt.excluded.updated_at},
+    ).returning(
+        models.SyncedState.updated_at,
+        select(models.SyncCursor.username).where(models.SyncCursor.username == username).exists(),
+    )
+    with username_session(username) as session:
+        updated_at, merges = session.execute(stmt).one()
+        head = _record_state_version(session, username, state, now)
+        if merges:
+            _replace_records(session, username, state)
+    _history_heads.set(username, head)
+    return SyncedStateDTO(username=username, state=state, updated_at=updated_at.isoformat())
+
+
+def _record_state_version(session, username: str, state: Dict, now: datetime) -> tuple:
+    """Append ``state`` to the username's history as a diff from the latest version, or a snapshot.
+
+    The latest version's state comes from ``_history_heads`` instead of being read
+    back. Each insert is guarded on the history's current maximum version, so a head
+    that is missing or stale (another process saved in between) yields a snapshot,
+    never a diff against the wrong base. A snapshot is also written whenever the diff
+    chain since the last snapshot reaches ``SYNC_SNAPSHOT_EVERY``, so rebuilding any
+    version reads one snapshot and fewer than that many diffs. Returns the new head
+    ``(version, base_version, depth, state)``.
+    """
+    Version = models.SyncedStateVersion
+    columns = ["username", "version", "base_version", "depth", "is_snapshot", "payload", "created_at"]
+    latest = func.coalesce(select(func.max(Version.version)).where(Version.username == username).scalar_subquery(), 0)
+    head = _history_heads.get(username)
+    guard = true()
+    if head is not MISSING:
+        version, base_version, depth, previous = head
+        ops = jsondiff.diff(previous, state)
+        if not ops:
+            # Unchanged: only write a snapshot if someone else moved the history on.
+            guard = latest != version
+        elif depth + 1 < SYNC_SNAPSHOT_EVERY:
+            values = select(
+                literal(username),
+                literal(version + 1),
+                literal(base_version),
+                literal(depth + 1),
+                literal(False),
+                literal(ops, Version.payload.type),
+                literal(now, Version.created_at.type),
+            ).where(latest == version)
+            if session.execute(insert(Version).from_select(columns, values)).rowcount:
+                return (version + 1, base_version, depth + 1, state)
+    values = select(
+        literal(username),
+        latest + 1,
+        latest + 1,
+        literal(0),
+        literal(True),
+        literal(state, Version.payload.type),
+        literal(now, Version.created_at.type),
+    ).where(guard)
+    version = session.scalar(insert(Version).from_select(columns, values).returning(Version.version))
+    if version is None:
+        return head
+    return (version, version, 0, state)
+
+
+def list_synced_state_versions(username: str) -> List[Dict[str, Any]]:
+    username = username.strip().lower()
+    Version = models.SyncedStateVersion
+    with username_session(username) as session:
+        rows = session.execute(
+            select(Version.version, Version.is_snapshot, Version.created_at)
+            .where(Version.username == username)
+            .order_by(Version.version.asc())
+        ).all()
+    return [
+        {"version": row.version, "snapshot": row.is_snapshot, "created_at": row.created_at.isoformat()} for row in rows
+    ]
+
+
+def load_synced_state_at(username: str, at: datetime) -> Optional[SyncedStateDTO]:
+    """The synced state as of ``at``: the newest version saved at or before it, rebuilt
+    from its snapshot plus the diffs after it."""
+    username = username.strip().lower()
+    Version = models.SyncedStateVersion
+    with username_session(username) as session:
+        target = session.execute(
+            select(Version.version, Version.base_version, Version.created_at)
+            .where(Version.username == username, Version.created_at <= at)
+            .order_by(Version.version.desc())
+            .limit(1)
+        ).first()
+        if target is None:
+            return None
+        rows = session.execute(
+            select(Version.is_snapshot, Version.payload)
+            .where(
+                Version.username == username,
+                Version.version >= target.base_version,
+                Version.version <= target.version,
+            )
+            .order_by(Version.version.asc())
+        ).all()
+    state = None
+    for row in rows:
+        state = row.payload if row.is_snapshot else jsondiff.apply(state, row.payload)
+    return SyncedStateDTO(username=username, state=state, updated_at=target.created_at.isoformat())
+
+
+def compact_synced_history(username: Optional[str] = None, *, now: Optional[datetime] = None) -> Dict[str, int]:
+    """Thin old synced-state history for one username, or every username with history.
+
+    Versions newer than ``SYNC_HISTORY_FULL_DAYS`` are untouched. Older ones are
+    reduced to the last version of each day, and versions older than
+    ``SYNC_HISTORY_RETENTION_DAYS`` are dropped. The surviving old versions are
+    rewritten as a fresh snapshot-plus-diff chain, so storage stays bounded by about
+    one version per day.
+    """
+    now = now or datetime.utcnow()
+    if username is not None:
+        usernames = [username.strip().lower()]
+    else:
+        usernames = set()
+        for shard in [MAIN_SHARD] + shard_router.shards_on_disk():
+            with session_scope(shard_router.factory(shard)) as session:
+                usernames.update(session.scalars(select(models.SyncedStateVersion.username).distinct()))
+    totals = {"usernames": 0, "removed": 0}
+    for name in sorted(usernames):
+        totals["usernames"] += 1
+        totals["removed"] += _compact_history(name, now)
+    return totals
+
+
+def _compact_history(username: str, now: datetime) -> int:
+    Version = models.SyncedStateVersion
+    thin_before = now - timedelta(days=SYNC_HISTORY_FULL_DAYS)
+    drop_before = now - timedelta(days=SYNC_HISTORY_RETENTION_DAYS)
+    with username_session(username) as session:
+        meta = session.execute(
+            select(Version.id, Version.version, Version.is_snapshot, Version.created_at)
+            .where(Version.username == username)
+            .order_by(Version.version.asc())
+        ).all()
+        # Only rows before the last old snapshot are rewritten; later rows depend on it alone.
+        boundary = 0
+        for index, row in enumerate(meta):
+            if row.is_snapshot and row.created_at < thin_before:
+                boundary = index
+        region = meta[:boundary]
+        keep = {
+            row.id
+            for index, row in enumerate(region)
+            if row.created_at >= drop_before and meta[index + 1].created_at.date() != row.created_at.date()
+        }
+        if len(keep) == len(region):
+            return 0
+
+        rewritten = []
+        state = kept_state = None
+        base_version = depth = 0
+        for row in region:
+            payload = session.scalar(select(Version.payload).where(Version.id == row.id))
+            state = payload if row.is_snapshot else jsondiff.apply(state, payload)
+            if row.id not in keep:
+                continue
+            # A detached copy: later diffs mutate ``state`` in place.
+            current = json.loads(json.dumps(state))
+            if kept_state is None or depth + 1 >= SYNC_SNAPSHOT_EVERY:
+                base_version, depth = row.version, 0
+                entry = {"is_snapshot": True, "payload": current}
+            else:
+                depth += 1
+                entry = {"is_snapshot": False, "payload": jsondiff.diff(kept_state, current)}
+            rewritten.append(
+                {
+                    "username": username,
+                    "version": row.version,
+                    "base_version": base_version,
+                    "depth": depth,
+                    "created_at": row.created_at,
+                    **entry,
+                }
+            )
+            kept_state = current
+        session.execute(delete(Version).where(Version.id.in_([row.id for row in region])))
+        if rewritten:
+            session.execute(insert(Version), rewritten)
+    return len(region) - len(rewritten)
 
 
 def load_synced_state(username: str) -> Optional[SyncedStateDTO]:
     username = username.strip().lower()
     if not username:
         return None
-    with get_session() as session:
+    with username_session(username) as session:
         record = session.scalar(select(models.SyncedState).where(models.SyncedState.username == username))
         if not record:
             return None
-        return SyncedStateDTO(username=record.username, state=record.state, updated_at=record.updated_at.isoformat())
+        state = record.state
+        if session.get(models.SyncCursor, username) is not None:
+            state = _with_merged_records(session, username, state)
+        return SyncedStateDTO(username=record.username, state=state, updated_at=record.updated_at.isoformat())
+
+
+# PWA state collections merged record by record (see merge_synced_state), with their key field.
+RECORD_COLLECTIONS = {"foods": "id", "exercises": "id", "weights": "date"}
+_KEY_CHUNK = 500  # keys per IN (...) lookup, under SQLite's bound-parameter limit
+
+
+@dataclass(frozen=True, slots=True)
+class MergeResult(_DTO):
+    username: str
+    cursor: int
+    applied: Dict[str, int]
+    conflicts: Dict[str, List[str]]
+    pull: Dict[str, List[Dict]]
+
+
+def merge_synced_state(
+    *,
+    username: str,
+    since: Optional[int],
+    changes: Dict[str, Dict[str, List[Dict[str, Any]]]],
+    state: Optional[Dict[str, Any]] = None,
+) -> MergeResult:
+    """Merge one device's changed records into the username's synced state.
+
+    ``changes`` maps ``foods``/``exercises``/``weights`` to ``{"upsert": [records],
+    "delete": [{key, "updatedAt"}]}`` holding only what changed on the device since
+    its cursor ``since``. Each record is resolved last-writer-wins on its
+    ``updatedAt`` (ms since the epoch; the server's clock when absent), and identical
+    records (same hash) are not rewritten. ``state``, if given, replaces the
+    non-record parts of the state (profile, journal, ...).
+
+    Work is proportional to the records sent plus the records changed since
+    ``since``: the result's ``pull`` holds the records other devices changed since
+    then, plus the server copy of every record the device lost a conflict on, and
+    ``cursor`` is the ``since`` to send next time.
+    """
+    username = username.strip().lower()
+    if not username:
+        raise ValueError("Username is required")
+    unknown = set(changes) - set(RECORD_COLLECTIONS)
+    if unknown:
+        raise ValueError(f"Unknown record collections: {', '.join(sorted(unknown))}")
+    now_ms = datetime.now(timezone.utc).timestamp() * 1000
+    with username_session(username) as session:
+        seq = _next_sync_seq(session, username)
+        record = session.scalar(select(models.SyncedState).where(models.SyncedState.username == username))
+        if seq == 1 and record is not None:
+            # First merge for this username: index the records of the last full sync.
+            _index_records(session, username, record.state, seq)
+        applied: Dict[str, int] = {}
+        conflicts: Dict[str, List[str]] = {}
+        written = set()
+        for collection, change in changes.items():
+            count, lost, keys = _apply_record_changes(
+                session, username, collection, change.get("upsert", []), change.get("delete", []), seq, now_ms
+            )
+            applied[collection] = count
+            if lost:
+                conflicts[collection] = lost
+            written.update((collection, key) for key in keys)
+        stored = _store_unmerged_state(session, username, record, state)
+        head = None
+        if stored is not None or any(applied.values()):
+            # History holds whole states, as save_synced_state writes them.
+            merged = _with_merged_records(session, username, stored if stored is not None else record.state)
+            head = _record_state_version(session, username, merged, datetime.utcnow())
+        pull = _records_to_pull(session, username, since or 0, written, conflicts)
+    if head is not None:
+        _history_heads.set(username, head)
+    return MergeResult(username=username, cursor=seq, applied=applied, conflicts=conflicts, pull=pull)
+
+
+def _record_hash(record: Dict[str, Any]) -> str:
+    body = {key: value for key, value in record.items() if key != "updatedAt"}
+    return hashlib.sha1(json.dumps(body, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+def _next_sync_seq(session, username: str) -> int:
+    # An atomic increment, so concurrent merges for a username never share a sequence number.
+    stmt = (
+        sqlite_insert(models.SyncCursor)
+        .values(username=username, seq=1)
+        .on_conflict_do_update(index_elements=["username"], set_={"seq": models.SyncCursor.seq + 1})
+        .returning(models.SyncCursor.seq)
+    )
+    return session.execute(stmt).scalar_one()
+
+
+def _record_key(collection: str, record: Dict[str, Any]) -> str:
+    key = record.get(RECORD_COLLECTIONS[collection])
+    if key is None or key == "":
+        raise ValueError(f"Every {collection} record needs a {RECORD_COLLECTIONS[collection]!r}")
+    return str(key)
+
+
+def _apply_record_changes(
+    session,
+    username: str,
+    collection: str,
+    upserts: Sequence[Dict[str, Any]],
+    deletes: Sequence[Dict[str, Any]],
+    seq: int,
+    now_ms: float,
+    force: bool = False,
+):
+    """Write the winning changes for one collection; returns ``(applied, lost keys, written keys)``."""
+    incoming: Dict[str, tuple] = {}
+    for record in upserts:
+        incoming[_record_key(collection, record)] = (float(record.get("updatedAt") or now_ms), _record_hash(record), False, record)
+    for tombstone in deletes:
+        incoming[_record_key(collection, tombstone)] = (float(tombstone.get("updatedAt") or now_ms), "", True, None)
+    if not incoming:
+        return 0, [], []
+    Record = models.SyncedRecord
+    keys = list(incoming)
+    existing = {}
+    for start in range(0, len(keys), _KEY_CHUNK):
+        rows = session.execute(
+            select(Record.id, Record.record_key, Record.record_hash, Record.updated_at, Record.deleted).where(
+                Record.username == username,
+                Record.collection == collection,
+                Record.record_key.in_(keys[start:start + _KEY_CHUNK]),
+            )
+        ).all()
+        existing.update((row.record_key, row) for row in rows)
+    inserts, updates, lost = [], [], []
+    for key, (updated_at, record_hash, deleted, data) in incoming.items():
+        row = existing.get(key)
+        if row is None:
+            inserts.append(
+                {
+                    "username": username,
+                    "collection": collection,
+                    "record_key": key,
+                    "record_hash": record_hash,
+                    "updated_at": updated_at,
+                    "seq": seq,
+                    "deleted": deleted,
+                    "data": data,
+                }
+            )
+            continue
+        if row.record_hash == record_hash and row.deleted == deleted:
+            continue
+        # Last writer wins; equal timestamps fall back to the hash so every server agrees.
+        if not force and (row.updated_at, row.record_hash) > (updated_at, record_hash):
+            lost.append(key)
+            continue
+        updates.append(
+            {"id": row.id, "record_hash": record_hash, "updated_at": updated_at, "seq": seq, "deleted": deleted, "data": data}
+        )
+    if inserts:
+        session.execute(insert(Record), inserts)
+    if updates:
+        session.execute(update(Record), updates)
+    # The device already holds every record it sent and did not lose, so none of those are pulled back.
+    settled = set(lost)
+    return len(inserts) + len(updates), lost, [key for key in incoming if key not in settled]
+
+
+def _index_records(session, username: str, state: Optional[Dict[str, Any]], seq: int) -> None:
+    """Load a full state's record collections into ``synced_records`` (updatedAt 0, so any change wins)."""
+    user = (state or {}).get("user") or {}
+    for collection in RECORD_COLLECTIONS:
+        records = [record for record in user.get(collection) or [] if isinstance(record, dict)]
+        records = [dict(record, updatedAt=record.get("updatedAt") or 0) for record in records if record.get(RECORD_COLLECTIONS[collection]) not in (None, "")]
+        _apply_record_changes(session, username, collection, records, [], seq, 0.0, force=True)
+
+
+def _replace_records(session, username: str, state: Dict[str, Any]) -> None:
+    """After a full save by a username that also merges, make its records match ``state``."""
+    seq = _next_sync_seq(session, username)
+    now_ms = datetime.now(timezone.utc).timestamp() * 1000
+    user = state.get("user") or {}
+    for collection, key_field in RECORD_COLLECTIONS.items():
+        records = [record for record in user.get(collection) or [] if isinstance(record, dict) and record.get(key_field) not in (None, "")]
+        present = {str(record[key_field]) for record in records}
+        live = session.scalars(
+            select(models.SyncedRecord.record_key).where(
+                models.SyncedRecord.username == username,
+                models.SyncedRecord.collection == collection,
+                models.SyncedRecord.deleted.is_(False),
+            )
+        ).all()
+        deletes = [{key_field: key} for key in live if key not in present]
+        _apply_record_changes(session, username, collection, records, deletes, seq, now_ms, force=True)
+
+
+def _store_unmerged_state(session, username: str, record, state: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Keep the non-record parts of the state in ``synced_states``; records live in ``synced_records``.
+
+    Returns what was stored, or None if the stored state was left as it was.
+    """
+    source = state if state is not None else (record.state if record is not None else {"user": {}})
+    user = source.get("user") if isinstance(source.get("user"), dict) else None
+    if state is None and record is not None and (user is None or not any(name in user for name in RECORD_COLLECTIONS)):
+        return None
+    stripped = dict(source)
+    if user is not None:
+        stripped["user"] = {key: value for key, value in user.items() if key not in RECORD_COLLECTIONS}
+    now = datetime.utcnow()
+    if record is None:
+        session.add(models.SyncedState(username=username, state=stripped, updated_at=now))
+    else:
+        record.state = stripped
+        record.updated_at = now
+    return stripped
+
+
+def _records_to_pull(session, username: str, since: int, written, conflicts: Dict[str, List[str]]) -> Dict[str, List[Dict]]:
+    Record = models.SyncedRecord
+    rows = session.execute(
+        select(Record.collection, Record.record_key, Record.updated_at, Record.deleted, Record.data).where(
+            Record.username == username, Record.seq > since
+        )
+    ).all()
+    seen = set()
+    pull: Dict[str, List[Dict]] = {collection: [] for collection in RECORD_COLLECTIONS}
+    for collection, keys in conflicts.items():
+        for start in range(0, len(keys), _KEY_CHUNK):
+            rows += session.execute(
+                select(Record.collection, Record.record_key, Record.updated_at, Record.deleted, Record.data).where(
+                    Record.username == username,
+                    Record.collection == collection,
+                    Record.record_key.in_(keys[start:start + _KEY_CHUNK]),
+                )
+            ).all()
+    for row in rows:
+        ident = (row.collection, row.record_key)
+        if ident in written or ident in seen:
+            continue
+        seen.add(ident)
+        if row.deleted:
+            entry = {RECORD_COLLECTIONS[row.collection]: row.record_key, "deleted": True}
+        else:
+            entry = dict(row.data)
+        entry["updatedAt"] = row.updated_at
+        pull[row.collection].append(entry)
+    return {collection: entries for collection, entries in pull.items() if entries}
+
+
+def _with_merged_records(session, username: str, state: Dict[str, Any]) -> Dict[str, Any]:
+    """``state`` with its record collections read back from ``synced_records``."""
+    rows = session.execute(
+        select(models.SyncedRecord.collection, models.SyncedRecord.data)
+        .where(models.SyncedRecord.username == username, models.SyncedRecord.deleted.is_(False))
+        .order_by(models.SyncedRecord.id.asc())
+    ).all()
+    user = dict(state.get("user") or {})
+    for collection in RECORD_COLLECTIONS:
+        user[collection] = []
+    for collection, data in rows:
+        user[collection].append(data)
+    user["weights"].sort(key=lambda entry: entry.get("date", ""))
+    return {**state, "user": user}
 
 
 def seed_food_items() -> None:
@@ -421,6 +1758,7 @@ def seed_food_items() -> None:
                         owner_id=None,
                     )
                 )
+        catalog.record_changes(session, [item.name for item in session.new])
 
 
 # Initialize DB + seed on module import
@@ -0,0 +1,313 @@
+"""Routing of per-user tables to SQLite shard files.
+
+A SQLite file has a single writer lock, so with every user in ``data/app.db`` all
+writes serialize. With ``WEIGHT_TRACKER_SHARDS`` set, each user's own rows
+(profile, food/exercise/weight logs and synced state) live in a shard file under
+``data/shards/`` while users, the shared food catalog and recipes stay in
+``data/app.db``:
+
+- ``WEIGHT_TRACKER_SHARDS=8`` spreads new users over ``shard-00`` .. ``shard-07``;
+- ``WEIGHT_TRACKER_SHARDS=per-user`` gives every new user a file of their own.
+
+Placement is recorded in the ``user_shards`` directory table, so users can be
+moved between shards (``scripts/rebalance_shards.py``), and users without an
+entry, such as those created before sharding was enabled, are served from the
+main database.
+
+A session from :func:`user_session` is bound to two SQLite files, and committing
+it commits each file in turn, not atomically. Services therefore write to one
+side per transaction (``upsert_profile`` only reads the ``users`` row). The steps
+that must touch both sides commit the shard first and the main database last, and
+can be re-run if interrupted. These are :meth:`ShardRouter.assign`, :func:`move_user`
+and ``services.delete_account``.
+"""
+from __future__ import annotations
+
+from collections import OrderedDict
+from contextlib import contextmanager
+import os
+import threading
+from typing import Dict, List, Optional
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import sessionmaker
+
+from . import db, models
+from .cache import MISSING, LRUCache
+
+MAIN_SHARD = "main"
+SHARD_DIR = db.DATA_DIR / "shards"
+SHARD_MODE = os.environ.get("WEIGHT_TRACKER_SHARDS", "").strip().lower()
+# Open shard engines are bounded so per-user mode does not hold a file handle per user.
+MAX_OPEN_SHARDS = int(os.environ.get("WEIGHT_TRACKER_MAX_OPEN_SHARDS", 64))
+
+# Tables holding one user's rows; everything else stays in the main database.
+SHARDED_MODELS = (
+    models.Profile,
+    models.FoodLog,
+    models.ExerciseLog,
+    models.WeightEntry,
+    models.LogArchive,
+    models.FoodUsage,
+    models.SyncedState,
+    models.SyncedStateVersion,
+    models.SyncedRecord,
+    models.SyncCursor,
+)
+# Of those, the tables keyed by username rather than user_id.
+USERNAME_KEYED = (models.SyncedState, models.SyncedStateVersion, models.SyncedRecord, models.SyncCursor)
+
+
+class ShardRouter:
+    """Maps users to shards and keeps one engine + session factory per open shard."""
+
+    def __init__(self, mode: str = SHARD_MODE, shard_dir=SHARD_DIR, max_open: int = MAX_OPEN_SHARDS):
+        if mode in ("", "0", "off"):
+            mode = ""
+        elif mode != "per-user" and not (mode.isdigit() and int(mode) > 0):
+            raise ValueError("WEIGHT_TRACKER_SHARDS must be a shard count or 'per-user'")
+        self.mode = mode
+        self.shard_dir = shard_dir
+        self.max_open = max_open
+        self._placements = LRUCache(maxsize=100_000)
+        self._user_ids = LRUCache(maxsize=100_000)
+        self._engines: "OrderedDict[str, Engine]" = OrderedDict()
+        self._factories: Dict[str, sessionmaker] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.mode)
+
+    def home_shard(self, user_id: int) -> str:
+        """Shard a user belongs on under the configured mode."""
+        if not self.mode:
+            return MAIN_SHARD
+        if self.mode == "per-user":
+            return f"user-{user_id}"
+        return f"shard-{user_id % int(self.mode):02d}"
+
+    def assign(self, session, user_id: int) -> str:
+        """Record a new user's placement in the directory (part of ``session``'s transaction).
+
+        Synced state saved under the username before it was registered sits in the
+        main database, where the new shard would hide it. It is copied to the shard
+        first, replacing any copy left by an earlier failed attempt. It is deleted from
+        the main database in ``session``'s transaction, so it leaves with the user
+        and placement rows.
+        """
+        shard = self.home_shard(user_id)
+        if shard != MAIN_SHARD:
+            session.add(models.UserShard(user_id=user_id, shard=shard))
+            username = session.get(models.User, user_id).username
+            rows_by_model = _user_rows(session, USERNAME_KEYED, user_id, username)
+            if any(rows_by_model.values()):
+                with db.session_scope(self.factory(shard)) as target:
+                    _replace_user_rows(target, rows_by_model, user_id, username)
+                for model in USERNAME_KEYED:
+                    session.execute(delete(model).where(model.username == username))
+        self._placements.set(user_id, shard)
+        return shard
+
+    def shard_of(self, user_id: int) -> str:
+        shard = self._placements.get(user_id)
+        if shard is MISSING:
+            with db.get_session() as session:
+                shard = session.scalar(select(models.UserShard.shard).where(models.UserShard.user_id == user_id))
+            shard = shard or MAIN_SHARD
+            self._placements.set(user_id, shard)
+        return shard
+
+    def user_id_for(self, username: str) -> Optional[int]:
+        user_id = self._user_ids.get(username)
+        if user_id is MISSING:
+            with db.get_session() as session:
+                user_id = session.scalar(select(models.User.id).where(models.User.username == username))
+            if user_id is None:
+                # Not cached: the user may be created later.
+                return None
+            self._user_ids.set(username, user_id)
+        return user_id
+
+    def forget(self, user_id: Optional[int] = None, username: Optional[str] = None) -> None:
+        """Drop cached placements (one user, or all) after the directory changed elsewhere."""
+        if user_id is None:
+            self._placements.clear()
+        else:
+            self._placements.pop(user_id)
+        if username is not None:
+            self._user_ids.pop(username)
+
+    def reset(self) -> None:
+        """Close every shard engine and forget all placements (the main database was switched)."""
+        with self._lock:
+            engines = list(self._engines.values())
+            self._engines.clear()
+            self._factories.clear()
+        for engine in engines:
+            engine.dispose()
+        self._placements.clear()
+        self._user_ids.clear()
+
+    def remove_shard(self, shard: str) -> None:
+        """Close a shard's engine and delete its file (with any WAL/shared-memory files)."""
+        if shard == MAIN_SHARD:
+            raise ValueError("The main database cannot be removed")
+        with self._lock:
+            engine = self._engines.pop(shard, None)
+            self._factories.pop(shard, None)
+        if engine is not None:
+            engine.dispose()
+        path = self.shard_dir / f"{shard}.db"
+        for stale in (path, path.with_name(path.name + "-wal"), path.with_name(path.name + "-shm")):
+            stale.unlink(missing_ok=True)
+
+    def url_for(self, shard: str) -> str:
+        return f"sqlite:///{self.shard_dir / f'{shard}.db'}"
+
+    def factory(self, shard: str) -> sessionmaker:
+        """Session factory with the per-user tables bound to ``shard`` and the rest to the main DB."""
+        if shard == MAIN_SHARD:
+            return db.SessionLocal
+        with self._lock:
+            if shard in self._engines:
+                self._engines.move_to_end(shard)
+                return self._factories[shard]
+            self.shard_dir.mkdir(parents=True, exist_ok=True)
+            engine = db.create_sqlite_engine(self.url_for(shard))
+            tables = [model.__table__ for model in SHARDED_MODELS]
+            db.Base.metadata.create_all(bind=engine, tables=tables)
+            db.create_missing_indexes(engine, tables)
+            self._engines[shard] = engine
+            self._factories[shard] = sessionmaker(
+                autocommit=False,
+                autoflush=False,
+                expire_on_commit=False,
+                bind=db.engine,
+                binds={model: engine for model in SHARDED_MODELS},
+            )
+            while len(self._engines) > self.max_open:
+                name, stale = self._engines.popitem(last=False)
+                del self._factories[name]
+                # Checked-out connections finish normally; only the idle pool is closed.
+                stale.dispose()
+            return self._factories[shard]
+
+    def engine(self, shard: str) -> Engine:
+        if shard == MAIN_SHARD:
+            return db.engine
+        self.factory(shard)
+        with self._lock:
+            return self._engines[shard]
+
+    def shards_on_disk(self) -> List[str]:
+        if not self.shard_dir.exists():
+            return []
+        return sorted(path.stem for path in self.shard_dir.glob("*.db"))
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            open_shards = len(self._engines)
+        return {"mode": self.mode or "off", "open_shards": open_shards, "max_open": self.max_open}
+
+
+router = ShardRouter()
+db.on_configure(router.reset)
+
+
+@contextmanager
+def user_session(user_id: int):
+    """Like ``db.get_session`` with ``user_id``'s per-user tables routed to their shard."""
+    with db.session_scope(router.factory(router.shard_of(user_id))) as session:
+        yield session
+
+
+@contextmanager
+def username_session(username: str):
+    """Session for rows keyed by username (synced state); unknown names use the main DB."""
+    user_id = router.user_id_for(username)
+    shard = router.shard_of(user_id) if user_id is not None else MAIN_SHARD
+    with db.session_scope(router.factory(shard)) as session:
+        yield session
+
+
+def user_filter(model, user_id: int, username: str):
+    if model in USERNAME_KEYED:
+        return model.username == username
+    return model.user_id == user_id
+
+
+def _user_rows(session, models_, user_id: int, username: str) -> Dict[type, List[Dict]]:
+    """The user's rows of each model, without their ids."""
+    rows_by_model = {}
+    for model in models_:
+        rows = session.execute(select(model.__table__).where(user_filter(model, user_id, username))).mappings().all()
+        rows_by_model[model] = [{key: value for key, value in row.items() if key != "id"} for row in rows]
+    return rows_by_model
+
+
+def _replace_user_rows(session, rows_by_model: Dict[type, List[Dict]], user_id: int, username: str) -> None:
+    for model, rows in rows_by_model.items():
+        session.execute(delete(model).where(user_filter(model, user_id, username)))
+        if rows:
+            session.execute(insert(model.__table__), rows)
+
+
+def move_user(user_id: int, target: str) -> Dict[str, int]:
+    """Copy a user's rows to ``target``, repoint the directory, then delete the old copy.
+
+    Row ids are reassigned in the target shard. Each step commits on its own and the
+    copy first clears any partial copy in the target, so an interrupted move can simply
+    be re-run. Writes for the user that land between the copy and the directory switch
+    stay behind in the old shard, so move users while the backend is stopped (or
+    restart it afterwards so no process keeps a stale placement).
+    """
+    source = router.shard_of(user_id)
+    if source == target:
+        return {}
+    with db.get_session() as session:
+        username = session.scalar(select(models.User.username).where(models.User.id == user_id))
+    if username is None:
+        raise ValueError("User not found")
+
+    with db.session_scope(router.factory(source)) as session:
+        rows_by_model = _user_rows(session, SHARDED_MODELS, user_id, username)
+
+    with db.session_scope(router.factory(target)) as session:
+        _replace_user_rows(session, rows_by_model, user_id, username)
+
+    with db.get_session() as session:
+        session.execute(delete(models.UserShard).where(models.UserShard.user_id == user_id))
+        if target != MAIN_SHARD:
+            session.add(models.UserShard(user_id=user_id, shard=target))
+    router.forget(user_id)
+
+    with db.session_scope(router.factory(source)) as session:
+        for model in SHARDED_MODELS:
+            session.execute(delete(model).where(user_filter(model, user_id, username)))
+    return {model.__tablename__: len(rows) for model, rows in rows_by_model.items()}
+
+
+def placement_counts() -> Dict[str, int]:
+    """Number of users per shard, including users still in the main database."""
+    with db.get_session() as session:
+        total = session.scalar(select(func.count(models.User.id))) or 0
+        counts = dict(
+            session.execute(
+                select(models.UserShard.shard, func.count(models.UserShard.user_id)).group_by(models.UserShard.shard)
+            ).all()
+        )
+    placed = sum(counts.values())
+    if total > placed:
+        counts[MAIN_SHARD] = total - placed
+    return counts
+
+
+def optimize_databases() -> List[str]:
+    """Run ``PRAGMA optimize`` (refreshes query-planner statistics) on every database file."""
+    names = [MAIN_SHARD] + router.shards_on_disk()
+    for name in names:
+        with router.engine(name).connect() as conn:
+            conn.exec_driver_sql("PRAGMA optimize")
+    return names
@@ -1,80 +1,107 @@
 from __future__ import annotations
 
-from dataclasses import asdict
 from datetime import date, datetime, timedelta
 import logging
 from typing import Dict, List, Optional
 
 import reflex as rx
+from reflex.experimental.client_state import ClientStateVar
+from starlette.concurrency import run_in_threadpool
 
 from . import services
-from .services import ProfileDTO
+from .activities import activity_catalog, exercise_kcal
+from .services import ProfileDTO, WeighIn
 
 
 logger = logging.getLogger(__name__)
 if not logger.handlers:
     logging.basicConfig(level=logging.INFO)
 
+# Browser-only copies of what is being typed into the inputs that feed the
+# client-side previews (see ``weight_tracker.committed_input``); "" means no edit
+# in progress. Typing updates them without a websocket event.
+INPUT_DRAFTS = {
+    field: ClientStateVar.create(f"draft_{field}", "")
+    for field in ("profile_age", "profile_height", "profile_weight", "food_qty", "custom_food_kcal")
+}
+
+
+def _input_text(value) -> str:
+    """A committed value as the browser would print it (``70.0`` -> ``"70"``)."""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
 
 class AppState(rx.State):
-    """Global Reflex state that glue together auth, profile, and logging."""
+    """Session root shared by the auth, profile, summary, catalog, weight and trends substates.
 
-    # Auth fields
-    auth_mode: str = "login"
-    login_username: str = ""
-    login_password: str = ""
-    register_username: str = ""
-    register_password: str = ""
-    register_confirm: str = ""
-    message: str = ""
-    error: str = ""
+    Only the session and the message center live here; everything else sits in a
+    focused substate so an event only sends the vars it actually touched.
+    """
 
     # Session
     user_id: Optional[int] = None
     username: str = ""
+    message: str = ""
+    error: str = ""
 
-    # Profile form fields
-    profile_age: int = 30
-    profile_gender: str = "Male"
-    profile_height: int = 170
-    profile_weight: float = 70.0
-    profile_activity: str = "Sedentary"
-    profile_deficit: int = 500
-    profile_metrics: Optional[Dict] = None
+    async def load_user_state(self):
+        if not self.user_id:
+            return
+        profile_state = await self.get_state(ProfileState)
+        profile = profile_state._load(self.user_id)
+        catalog_state = await self.get_state(CatalogState)
+        catalog_state._refresh(self.user_id)
+        summary_state = await self.get_state(SummaryState)
+        summary_state._refresh(self.user_id, profile)
+        weight_state = await self.get_state(WeightState)
+        weight_state._refresh(self.user_id, profile)
 
-    # Dashboard data
-    today_date: str = date.today().isoformat()
-    summary: Dict = {}
-    food_items: List[Dict] = []
-    weight_history: List[Dict] = []
-    # Derived daily summary fields (typed for UI)
-    summary_intake_kcal: float = 0.0
-    summary_burn_kcal: float = 0.0
-    summary_net_kcal: float = 0.0
-    summary_remaining: float = 0.0
-    summary_macro_protein: float = 0.0
-    summary_macro_fat: float = 0.0
-    summary_macro_carbs: float = 0.0
-    summary_food_log: List[Dict] = []
-    summary_exercise_log: List[Dict] = []
+    @staticmethod
+    def _parse_time(value: str):
+        try:
+            return datetime.strptime(value, "%H:%M").time()
+        except ValueError:
+            return datetime.strptime("00:00", "%H:%M").time()
 
-    # Food log form
-    food_choice: str = "custom"
-    food_qty: float = 1.0
-    custom_food_name: str = ""
-    custom_food_measure: str = "1 serving"
-    custom_food_kcal: float = 0.0
-    custom_food_protein: float = 0.0
-    custom_food_fat: float = 0.0
-    custom_food_carbs: float = 0.0
+    @staticmethod
+    def _to_int(value: str, default: int) -> int:
+        try:
+            return int(value or default)
+        except ValueError:
+            return default
 
-    # Exercise form
-    exercise_type: str = "Walking"
-    exercise_start: str = "18:00"
-    exercise_end: str = "19:00"
+    @staticmethod
+    def _to_float(value: str, default: float) -> float:
+        try:
+            return float(value or default)
+        except ValueError:
+            return default
 
-    # Weight form
-    weight_value: float = 70.0
+    def _commit(self, field: str, value) -> List[rx.event.EventSpec]:
+        """Store a value committed from a ``committed_input`` and write it back into the input.
+
+        The input only re-mounts when the stored value changes, so text that parses
+        to the value already stored ("70.0", or an invalid "abc") would otherwise
+        stay in the box. The input's preview draft is cleared as well.
+        """
+        setattr(self, field, value)
+        events = [rx.set_value(field, _input_text(value))]
+        if field in INPUT_DRAFTS:
+            events.append(INPUT_DRAFTS[field].push(""))
+        return events
+
+
+class AuthState(AppState):
+    """Login and registration forms."""
+
+    auth_mode: str = "login"
+    login_username: str = ""
+    login_password: str = ""
+    register_username: str = ""
+    register_password: str = ""
+    register_confirm: str = ""
 
     def set_auth_mode(self, mode: str):
         logger.info("set_auth_mode called with mode=%s", mode)
@@ -107,7 +134,7 @@ class AppState(rx.State):
         self.register_password = ""
         self.register_confirm = ""
 
-    def login(self):
+    async def login(self):
         logger.info("login called with username=%s", self.login_username)
         self.error = ""
         self.message = ""
@@ -120,90 +147,52 @@ class AppState(rx.State):
         self.user_id = user.id
         self.username = user.username
         self.login_password = ""
-        self.load_user_state()
+        await self.load_user_state()
         self.message = f"Welcome back, {self.username}!"
 
-    def logout(self):
+    async def logout(self):
+        for state_cls in (ProfileState, SummaryState, CatalogState, WeightState, TrendsState):
+            substate = await self.get_state(state_cls)
+            substate.reset()
         self.user_id = None
         self.username = ""
-        self.profile_metrics = None
-        self.summary = {}
-        self.summary_intake_kcal = 0.0
-        self.summary_burn_kcal = 0.0
-        self.summary_net_kcal = 0.0
-        self.summary_remaining = 0.0
-        self.summary_macro_protein = 0.0
-        self.summary_macro_fat = 0.0
-        self.summary_macro_carbs = 0.0
-        self.summary_food_log = []
-        self.summary_exercise_log = []
-        self.food_items = []
-        self.weight_history = []
         self.message = "Logged out"
 
+
+class ProfileState(AppState):
+    """Profile form fields and the derived BMR/TDEE metrics."""
+
+    profile_age: int = 30
+    profile_gender: str = "Male"
+    profile_height: int = 170
+    profile_weight: float = 70.0
+    profile_activity: str = "Sedentary"
+    profile_deficit: int = 500
+    profile_metrics: Optional[Dict] = None
+
     # Profile field setters (called from UI inputs)
     def set_profile_age(self, value: str):
         """Update age from numeric input."""
-        self.profile_age = self._to_int(value, self.profile_age)
+        return self._commit("profile_age", self._to_int(value, self.profile_age))
 
     def set_profile_height(self, value: str):
         """Update height from numeric input."""
-        self.profile_height = self._to_int(value, self.profile_height)
+        return self._commit("profile_height", self._to_int(value, self.profile_height))
 
     def set_profile_weight(self, value: str):
         """Update weight from numeric input."""
-        self.profile_weight = self._to_float(value, self.profile_weight)
+        return self._commit("profile_weight", self._to_float(value, self.profile_weight))
 
     def set_profile_deficit(self, value: str):
         """Update deficit from numeric input."""
-        self.profile_deficit = self._to_int(value, self.profile_deficit)
+        return self._commit("profile_deficit", self._to_int(value, self.profile_deficit))
 
-    def load_user_state(self):
-        if not self.user_id:
-            return
-        profile = services.load_profile(self.user_id)
-        if profile:
-            self.profile_metrics = asdict(profile)
-            self.profile_age = profile.age
-            self.profile_gender = profile.gender
-            self.profile_height = profile.height_cm
-            self.profile_weight = profile.weight_kg
-            self.profile_activity = profile.activity
-            self.profile_deficit = profile.deficit
-            self.weight_value = profile.weight_kg
-        else:
-            self.profile_metrics = None
-        self._refresh_food_items()
-        if profile:
-            daily = services.get_daily_summary(self.user_id, date.fromisoformat(self.today_date), profile)
-            self.summary = asdict(daily)
-            self.summary_intake_kcal = daily.intake_kcal
-            self.summary_burn_kcal = daily.burn_kcal
-            self.summary_net_kcal = daily.net_kcal
-            self.summary_remaining = daily.remaining
-            self.summary_macro_protein = daily.macros.get("protein", 0.0)
-            self.summary_macro_fat = daily.macros.get("fat", 0.0)
-            self.summary_macro_carbs = daily.macros.get("carbs", 0.0)
-            self.summary_food_log = daily.food_log
-            self.summary_exercise_log = daily.exercise_log
-        else:
-            self.summary = {}
-            self.summary_intake_kcal = 0.0
-            self.summary_burn_kcal = 0.0
-            self.summary_net_kcal = 0.0
-            self.summary_remaining = 0.0
-            self.summary_macro_protein = 0.0
-            self.summary_macro_fat = 0.0
-            self.summary_macro_carbs = 0.0
-            self.summary_food_log = []
-            self.summary_exercise_log = []
-        self.weight_history = services.get_weight_history(self.user_id).entries
-
-    def save_profile(self):
+    async def save_profile(self):
         if not self.user_id:
             return
         try:
-            profile = services.upsert_profile(
+            profile = await run_in_threadpool(
+                services.upsert_profile,
                 self.user_id,
                 age=int(self.profile_age),
                 gender=self.profile_gender,
@@ -215,61 +204,122 @@ class AppState(rx.State):
         except ValueError as exc:
             self.error = str(exc)
             return
-        self.profile_metrics = asdict(profile)
-        self.weight_value = profile.weight_kg
+        self._apply(profile)
+        weight_state = await self.get_state(WeightState)
+        weight_state.weight_value = profile.weight_kg
+        summary_state = await self.get_state(SummaryState)
+        summary_state._refresh(self.user_id, profile)
         self.message = "Profile saved"
-        self.load_user_state()
 
-    def log_food_entry(self):
+    def _load(self, user_id: int) -> Optional[ProfileDTO]:
+        profile = services.load_profile(user_id)
+        if profile:
+            self._apply(profile)
+        else:
+            self.profile_metrics = None
+        return profile
+
+    def _apply(self, profile: ProfileDTO):
+        self.profile_metrics = profile.to_dict()
+        self.profile_age = profile.age
+        self.profile_gender = profile.gender
+        self.profile_height = profile.height_cm
+        self.profile_weight = profile.weight_kg
+        self.profile_activity = profile.activity
+        self.profile_deficit = profile.deficit
+
+    def _current(self) -> Optional[ProfileDTO]:
+        # Served from services.profile_cache, so refreshes don't touch the profile table.
+        if not self.user_id:
+            return None
+        return services.load_profile(self.user_id)
+
+
+class SummaryState(AppState):
+    """Selected day, its typed summary fields and the food/exercise log forms."""
+
+    today_date: str = date.today().isoformat()
+    summary_intake_kcal: float = 0.0
+    summary_burn_kcal: float = 0.0
+    summary_net_kcal: float = 0.0
+    summary_remaining: float = 0.0
+    summary_macro_protein: float = 0.0
+    summary_macro_fat: float = 0.0
+    summary_macro_carbs: float = 0.0
+    summary_food_log: List[Dict] = []
+    summary_exercise_log: List[Dict] = []
+
+    # Food log form (custom food fields live on CatalogState)
+    food_choice: str = "custom"
+    food_qty: float = 1.0
+    # Entries collected with "Add to meal" and logged together by log_meal_entries
+    meal_items: List[Dict] = []
+
+    # Exercise form
+    exercise_type: str = "Walking"
+    exercise_start: str = "18:00"
+    exercise_end: str = "19:00"
+
+    async def log_food_entry(self):
         if not self.user_id:
             return
-        qty = max(float(self.food_qty), 0.0)
-        if qty <= 0:
-            self.error = "Quantity must be greater than 0"
+        entry = await self._food_entry_from_form()
+        if not entry:
             return
-        entry_date = date.fromisoformat(self.today_date)
-        template = None
-        if self.food_choice != "custom":
-            template = next((item for item in self.food_items if str(item["id"]) == self.food_choice), None)
-        if template:
-            measure = template["measure"]
-            food_name = template["name"]
-            kcal = template["kcal"] * qty
-            protein = template["protein"] * qty
-            fat = template["fat"] * qty
-            carbs = template["carbs"] * qty
-        else:
-            if not self.custom_food_name:
-                self.error = "Enter a food name"
-                return
-            food_name = self.custom_food_name
-            measure = self.custom_food_measure
-            kcal = self.custom_food_kcal * qty
-            protein = self.custom_food_protein * qty
-            fat = self.custom_food_fat * qty
-            carbs = self.custom_food_carbs * qty
-        services.log_food(
-            user_id=self.user_id,
-            entry_date=entry_date,
-            food_name=food_name,
-            measure=measure,
-            qty=qty,
-            kcal=kcal,
-            protein=protein,
-            fat=fat,
-            carbs=carbs,
+        # Log writes wait for their commit (a group-commit batch when enabled), so they
+        # run on a worker thread and concurrent sessions' writes can share a batch.
+        await run_in_threadpool(
+            services.log_food, user_id=self.user_id, entry_date=date.fromisoformat(self.today_date), **entry
         )
         self.message = "Food entry added"
-        self.load_user_state()
+        await self._refresh_current()
+        (await self.get_state(CatalogState))._refresh_frequent(self.user_id)
+
+    async def add_to_meal(self):
+        entry = await self._food_entry_from_form()
+        if not entry:
+            return
+        self.meal_items = self.meal_items + [entry]
 
-    def delete_food_entry(self, entry_id: int):
+    def remove_from_meal(self, index: int):
+        self.meal_items = [item for i, item in enumerate(self.meal_items) if i != index]
+
+    async def log_meal_entries(self):
+        if not self.user_id or not self.meal_items:
+            return
+        try:
+            count = await run_in_threadpool(
+                services.log_meal,
+                user_id=self.user_id,
+                entry_date=date.fromisoformat(self.today_date),
+                items=self.meal_items,
+            )
+        except ValueError as exc:
+            self.error = str(exc)
+            return
+        self.meal_items = []
+        self.message = f"Meal logged ({count} items)"
+        await self._refresh_current()
+        (await self.get_state(CatalogState))._refresh_frequent(self.user_id)
+
+    async def clear_day_food(self):
         if not self.user_id:
             return
-        services.delete_food_log_entries(self.user_id, [entry_id])
-        self.load_user_state()
+        deleted = await run_in_threadpool(
+            services.clear_day, self.user_id, date.fromisoformat(self.today_date), exercise=False
+        )
+        self.message = f"Removed {deleted['food']} food entries"
+        await self._refresh_current()
 
-    def log_exercise_entry(self):
-        if not self.user_id or not self.profile_metrics:
+    async def delete_food_entry(self, entry_id: int):
+        if not self.user_id:
+            return
+        await run_in_threadpool(services.delete_food_log_entries, self.user_id, [entry_id])
+        await self._refresh_current()
+
+    async def log_exercise_entry(self):
+        profile_state = await self.get_state(ProfileState)
+        if not self.user_id or not profile_state.profile_metrics:
             self.error = "Complete your profile first"
             return
         start = self._parse_time(self.exercise_start)
@@ -279,10 +329,10 @@ class AppState(rx.State):
         if dt_end <= dt_start:
             dt_end += timedelta(days=1)
         mins = (dt_end - dt_start).total_seconds() / 60
-        weight = self.profile_metrics.get("weight_kg", 70.0)
-        met = services.MET_VALUES.get(self.exercise_type, 3.5)
-        kcal_burn = met * 3.5 * weight / 200 * mins
-        services.log_exercise(
+        weight = profile_state.profile_metrics.get("weight_kg", 70.0)
+        kcal_burn = exercise_kcal(activity_catalog.met(self.exercise_type), weight, mins)
+        await run_in_threadpool(
+            services.log_exercise,
             user_id=self.user_id,
             entry_date=date.fromisoformat(self.today_date),
             ex_type=self.exercise_type,
@@ -292,34 +342,115 @@ class AppState(rx.State):
             kcal_burn=kcal_burn,
         )
         self.message = "Exercise entry added"
-        self.load_user_state()
+        self._refresh(self.user_id, profile_state._current())
 
-    def delete_exercise_entry(self, entry_id: int):
+    async def delete_exercise_entry(self, entry_id: int):
         if not self.user_id:
             return
-        services.delete_exercise_log_entries(self.user_id, [entry_id])
-        self.load_user_state()
+        await run_in_threadpool(services.delete_exercise_log_entries, self.user_id, [entry_id])
+        await self._refresh_current()
 
-    def log_weight_entry(self):
-        if not self.user_id:
-            return
-        entry_date = date.fromisoformat(self.today_date)
-        services.log_weight(user_id=self.user_id, entry_date=entry_date, weight=float(self.weight_value))
-        profile = services.upsert_profile(
-            self.user_id,
-            age=int(self.profile_age),
-            gender=self.profile_gender,
-            height_cm=int(self.profile_height),
-            weight_kg=float(self.weight_value),
-            activity=self.profile_activity,
-            deficit=int(self.profile_deficit),
-        )
-        self.profile_metrics = asdict(profile)
-        self.profile_weight = profile.weight_kg
-        self.message = "Weight logged"
-        self.load_user_state()
+    async def set_today(self, new_date: str):
+        self.today_date = new_date
+        if self.user_id:
+            await self._refresh_current()
+
+    def update_food_qty(self, value: str):
+        return self._commit("food_qty", self._to_float(value, 0.0))
+
+    async def _food_entry_from_form(self) -> Optional[Dict]:
+        """Build a food log entry (totals for the quantity) from the food form, or set an error."""
+        qty = max(float(self.food_qty), 0.0)
+        if qty <= 0:
+            self.error = "Quantity must be greater than 0"
+            return None
+        catalog_state = await self.get_state(CatalogState)
+        template = None
+        if self.food_choice != "custom":
+            template = next((item for item in catalog_state.food_items if str(item["id"]) == self.food_choice), None)
+        if template:
+            return {
+                "food_name": template["name"],
+                "measure": template["measure"],
+                "qty": qty,
+                "kcal": template["kcal"] * qty,
+                "protein": template["protein"] * qty,
+                "fat": template["fat"] * qty,
+                "carbs": template["carbs"] * qty,
+            }
+        if not catalog_state.custom_food_name:
+            self.error = "Enter a food name"
+            return None
+        return {
+            "food_name": catalog_state.custom_food_name,
+            "measure": catalog_state.custom_food_measure,
+            "qty": qty,
+            "kcal": catalog_state.custom_food_kcal * qty,
+            "protein": catalog_state.custom_food_protein * qty,
+            "fat": catalog_state.custom_food_fat * qty,
+            "carbs": catalog_state.custom_food_carbs * qty,
+        }
+
+    async def _refresh_current(self):
+        profile_state = await self.get_state(ProfileState)
+        self._refresh(self.user_id, profile_state._current())
+
+    def _retarget(self, profile: ProfileDTO):
+        """Recompute the day's remaining budget for new profile metrics; the logged totals are unchanged."""
+        self.summary_remaining = max(profile.tdee - profile.deficit, 0) - self.summary_net_kcal
+
+    def _refresh(self, user_id: Optional[int], profile: Optional[ProfileDTO]):
+        if user_id and profile:
+            # Archived days would otherwise show up empty; for a day with no archived
+            # month this costs one index lookup per kind.
+            daily = services.get_daily_summary(
+                user_id, date.fromisoformat(self.today_date), profile, include_archive=True
+            )
+            self.summary_intake_kcal = daily.intake_kcal
+            self.summary_burn_kcal = daily.burn_kcal
+            self.summary_net_kcal = daily.net_kcal
+            self.summary_remaining = daily.remaining
+            self.summary_macro_protein = daily.macros.get("protein", 0.0)
+            self.summary_macro_fat = daily.macros.get("fat", 0.0)
+            self.summary_macro_carbs = daily.macros.get("carbs", 0.0)
+            self.summary_food_log = daily.food_log
+            self.summary_exercise_log = daily.exercise_log
+        else:
+            self.summary_intake_kcal = 0.0
+            self.summary_burn_kcal = 0.0
+            self.summary_net_kcal = 0.0
+            self.summary_remaining = 0.0
+            self.summary_macro_protein = 0.0
+            self.summary_macro_fat = 0.0
+            self.summary_macro_carbs = 0.0
+            self.summary_food_log = []
+            self.summary_exercise_log = []
+
+
+class CatalogState(AppState):
+    """Food catalog, the custom food fields shared by logging and templates, and the recipe builder."""
+
+    food_items: List[Dict] = []
+    # The user's most used catalog foods (services.top_foods), listed first in the food picker
+    frequent_food_items: List[Dict] = []
+    frequent_food_values: List[str] = []
+    # kcal per unit by select value, for the food form's client-side total
+    food_kcal_by_value: Dict[str, float] = {}
+    custom_food_name: str = ""
+    custom_food_measure: str = "1 serving"
+    custom_food_kcal: float = 0.0
+    custom_food_protein: float = 0.0
+    custom_food_fat: float = 0.0
+    custom_food_carbs: float = 0.0
+
+    # Recipe builder
+    recipe_name: str = ""
+    recipe_servings: float = 1.0
+    recipe_choice: str = ""
+    recipe_qty: float = 1.0
+    recipe_ingredients: List[Dict] = []
 
-    def add_custom_food_item(self, make_global: bool = False):
+    async def add_custom_food_item(self, make_global: bool = False):
         if not self.custom_food_name:
             self.error = "Provide a food name"
             return
@@ -330,7 +461,8 @@ class AppState(rx.State):
             self.error = "Only logged-in users can add foods"
             return
         try:
-            services.add_food_item(
+            await run_in_threadpool(
+                services.add_food_item,
                 user_id=None if make_global else self.user_id,
                 name=self.custom_food_name,
                 measure=self.custom_food_measure,
@@ -344,70 +476,202 @@ class AppState(rx.State):
         except ValueError as exc:
             self.error = str(exc)
             return
-        self._refresh_food_items()
+        self._refresh(self.user_id)
         self.message = "Food template saved"
 
-    def delete_food_template(self, item_id: int):
+    async def delete_food_template(self, item_id: int):
         if not self.user_id:
             return
-        services.delete_food_items(self.user_id, [item_id])
-        self._refresh_food_items()
+        await run_in_threadpool(services.delete_food_items, self.user_id, [item_id])
+        self._refresh(self.user_id)
+
+    def add_recipe_ingredient(self):
+        item = next((item for item in self.food_items if item["value"] == self.recipe_choice), None)
+        qty = self._to_float(self.recipe_qty, 0.0)
+        if not item or qty <= 0:
+            self.error = "Pick an ingredient and a quantity"
+            return
+        self.recipe_ingredients = self.recipe_ingredients + [
+            {"food_item_id": item["id"], "name": item["name"], "qty": qty, "kcal": item["kcal"] * qty}
+        ]
 
-    def set_today(self, new_date: str):
-        self.today_date = new_date
-        if self.user_id and self.profile_metrics:
-            profile = ProfileDTO(**self.profile_metrics)
-            daily = services.get_daily_summary(self.user_id, date.fromisoformat(new_date), profile)
-            self.summary = asdict(daily)
-            self.summary_intake_kcal = daily.intake_kcal
-            self.summary_burn_kcal = daily.burn_kcal
-            self.summary_net_kcal = daily.net_kcal
-            self.summary_remaining = daily.remaining
-            self.summary_macro_protein = daily.macros.get("protein", 0.0)
-            self.summary_macro_fat = daily.macros.get("fat", 0.0)
-            self.summary_macro_carbs = daily.macros.get("carbs", 0.0)
-            self.summary_food_log = daily.food_log
-            self.summary_exercise_log = daily.exercise_log
+    def remove_recipe_ingredient(self, index: int):
+        self.recipe_ingredients = [item for i, item in enumerate(self.recipe_ingredients) if i != index]
 
-    def update_food_qty(self, value: str):
-        self.food_qty = self._to_float(value, 0.0)
+    async def save_recipe_item(self):
+        if not self.user_id:
+            return
+        if not self.recipe_name:
+            self.error = "Provide a recipe name"
+            return
+        try:
+            recipe = await run_in_threadpool(
+                services.save_recipe,
+                user_id=self.user_id,
+                name=self.recipe_name,
+                servings=self._to_float(self.recipe_servings, 1.0),
+                ingredients=self.recipe_ingredients,
+            )
+        except ValueError as exc:
+            self.error = str(exc)
+            return
+        self.recipe_name = ""
+        self.recipe_servings = 1.0
+        self.recipe_ingredients = []
+        self._refresh(self.user_id)
+        self.message = f"Recipe saved ({recipe['kcal']} kcal per serving)"
+
+    def update_recipe_qty(self, value: str):
+        self.recipe_qty = self._to_float(value, 0.0)
+
+    def update_recipe_servings(self, value: str):
+        self.recipe_servings = self._to_float(value, 1.0)
 
     def update_custom_kcal(self, value: str):
-        self.custom_food_kcal = self._to_float(value, 0.0)
+        return self._commit("custom_food_kcal", self._to_float(value, 0.0))
 
     def update_custom_protein(self, value: str):
-        self.custom_food_protein = self._to_float(value, 0.0)
+        return self._commit("custom_food_protein", self._to_float(value, 0.0))
 
     def update_custom_fat(self, value: str):
-        self.custom_food_fat = self._to_float(value, 0.0)
+        return self._commit("custom_food_fat", self._to_float(value, 0.0))
 
     def update_custom_carbs(self, value: str):
-        self.custom_food_carbs = self._to_float(value, 0.0)
-
-    def update_weight_value(self, value: str):
-        self.weight_value = self._to_float(value, self.weight_value)
+        return self._commit("custom_food_carbs", self._to_float(value, 0.0))
 
-    def _refresh_food_items(self):
-        items = services.list_food_items(self.user_id)
+    def _refresh(self, user_id: Optional[int]):
+        items = services.list_food_items(user_id)
         self.food_items = [{**item, "value": str(item["id"])} for item in items]
+        self.food_kcal_by_value = {item["value"]: item["kcal"] for item in self.food_items}
+        self._refresh_frequent(user_id)
 
-    @staticmethod
-    def _parse_time(value: str):
-        try:
-            return datetime.strptime(value, "%H:%M").time()
-        except ValueError:
-            return datetime.strptime("00:00", "%H:%M").time()
+    def _refresh_frequent(self, user_id: Optional[int]):
+        # The user's own template wins over a global food of the same name.
+        by_name = {}
+        for item in self.food_items:
+            if item["name"] not in by_name or item["owner_id"] is not None:
+                by_name[item["name"]] = item
+        top = services.top_foods(user_id) if user_id else []
+        frequent = [by_name[food["food_name"]] for food in top if food["food_name"] in by_name]
+        values = [item["value"] for item in frequent]
+        if values != self.frequent_food_values:
+            self.frequent_food_items = frequent
+            self.frequent_food_values = values
 
-    @staticmethod
-    def _to_int(value: str, default: int) -> int:
+
+# Points sent for the weight chart/table; a few hundred pixels can't show more.
+WEIGHT_CHART_POINTS = 200
+
+
+class WeightState(AppState):
+    """Weight history (down-sampled for the selected range) and the weigh-in form."""
+
+    weight_history: List[Dict] = []
+    weight_total_points: int = 0
+    weight_range: str = "365"
+    weight_value: float = 70.0
+
+    async def log_weight_entry(self):
+        if not self.user_id:
+            return
+        summary_state = await self.get_state(SummaryState)
+        entry_date = date.fromisoformat(summary_state.today_date)
         try:
-            return int(value or default)
-        except ValueError:
-            return default
+            weigh_in = await run_in_threadpool(
+                services.record_weight, user_id=self.user_id, entry_date=entry_date, weight=float(self.weight_value)
+            )
+        except ValueError as exc:
+            self.error = str(exc)
+            return
+        if weigh_in.latest and weigh_in.profile:
+            (await self.get_state(ProfileState))._apply(weigh_in.profile)
+            summary_state._retarget(weigh_in.profile)
+        self._add_point(weigh_in)
+        self.message = "Weight logged"
 
-    @staticmethod
-    def _to_float(value: str, default: float) -> float:
+    def update_weight_value(self, value: str):
+        return self._commit("weight_value", self._to_float(value, self.weight_value))
+
+    def set_weight_range(self, value: str):
+        self.weight_range = value
+        if self.user_id:
+            self._refresh_history(self.user_id)
+
+    def _refresh(self, user_id: int, profile: Optional[ProfileDTO]):
+        if profile:
+            self.weight_value = profile.weight_kg
+        self._refresh_history(user_id)
+
+    def _add_point(self, weigh_in: WeighIn):
+        """Put a weigh-in into the loaded history (replacing that day's point) without reloading it."""
+        point = weigh_in.point
+        if self.weight_range != "all":
+            start = date.today() - timedelta(days=self._to_int(self.weight_range, 365))
+            if point["date"] < start.isoformat():
+                return
+        history = [entry for entry in self.weight_history if entry["date"] != point["date"]]
+        index = next((i for i, entry in enumerate(history) if entry["date"] > point["date"]), len(history))
+        self.weight_history = history[:index] + [point] + history[index:]
+        if not weigh_in.replaced:
+            self.weight_total_points += 1
+
+    def _refresh_history(self, user_id: int):
+        start = None
+        if self.weight_range != "all":
+            start = date.today() - timedelta(days=self._to_int(self.weight_range, 365))
+        history = services.get_weight_history(user_id, start=start, max_points=WEIGHT_CHART_POINTS)
+        self.weight_history = history.entries
+        self.weight_total_points = history.total_points
+
+
+class TrendsState(AppState):
+    """Weekly/monthly intake, burn and deficit aggregates for a date range."""
+
+    trend_period: str = "week"
+    trend_start: str = (date.today() - timedelta(days=89)).isoformat()
+    trend_end: str = date.today().isoformat()
+    trend_buckets: List[Dict] = []
+    trend_days_logged: int = 0
+    trend_avg_intake: float = 0.0
+    trend_avg_burn: float = 0.0
+    trend_avg_deficit: float = 0.0
+    trend_longest_streak: int = 0
+    trend_current_streak: int = 0
+
+    async def set_trend_period(self, period: str):
+        self.trend_period = period
+        await self.load_trends()
+
+    async def set_trend_start(self, value: str):
+        self.trend_start = value
+        await self.load_trends()
+
+    async def set_trend_end(self, value: str):
+        self.trend_end = value
+        await self.load_trends()
+
+    async def load_trends(self):
+        profile_state = await self.get_state(ProfileState)
+        profile = profile_state._current()
+        if not self.user_id or not profile:
+            return
         try:
-            return float(value or default)
-        except ValueError:
-            return default
+            trends = services.get_trends(
+                self.user_id,
+                date.fromisoformat(self.trend_start),
+                date.fromisoformat(self.trend_end),
+                profile,
+                self.trend_period,
+            )
+        except ValueError as exc:
+            self.error = str(exc)
+            return
+        self.trend_start = trends.start
+        self.trend_end = trends.end
+        self.trend_buckets = trends.buckets
+        self.trend_days_logged = trends.days_logged
+        self.trend_avg_intake = trends.avg_intake
+        self.trend_avg_burn = trends.avg_burn
+        self.trend_avg_deficit = trends.avg_deficit
+        self.trend_longest_streak = trends.longest_streak
+        self.trend_current_streak = trends.current_streak
@@ -0,0 +1,308 @@
+"""Size-bounded reading and schema validation of ``POST /api/sync-state`` bodies.
+
+The body is read chunk by chunk and rejected as soon as it passes
+``WEIGHT_TRACKER_SYNC_MAX_BYTES`` (or up front when ``Content-Length`` already
+says so), so an oversized upload never sits in memory whole. The parsed document
+is then checked by a validator compiled once from :data:`STATE_SCHEMA`, the shape
+the static app sends (``state.user.foods``, ``exercises``, ``weights``, ...), or
+from :data:`MERGE_BODY_SCHEMA` for record-level merges.
+Unknown keys are allowed so older and newer app versions keep syncing.
+"""
+from __future__ import annotations
+
+import math
+import os
+import threading
+import time
+from typing import Any, AsyncIterable, Callable, Dict, Optional
+
+from .responses import loads
+
+MAX_SYNC_BYTES = int(os.environ.get("WEIGHT_TRACKER_SYNC_MAX_BYTES", 8 * 1024 * 1024))
+MAX_RECORDS = int(os.environ.get("WEIGHT_TRACKER_SYNC_MAX_RECORDS", 200_000))
+
+
+class PayloadError(ValueError):
+    """A rejected sync body; ``status_code`` is the HTTP status to answer with."""
+
+    def __init__(self, message: str, status_code: int = 422):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+# Schema building blocks: plain tuples, compiled into closures by ``compile_schema``.
+def Str(max_length: int = 200):
+    return ("str", max_length)
+
+
+def Num():
+    return ("num",)
+
+
+def Nullable(spec):
+    return ("nullable", spec)
+
+
+def Obj(fields: Dict[str, Any], required=()):
+    return ("obj", fields, frozenset(required))
+
+
+def Arr(item, max_items: int = MAX_RECORDS):
+    return ("arr", item, max_items)
+
+
+ANY = ("any",)
+
+FOOD = Obj(
+    {
+        "id": ("id",),
+        "date": Str(10),
+        "time": Nullable(Str(8)),
+        "name": Str(),
+        "qty": Nullable(Num()),
+        "kcal": Num(),
+        "protein": Nullable(Num()),
+        "fat": Nullable(Num()),
+        "carbs": Nullable(Num()),
+        "updatedAt": Nullable(Num()),
+    },
+    required=("date", "name", "kcal"),
+)
+EXERCISE = Obj(
+    {
+        "id": ("id",),
+        "date": Str(10),
+        "time": Nullable(Str(8)),
+        "met": Num(),
+        "mins": Num(),
+        "kcalBurn": Num(),
+        "label": Nullable(Str()),
+        "updatedAt": Nullable(Num()),
+    },
+    required=("date", "mins", "kcalBurn"),
+)
+WEIGHT = Obj({"date": Str(10), "weight": Num(), "updatedAt": Nullable(Num())}, required=("date", "weight"))
+SAVED_FOOD = Obj(
+    {"name": Str(), "kcal": Num(), "protein": Nullable(Num()), "fat": Nullable(Num()), "carbs": Nullable(Num())},
+    required=("name",),
+)
+USER = Obj(
+    {
+        "profile": Obj({"name": Nullable(Str(50))}),
+        "foods": Arr(FOOD),
+        "exercises": Arr(EXERCISE),
+        "weights": Arr(WEIGHT),
+        "detox": Obj({"items": Arr(ANY, 1000), "daily": Arr(ANY)}),
+        "savedFoods": Arr(SAVED_FOOD, 10_000),
+        "recentFoods": Arr(Str(), 1000),
+        "fitness": Obj({"strength": Arr(ANY), "cardio": Arr(ANY)}),
+        "journal": Arr(Obj({"date": Str(10)}, required=("date",))),
+    }
+)
+STATE_SCHEMA = Obj(
+    {
+        "user": USER,
+        "activeUserId": Nullable(Str(100)),
+        "insightsMonth": Nullable(Str(7)),
+    }
+)
+BODY_SCHEMA = Obj({"username": Str(50), "state": STATE_SCHEMA}, required=("username", "state"))
+
+
+def _changes(record, key: str):
+    tombstone = Obj({key: ("id",), "updatedAt": Nullable(Num())}, required=(key,))
+    return Obj({"upsert": Arr(record), "delete": Arr(tombstone)})
+
+
+# ``POST /api/sync-state/merge``: only the records that changed since ``since``.
+MERGE_BODY_SCHEMA = Obj(
+    {
+        "username": Str(50),
+        "since": Nullable(Num()),
+        "changes": Obj(
+            {"foods": _changes(FOOD, "id"), "exercises": _changes(EXERCISE, "id"), "weights": _changes(WEIGHT, "date")}
+        ),
+        "state": Nullable(STATE_SCHEMA),
+    },
+    required=("username", "changes"),
+)
+
+
+class _Invalid(Exception):
+    """Raised by compiled validators; containers prepend their key on the way out."""
+
+    def __init__(self, message: str):
+        self.message = message
+        self.path: list = []
+
+
+def _located(error: _Invalid, key) -> _Invalid:
+    error.path.append(key)
+    return error
+
+
+def compile_schema(spec) -> Callable[[Any], None]:
+    """Turn a schema spec into a validator ``check(value)``.
+
+    Paths are only assembled when validation fails, so a valid document costs one
+    type check per value.
+    """
+    kind = spec[0]
+    if kind == "any":
+        return lambda value: None
+    if kind == "str":
+        max_length = spec[1]
+
+        def check_str(value):
+            if type(value) is not str:
+                raise _Invalid("expected a string")
+            if len(value) > max_length:
+                raise _Invalid(f"longer than {max_length} characters")
+
+        return check_str
+    if kind == "num":
+
+        def check_num(value):
+            if type(value) not in (int, float) or (type(value) is float and not math.isfinite(value)):
+                raise _Invalid("expected a number")
+
+        return check_num
+    if kind == "id":
+
+        def check_id(value):
+            if type(value) not in (str, int) or (type(value) is str and len(value) > 64):
+                raise _Invalid("expected a string or integer id")
+
+        return check_id
+    if kind == "nullable":
+        inner = compile_schema(spec[1])
+
+        def check_nullable(value):
+            if value is not None:
+                inner(value)
+
+        return check_nullable
+    if kind == "arr":
+        # Untyped items are not walked at all.
+        item_check = None if spec[1] is ANY else compile_schema(spec[1])
+        max_items = spec[2]
+
+        def check_arr(value):
+            if type(value) is not list:
+                raise _Invalid("expected a list")
+            if len(value) > max_items:
+                raise _Invalid(f"more than {max_items} entries")
+            if item_check is None:
+                return
+            index = 0
+            try:
+                for index, item in enumerate(value):
+                    item_check(item)
+            except _Invalid as error:
+                raise _located(error, index)
+
+        return check_arr
+    if kind == "obj":
+        fields = tuple((name, compile_schema(field)) for name, field in spec[1].items())
+        required = spec[2]
+
+        def check_obj(value):
+            if type(value) is not dict:
+                raise _Invalid("expected an object")
+            for name in required:
+                if name not in value:
+                    raise _located(_Invalid("is required"), name)
+            for name, check in fields:
+                if name in value:
+                    try:
+                        check(value[name])
+                    except _Invalid as error:
+                        raise _located(error, name)
+
+        return check_obj
+    raise ValueError(f"unknown schema kind {kind!r}")
+
+
+def _check_body(document: Any, validate: Callable[[Any], None]) -> None:
+    try:
+        validate(document)
+    except _Invalid as error:
+        path = "".join(f"[{key}]" if isinstance(key, int) else f".{key}" for key in reversed(error.path))
+        raise PayloadError(f"{path.lstrip('.') or 'body'}: {error.message}")
+    if not document["username"].strip():
+        raise PayloadError("username: must not be empty")
+
+
+_VALIDATORS = {"sync": compile_schema(BODY_SCHEMA), "merge": compile_schema(MERGE_BODY_SCHEMA)}
+
+
+class PayloadStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.accepted = 0
+        self.rejected: Dict[str, int] = {}
+        self.bytes = 0
+        self.max_bytes = 0
+        self.parse_seconds = 0.0
+        self.validate_seconds = 0.0
+        self.max_validate_seconds = 0.0
+
+    def record(self, size: int, parse: float, validate: float, reason: Optional[str] = None) -> None:
+        with self._lock:
+            if reason:
+                self.rejected[reason] = self.rejected.get(reason, 0) + 1
+            else:
+                self.accepted += 1
+            self.bytes += size
+            self.max_bytes = max(self.max_bytes, size)
+            self.parse_seconds += parse
+            self.validate_seconds += validate
+            self.max_validate_seconds = max(self.max_validate_seconds, validate)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            seen = self.accepted + sum(self.rejected.values())
+            return {
+                "limit_bytes": MAX_SYNC_BYTES,
+                "accepted": self.accepted,
+                "rejected": dict(self.rejected),
+                "max_bytes": self.max_bytes,
+                "avg_parse_ms": round(1000 * self.parse_seconds / seen, 3) if seen else 0.0,
+                "avg_validate_ms": round(1000 * self.validate_seconds / seen, 3) if seen else 0.0,
+                "max_validate_ms": round(1000 * self.max_validate_seconds, 3),
+            }
+
+
+payload_stats = PayloadStats()
+
+
+async def read_body(chunks: AsyncIterable[bytes], content_length: Optional[str], limit: int = MAX_SYNC_BYTES) -> bytes:
+    """Collect a request body, failing with 413 as soon as it exceeds ``limit`` bytes."""
+    if content_length and content_length.isdigit() and int(content_length) > limit:
+        payload_stats.record(0, 0.0, 0.0, reason="too_large")
+        raise PayloadError(f"Sync payload exceeds {limit} bytes", status_code=413)
+    body = bytearray()
+    async for chunk in chunks:
+        body += chunk
+        if len(body) > limit:
+            payload_stats.record(len(body), 0.0, 0.0, reason="too_large")
+            raise PayloadError(f"Sync payload exceeds {limit} bytes", status_code=413)
+    return bytes(body)
+
+
+def parse_body(body: bytes, kind: str = "sync") -> Dict[str, Any]:
+    """Decode and validate a sync body (``kind`` ``"sync"``) or merge body (``"merge"``)."""
+    started = time.perf_counter()
+    try:
+        document = loads(body)
+    except ValueError as exc:
+        payload_stats.record(len(body), time.perf_counter() - started, 0.0, reason="invalid_json")
+        raise PayloadError(f"Invalid JSON: {exc}", status_code=400) from exc
+    parsed = time.perf_counter()
+    try:
+        _check_body(document, _VALIDATORS[kind])
+    except PayloadError:
+        payload_stats.record(len(body), parsed - started, time.perf_counter() - parsed, reason="invalid_schema")
+        raise
+    payload_stats.record(len(body), parsed - started, time.perf_counter() - parsed)
+    return document
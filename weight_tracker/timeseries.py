@@ -0,0 +1,327 @@
+"""Compact, array-backed per-user daily series for range analytics.
+
+Each loaded user is held as parallel ``array`` columns (one slot per day that has
+any food, exercise or weight data) instead of lists of dicts, so a multi-year
+history costs a few dozen bytes per day. Users are loaded lazily with grouped
+queries, kept in an LRU bounded by a byte budget, and kept current by the
+``services`` write paths. Writes made by other processes (maintenance scripts) are
+picked up when a series expires after ``WEIGHT_TRACKER_SERIES_TTL`` seconds.
+"""
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from datetime import date
+import math
+import os
+import sys
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import func, select
+
+from .archive import EXERCISE, FOOD, archived_day_totals
+from .shards import user_session
+from . import models
+
+DEFAULT_MEMORY_BUDGET = int(os.environ.get("WEIGHT_TRACKER_SERIES_BUDGET", 32 * 1024 * 1024))
+# Seconds a loaded series is trusted; 0 keeps series until evicted or invalidated.
+DEFAULT_TTL = float(os.environ.get("WEIGHT_TRACKER_SERIES_TTL", 600))
+
+_FLOAT_COLUMNS = ("intake", "burn", "protein", "fat", "carbs", "weight")
+# Bytes one day slot adds across every column.
+_SLOT_BYTES = array("l").itemsize * 2 + array("d").itemsize * len(_FLOAT_COLUMNS)
+
+
+class UserSeries:
+    """Day-ordered columns for one user. ``weight`` is NaN on days without a weigh-in."""
+
+    __slots__ = ("days", "food_entries") + _FLOAT_COLUMNS
+
+    def __init__(self):
+        self.days = array("l")
+        self.food_entries = array("l")
+        for name in _FLOAT_COLUMNS:
+            setattr(self, name, array("d"))
+
+    def __len__(self) -> int:
+        return len(self.days)
+
+    @property
+    def nbytes(self) -> int:
+        return sys.getsizeof(self) + 64 * len(self.__slots__) + _SLOT_BYTES * len(self.days)
+
+    def bounds(self, start: date, end: date) -> Tuple[int, int]:
+        """Index range ``[lo, hi)`` covering ``start..end`` inclusive."""
+        return bisect_left(self.days, start.toordinal()), bisect_right(self.days, end.toordinal())
+
+    def _slot(self, day: date) -> int:
+        ordinal = day.toordinal()
+        idx = bisect_left(self.days, ordinal)
+        if idx == len(self.days) or self.days[idx] != ordinal:
+            self.days.insert(idx, ordinal)
+            self.food_entries.insert(idx, 0)
+            for name in _FLOAT_COLUMNS:
+                getattr(self, name).insert(idx, math.nan if name == "weight" else 0.0)
+        return idx
+
+    def add_food(self, day: date, kcal: float, protein: float, fat: float, carbs: float, entries: int = 1):
+        idx = self._slot(day)
+        self.food_entries[idx] += entries
+        self.intake[idx] += kcal
+        self.protein[idx] += protein
+        self.fat[idx] += fat
+        self.carbs[idx] += carbs
+
+    def add_burn(self, day: date, kcal_burn: float):
+        idx = self._slot(day)
+        self.burn[idx] += kcal_burn
+
+    def set_weight(self, day: date, weight: float):
+        idx = self._slot(day)
+        self.weight[idx] = weight
+
+
+def load_series(user_id: int) -> UserSeries:
+    """Build a user's series with one grouped query per source table, archived days included."""
+    series = UserSeries()
+    with user_session(user_id) as session:
+        food_rows = session.execute(
+            select(
+                models.FoodLog.date,
+                func.count(models.FoodLog.id),
+                func.sum(models.FoodLog.kcal),
+                func.sum(models.FoodLog.protein),
+                func.sum(models.FoodLog.fat),
+                func.sum(models.FoodLog.carbs),
+            )
+            .where(models.FoodLog.user_id == user_id)
+            .group_by(models.FoodLog.date)
+        ).all()
+        burn_rows = session.execute(
+            select(models.ExerciseLog.date, func.sum(models.ExerciseLog.kcal_burn))
+            .where(models.ExerciseLog.user_id == user_id)
+            .group_by(models.ExerciseLog.date)
+        ).all()
+        weight_rows = session.execute(
+            select(models.WeightEntry.date, models.WeightEntry.weight)
+            .where(models.WeightEntry.user_id == user_id)
+            .order_by(models.WeightEntry.date.asc(), models.WeightEntry.id.asc())
+        ).all()
+        # Archived months contribute their stored per-day totals.
+        archived_food = list(archived_day_totals(session, user_id, FOOD))
+        archived_burn = list(archived_day_totals(session, user_id, EXERCISE))
+    for day, count, kcal, protein, fat, carbs in food_rows:
+        series.add_food(day, kcal or 0.0, protein or 0.0, fat or 0.0, carbs or 0.0, entries=count)
+    for day, kcal_burn in burn_rows:
+        series.add_burn(day, kcal_burn or 0.0)
+    for day, weight in weight_rows:
+        # Rows are ordered, so the last weigh-in of a day wins.
+        series.set_weight(day, weight)
+    for day, (count, kcal, protein, fat, carbs) in archived_food:
+        series.add_food(day, kcal, protein, fat, carbs, entries=count)
+    for day, kcal_burn in archived_burn:
+        series.add_burn(day, kcal_burn)
+    return series
+
+
+class SeriesCache:
+    """Thread-safe LRU of :class:`UserSeries`, evicted to stay under ``memory_budget`` bytes.
+
+    Loads run outside the lock, so one user's queries never stall lookups for
+    others. Writers call :meth:`begin_write` before committing and pass the
+    returned sequence number to ``record_*`` afterwards. A load is cached only if
+    no write or invalidation for its user began while it ran. A cached series is
+    patched by a write only if it was loaded before that write began; a series
+    loaded later may already hold the row, so it is dropped instead. The byte
+    total is kept as a running sum, updated as series are added, grown and dropped.
+    """
+
+    def __init__(self, memory_budget: int = DEFAULT_MEMORY_BUDGET, ttl: float = DEFAULT_TTL, clock=time.monotonic):
+        self.memory_budget = memory_budget
+        self.ttl = ttl
+        self._clock = clock
+        # user id -> (loaded at, sequence number when its load began, series)
+        self._series: "OrderedDict[int, Tuple[float, int, UserSeries]]" = OrderedDict()
+        self._sequence = 0
+        # Sequence number of the last write begun per user; only kept while the
+        # user is cached or being loaded, the only times it is compared.
+        self._written: Dict[int, int] = {}
+        self._loading: Dict[int, int] = {}  # user id -> loads in flight
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, user_id: int) -> UserSeries:
+        with self._lock:
+            series = self._lookup(user_id)
+            if series is not None:
+                self._series.move_to_end(user_id)
+                self.hits += 1
+                return series
+            self.misses += 1
+            started = self._sequence
+            self._loading[user_id] = self._loading.get(user_id, 0) + 1
+        try:
+            loaded = load_series(user_id)
+        except BaseException:
+            with self._lock:
+                self._end_load(user_id)
+            raise
+        with self._lock:
+            self._end_load(user_id)
+            series = self._lookup(user_id)
+            if series is not None:
+                # Another thread cached the user meanwhile; keep that copy.
+                self._series.move_to_end(user_id)
+                return series
+            if self._written.get(user_id, 0) <= started:
+                self._series[user_id] = (self._clock(), started, loaded)
+                self._bytes += loaded.nbytes
+                self._evict()
+            else:
+                self._forget_writes(user_id)
+            return loaded
+
+    def peek(self, user_id: int) -> Optional[UserSeries]:
+        """Return a loaded series without loading or touching LRU order."""
+        with self._lock:
+            return self._lookup(user_id)
+
+    def begin_write(self, user_id: int) -> int:
+        """Call before committing a write for ``user_id``; pass the result to ``record_*`` after the commit."""
+        with self._lock:
+            return self._mark(user_id)
+
+    def record_food(
+        self,
+        user_id: int,
+        day: date,
+        *,
+        write: int,
+        kcal: float,
+        protein: float,
+        fat: float,
+        carbs: float,
+        entries: int = 1,
+    ):
+        with self._lock:
+            series = self._written_series(user_id, write)
+            if series is not None:
+                before = len(series)
+                series.add_food(day, kcal, protein, fat, carbs, entries=entries)
+                self._grown(series, before)
+
+    def record_exercise(self, user_id: int, day: date, *, write: int, kcal_burn: float):
+        with self._lock:
+            series = self._written_series(user_id, write)
+            if series is not None:
+                before = len(series)
+                series.add_burn(day, kcal_burn)
+                self._grown(series, before)
+
+    def record_weight(self, user_id: int, day: date, *, write: int, weight: float):
+        with self._lock:
+            series = self._written_series(user_id, write)
+            if series is not None:
+                before = len(series)
+                series.set_weight(day, weight)
+                self._grown(series, before)
+
+    def invalidate(self, user_id: Optional[int] = None):
+        """Drop one user's series (e.g. after deletes), or every series when ``user_id`` is None.
+
+        Loads in flight for the user (or for anyone) are not cached either.
+        """
+        with self._lock:
+            if user_id is None:
+                self._series.clear()
+                self._bytes = 0
+                self._written.clear()
+                for loading in self._loading:
+                    self._mark(loading)
+            else:
+                self._mark(user_id)
+                self._drop(user_id)
+
+    @property
+    def nbytes(self) -> int:
+        with self._lock:
+            return self._bytes
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "users": len(self._series),
+                "bytes": self._bytes,
+                "budget": self.memory_budget,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    def _lookup(self, user_id: int) -> Optional[UserSeries]:
+        entry = self._series.get(user_id)
+        if entry is None:
+            return None
+        loaded_at, _, series = entry
+        if self.ttl and self._clock() - loaded_at > self.ttl:
+            self._drop(user_id)
+            self.expirations += 1
+            return None
+        return series
+
+    def _mark(self, user_id: int) -> int:
+        self._sequence += 1
+        if user_id in self._series or user_id in self._loading:
+            self._written[user_id] = self._sequence
+        return self._sequence
+
+    def _written_series(self, user_id: int, write: int) -> Optional[UserSeries]:
+        entry = self._series.get(user_id)
+        if entry is None:
+            return None
+        if entry[1] >= write:
+            # Loaded after the write began: the row may already be counted.
+            self._drop(user_id)
+            return None
+        return entry[2]
+
+    def _end_load(self, user_id: int):
+        remaining = self._loading.pop(user_id) - 1
+        if remaining:
+            self._loading[user_id] = remaining
+
+    def _forget_writes(self, user_id: int):
+        if user_id not in self._series and user_id not in self._loading:
+            self._written.pop(user_id, None)
+
+    def _drop(self, user_id: int):
+        entry = self._series.pop(user_id, None)
+        if entry is not None:
+            self._bytes -= entry[2].nbytes
+        self._forget_writes(user_id)
+
+    def _grown(self, series: UserSeries, before: int):
+        added = len(series) - before
+        if added:
+            self._bytes += _SLOT_BYTES * added
+            self._evict()
+
+    def _evict(self):
+        # Always keep the most recently used series, even if it alone exceeds the budget.
+        while self._bytes > self.memory_budget and len(self._series) > 1:
+            user_id, (_, _, series) = self._series.popitem(last=False)
+            self._bytes -= series.nbytes
+            self._forget_writes(user_id)
+            self.evictions += 1
+
+
+series_cache = SeriesCache()
@@ -0,0 +1,116 @@
+"""HMAC-signed, expiring session tokens for the HTTP API.
+
+A password is checked (one PBKDF2 run) only at login; every later request is
+authenticated by verifying the token's HMAC-SHA256 signature, which takes
+microseconds. Tokens look like ``<base64url payload>.<base64url signature>``.
+
+The signing key comes from ``WEIGHT_TRACKER_TOKEN_SECRET`` or, failing that, a
+random key persisted to ``data/token.key`` so tokens survive restarts.
+"""
+from __future__ import annotations
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import time
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from .cache import MISSING, LRUCache
+from .db import DATA_DIR, on_configure
+
+TOKEN_TTL = int(os.environ.get("WEIGHT_TRACKER_TOKEN_TTL", 7 * 24 * 3600))
+SECRET_PATH = DATA_DIR / "token.key"
+
+
+@dataclass(frozen=True, slots=True)
+class TokenClaims:
+    user_id: int
+    username: str
+    expires_at: int
+    token_id: str
+
+
+def _load_secret() -> bytes:
+    env_secret = os.environ.get("WEIGHT_TRACKER_TOKEN_SECRET")
+    if env_secret:
+        return env_secret.encode("utf-8")
+    if not SECRET_PATH.exists():
+        # O_EXCL so concurrent workers agree on a single key.
+        try:
+            fd = os.open(SECRET_PATH, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            pass
+        else:
+            with os.fdopen(fd, "w") as f:
+                f.write(secrets.token_hex(32))
+    return SECRET_PATH.read_text().strip().encode("utf-8")
+
+
+_SECRET = _load_secret()
+
+# Revoked token ids are kept until the longest-lived token would have expired anyway.
+# Bounded: if more than ``maxsize`` tokens are revoked within one TTL window, the
+# oldest revocations are forgotten.
+revoked_tokens = LRUCache(maxsize=int(os.environ.get("WEIGHT_TRACKER_REVOCATION_CACHE_SIZE", 10_000)), ttl=TOKEN_TTL)
+# Deleted accounts: (user id, username) -> latest expiry of a token issued before the deletion.
+revoked_users = LRUCache(maxsize=10_000, ttl=TOKEN_TTL)
+# A fresh database hands out the same user ids again.
+on_configure(revoked_users.clear)
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _sign(payload: str) -> str:
+    return _b64encode(hmac.new(_SECRET, payload.encode("utf-8"), hashlib.sha256).digest())
+
+
+def issue_token(user_id: int, username: str, ttl: int = TOKEN_TTL) -> Tuple[str, TokenClaims]:
+    claims = TokenClaims(
+        user_id=user_id,
+        username=username,
+        expires_at=int(time.time()) + ttl,
+        token_id=secrets.token_urlsafe(12),
+    )
+    body = {"sub": claims.user_id, "usr": claims.username, "exp": claims.expires_at, "jti": claims.token_id}
+    payload = _b64encode(json.dumps(body, separators=(",", ":")).encode("utf-8"))
+    return f"{payload}.{_sign(payload)}", claims
+
+
+def verify_token(token: str) -> Optional[TokenClaims]:
+    """Return the token's claims if the signature is valid, unexpired and not revoked."""
+    payload, _, signature = token.partition(".")
+    if not payload or not signature or not hmac.compare_digest(signature, _sign(payload)):
+        return None
+    try:
+        claims = json.loads(_b64decode(payload))
+    except ValueError:
+        return None
+    if claims["exp"] < time.time() or revoked_tokens.get(claims["jti"]) is not MISSING:
+        return None
+    cutoff = revoked_users.get((claims["sub"], claims["usr"]))
+    if cutoff is not MISSING and claims["exp"] <= cutoff:
+        return None
+    return TokenClaims(user_id=claims["sub"], username=claims["usr"], expires_at=claims["exp"], token_id=claims["jti"])
+
+
+def revoke_token(token: str) -> bool:
+    claims = verify_token(token)
+    if not claims:
+        return False
+    revoked_tokens.set(claims.token_id, True)
+    return True
+
+
+def revoke_user(user_id: int, username: str) -> None:
+    """Invalidate every token issued so far to a (deleted) account; its id may be reused later."""
+    revoked_users.set((user_id, username), int(time.time()) + TOKEN_TTL)
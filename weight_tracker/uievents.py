@@ -0,0 +1,69 @@
+"""Per-session counts of the UI events the Reflex backend handles.
+
+Registered as app middleware, so every websocket event is counted under its
+session token and handler (``profile_state.set_profile_age``, ...), together
+with the bytes of state delta it sent back. Reported under ``ui_events`` in
+``/api/metrics`` to show how many round trips a session costs.
+"""
+from __future__ import annotations
+
+from collections import OrderedDict
+import json
+import os
+import threading
+from typing import Any, Dict
+
+from reflex.middleware import Middleware
+
+MAX_SESSIONS = int(os.environ.get("WEIGHT_TRACKER_UI_EVENT_SESSIONS", 1024))
+
+
+def _handler_name(event_name: str) -> str:
+    # "reflex___state____state.weight_tracker___state____profile_state.set_profile_age" -> "profile_state.set_profile_age"
+    state, _, handler = event_name.rpartition(".")
+    return f"{state.rpartition('____')[2]}.{handler}" if state else handler
+
+
+class EventCounter(Middleware):
+    def __init__(self, max_sessions: int = MAX_SESSIONS):
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        self._sessions: "OrderedDict[str, int]" = OrderedDict()
+        self.events = 0
+        self.delta_bytes = 0
+        self.by_handler: Dict[str, int] = {}
+
+    async def preprocess(self, app, state, event):
+        name = _handler_name(event.name)
+        with self._lock:
+            self.events += 1
+            self.by_handler[name] = self.by_handler.get(name, 0) + 1
+            self._sessions[event.token] = self._sessions.pop(event.token, 0) + 1
+            if len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return None
+
+    async def postprocess(self, app, state, event, update):
+        size = len(json.dumps(update.delta, default=str)) if update.delta else 0
+        with self._lock:
+            self.delta_bytes += size
+        return update
+
+    def session_events(self, token: str) -> int:
+        with self._lock:
+            return self._sessions.get(token, 0)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = list(self._sessions.values())
+            return {
+                "events": self.events,
+                "delta_bytes": self.delta_bytes,
+                "sessions": len(counts),
+                "avg_events_per_session": round(sum(counts) / len(counts), 1) if counts else 0.0,
+                "max_events_per_session": max(counts, default=0),
+                "by_handler": dict(sorted(self.by_handler.items(), key=lambda item: -item[1])),
+            }
+
+
+ui_events = EventCounter()
@@ -1,23 +1,82 @@
 from __future__ import annotations
 
-from typing import Any, Dict
+from datetime import date, datetime, timezone
+import os
+import subprocess
+import sys
+from typing import List, Optional
 
-from fastapi import HTTPException
+from fastapi import Depends, Header, HTTPException, Request
 from pydantic import BaseModel, Field
 import reflex as rx
+from reflex.vars import FunctionStringVar, StringVar
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response, StreamingResponse
 
-from .state import AppState
+from .accounts import iter_export
+from .activities import activity_catalog
+from .archive import ARCHIVE_AFTER_DAYS
+from .backup import backup_all
+from .catalog import catalog
+from .db import DATA_DIR, ROOT
+from .responses import FastJSONResponse
+from .scheduler import scheduler
+from .shards import optimize_databases, router as shard_router
+from .state import (
+    INPUT_DRAFTS,
+    AppState,
+    AuthState,
+    CatalogState,
+    ProfileState,
+    SummaryState,
+    TrendsState,
+    WeightState,
+)
+from .syncpayload import PayloadError, parse_body, payload_stats, read_body
+from .timeseries import series_cache
+from .tokens import TokenClaims, issue_token, revoke_token, revoked_tokens, verify_token
+from .uievents import ui_events
+from .writebehind import group_commit
 from . import services
 
 
-EXERCISE_TYPES = list(services.MET_VALUES.keys())
+EXERCISE_TYPES = activity_catalog.names()
 ACTIVITY_LEVELS = list(services.ACTIVITY_MULTIPLIERS.keys())
 GENDERS = ["Male", "Female"]
+TREND_PERIODS = ["week", "month"]
+WEIGHT_RANGES = [("30", "30 days"), ("90", "90 days"), ("365", "1 year"), ("all", "All time")]
 
 
-class SyncPayload(BaseModel):
-    username: str = Field(min_length=1, description="Username from the local app state")
-    state: Dict[str, Any]
+class LoginPayload(BaseModel):
+    username: str = Field(min_length=1)
+    password: str = Field(min_length=1)
+
+
+class MealItem(BaseModel):
+    food_name: str = Field(min_length=1)
+    measure: str = "1 serving"
+    qty: float = Field(default=1.0, gt=0)
+    kcal: float = 0.0
+    protein: float = 0.0
+    fat: float = 0.0
+    carbs: float = 0.0
+
+
+class MealPayload(BaseModel):
+    username: str = Field(min_length=1)
+    date: date
+    items: List[MealItem] = Field(min_length=1, description="Entries with kcal/macros already scaled by qty")
+
+
+class AccountDeletePayload(BaseModel):
+    username: str = Field(min_length=1)
+    password: str = Field(min_length=1)
+
+
+class WeightPayload(BaseModel):
+    username: str = Field(min_length=1)
+    date: date
+    weight: float = Field(gt=0, lt=1000)
 
 
 def card(*children, **kwargs) -> rx.Component:
@@ -44,28 +103,28 @@ def metric_card(title: str, value_component: rx.Component, subtitle: str = "") -
 
 def summary_section() -> rx.Component:
     return rx.cond(
-        AppState.profile_metrics != None,
+        ProfileState.profile_metrics != None,
         rx.vstack(
             rx.heading("Today's Summary", size="4"),
             rx.flex(
                 metric_card(
                     "Intake",
-                    rx.text(AppState.summary_intake_kcal, font_size="2xl", font_weight="bold"),
+                    rx.text(SummaryState.summary_intake_kcal, font_size="2xl", font_weight="bold"),
                     "kcal",
                 ),
                 metric_card(
                     "Burn",
-                    rx.text(AppState.summary_burn_kcal, font_size="2xl", font_weight="bold"),
+                    rx.text(SummaryState.summary_burn_kcal, font_size="2xl", font_weight="bold"),
                     "kcal",
                 ),
                 metric_card(
                     "Net",
-                    rx.text(AppState.summary_net_kcal, font_size="2xl", font_weight="bold"),
+                    rx.text(SummaryState.summary_net_kcal, font_size="2xl", font_weight="bold"),
                     "kcal",
                 ),
                 metric_card(
                     "Remaining",
-                    rx.text(AppState.summary_remaining, font_size="2xl", font_weight="bold"),
+                    rx.text(SummaryState.summary_remaining, font_size="2xl", font_weight="bold"),
                     "kcal",
                 ),
                 gap="1rem",
@@ -73,11 +132,11 @@ def summary_section() -> rx.Component:
             ),
             rx.box(
                 rx.text("Protein (g): "),
-                rx.text(AppState.summary_macro_protein),
+                rx.text(SummaryState.summary_macro_protein),
                 rx.text("  Fat (g): "),
-                rx.text(AppState.summary_macro_fat),
+                rx.text(SummaryState.summary_macro_fat),
                 rx.text("  Carbs (g): "),
-                rx.text(AppState.summary_macro_carbs),
+                rx.text(SummaryState.summary_macro_carbs),
                 padding_y="0.5rem",
                 color="gray.600",
             ),
@@ -86,52 +145,109 @@ def summary_section() -> rx.Component:
     )
 
 
+def committed_input(value: rx.Var, on_commit, **props) -> rx.Component:
+    """Input that reaches the backend once, on blur, instead of on every (debounced) keystroke.
+
+    It is uncontrolled, keyed by the server value, so it re-mounts with the new
+    value whenever the backend changes it (profile loads, saves, weigh-ins). Commit
+    handlers write the stored value back through the input's ``id`` (see
+    ``AppState._commit``). Inputs with an entry in ``INPUT_DRAFTS`` also copy each
+    keystroke into it for the previews, in the browser only.
+    """
+    text = value if isinstance(value, StringVar) else value.to_string()
+    draft = INPUT_DRAFTS.get(props.get("id"))
+    if draft is not None:
+        props.update(on_change=draft.set_value, on_mount=draft.set_value(""))
+    return rx.input(default_value=text, key=text, on_blur=on_commit, **props)
+
+
+_ACTIVITY_MULTIPLIERS = rx.Var.create(services.ACTIVITY_MULTIPLIERS)
+_NUMBER = FunctionStringVar.create("Number")
+_IS_FINITE = FunctionStringVar.create("Number.isFinite")
+
+
+def typed_number(field: str, value: rx.Var) -> rx.Var:
+    """The number being typed into ``field``'s input, or the server ``value`` when nothing valid is."""
+    draft = INPUT_DRAFTS[field].value
+    typed = _NUMBER.call(draft).to(float)
+    return rx.cond((draft != "") & _IS_FINITE.call(typed).to(bool), typed, value)
+
+
+def bmr_preview() -> rx.Var:
+    """``services.mifflin_st_jeor`` evaluated in the browser from the profile fields as typed."""
+    return (
+        10 * typed_number("profile_weight", ProfileState.profile_weight)
+        + 6.25 * typed_number("profile_height", ProfileState.profile_height)
+        - 5 * typed_number("profile_age", ProfileState.profile_age)
+        + rx.cond(ProfileState.profile_gender == "Male", 5, -161)
+    )
+
+
+def tdee_preview() -> rx.Var:
+    """``services.calc_tdee`` evaluated in the browser."""
+    return bmr_preview() * _ACTIVITY_MULTIPLIERS[ProfileState.profile_activity]
+
+
+def food_kcal_preview() -> rx.Var:
+    """kcal x quantity for the selected (or custom) food as typed, evaluated in the browser."""
+    per_unit = rx.cond(
+        SummaryState.food_choice == "custom",
+        typed_number("custom_food_kcal", CatalogState.custom_food_kcal),
+        CatalogState.food_kcal_by_value[SummaryState.food_choice],
+    )
+    return per_unit * typed_number("food_qty", SummaryState.food_qty)
+
+
 def profile_form() -> rx.Component:
     return card(
         rx.vstack(
             rx.heading("Profile", size="4"),
             rx.vstack(
                 rx.text("Age"),
-                rx.input(
-                    type_="number",
-                    value=AppState.profile_age,
-                    on_change=AppState.set_profile_age,
-                ),
+                committed_input(ProfileState.profile_age, ProfileState.set_profile_age, id="profile_age", type_="number"),
                 align_items="flex-start",
             ),
             rx.select(
                 items=GENDERS,
-                value=AppState.profile_gender,
-                on_change=AppState.set_profile_gender,
+                value=ProfileState.profile_gender,
+                on_change=ProfileState.set_profile_gender,
             ),
             rx.vstack(
                 rx.text("Height (cm)"),
-                rx.input(type_="number", value=AppState.profile_height, on_change=AppState.set_profile_height),
+                committed_input(ProfileState.profile_height, ProfileState.set_profile_height, id="profile_height", type_="number"),
                 align_items="flex-start",
             ),
             rx.vstack(
                 rx.text("Weight (kg)"),
-                rx.input(type_="number", value=AppState.profile_weight, on_change=AppState.set_profile_weight),
+                committed_input(ProfileState.profile_weight, ProfileState.set_profile_weight, id="profile_weight", type_="number"),
                 align_items="flex-start",
             ),
             rx.select(
                 items=ACTIVITY_LEVELS,
-                value=AppState.profile_activity,
-                on_change=AppState.set_profile_activity,
+                value=ProfileState.profile_activity,
+                on_change=ProfileState.set_profile_activity,
             ),
             rx.vstack(
                 rx.text("Daily kcal deficit goal"),
-                rx.input(type_="number", value=AppState.profile_deficit, on_change=AppState.set_profile_deficit),
+                committed_input(ProfileState.profile_deficit, ProfileState.set_profile_deficit, id="profile_deficit", type_="number"),
                 align_items="flex-start",
             ),
-            rx.button("Save profile", on_click=AppState.save_profile, color_scheme="green"),
+            rx.text(
+                "Estimate: BMR ",
+                round(bmr_preview()),
+                " kcal, TDEE ",
+                round(tdee_preview()),
+                " kcal",
+                color="gray.600",
+            ),
+            rx.button("Save profile", on_click=ProfileState.save_profile, color_scheme="green"),
             rx.cond(
-                AppState.profile_metrics != None,
+                ProfileState.profile_metrics != None,
                 rx.vstack(
                     rx.text("BMR: "),
-                    rx.text(AppState.profile_metrics["bmr"]),
+                    rx.text(ProfileState.profile_metrics["bmr"]),
                     rx.text("TDEE: "),
-                    rx.text(AppState.profile_metrics["tdee"]),
+                    rx.text(ProfileState.profile_metrics["tdee"]),
                 ),
                 rx.fragment(),
             ),
@@ -151,50 +267,79 @@ def food_form() -> rx.Component:
                     rx.select.group(
                         rx.select.label("Food"),
                         rx.select.item("Custom entry", value="custom"),
+                    ),
+                    rx.cond(
+                        CatalogState.frequent_food_items,
+                        rx.select.group(
+                            rx.select.label("Frequent"),
+                            rx.foreach(
+                                CatalogState.frequent_food_items,
+                                lambda item: rx.select.item(item["name"], value=item["value"]),
+                            ),
+                        ),
+                    ),
+                    rx.select.group(
+                        rx.select.label("All foods"),
+                        # Frequent foods are listed once, in their own group above.
                         rx.foreach(
-                            AppState.food_items,
-                            lambda item: rx.select.item(item["name"], value=item["value"]),
+                            CatalogState.food_items,
+                            lambda item: rx.cond(
+                                CatalogState.frequent_food_values.contains(item["value"]),
+                                rx.fragment(),
+                                rx.select.item(item["name"], value=item["value"]),
+                            ),
                         ),
-                    )
+                    ),
                 ),
-                value=AppState.food_choice,
-                on_change=AppState.set_food_choice,
+                value=SummaryState.food_choice,
+                on_change=SummaryState.set_food_choice,
             ),
-            rx.input(type_="number", placeholder="Quantity", value=AppState.food_qty, on_change=AppState.update_food_qty),
-            rx.input(placeholder="Food name", value=AppState.custom_food_name, on_change=AppState.set_custom_food_name),
-            rx.input(placeholder="Measure", value=AppState.custom_food_measure, on_change=AppState.set_custom_food_measure),
+            committed_input(
+                SummaryState.food_qty, SummaryState.update_food_qty, id="food_qty", type_="number", placeholder="Quantity"
+            ),
+            committed_input(CatalogState.custom_food_name, CatalogState.set_custom_food_name, placeholder="Food name"),
+            committed_input(CatalogState.custom_food_measure, CatalogState.set_custom_food_measure, placeholder="Measure"),
             rx.flex(
-                rx.input(
+                committed_input(
+                    CatalogState.custom_food_kcal,
+                    CatalogState.update_custom_kcal,
+                    id="custom_food_kcal",
                     placeholder="kcal",
                     type_="number",
-                    value=AppState.custom_food_kcal,
-                    on_change=AppState.update_custom_kcal,
                 ),
-                rx.input(
+                committed_input(
+                    CatalogState.custom_food_protein,
+                    CatalogState.update_custom_protein,
+                    id="custom_food_protein",
                     placeholder="Protein",
                     type_="number",
-                    value=AppState.custom_food_protein,
-                    on_change=AppState.update_custom_protein,
                 ),
-                rx.input(
+                committed_input(
+                    CatalogState.custom_food_fat,
+                    CatalogState.update_custom_fat,
+                    id="custom_food_fat",
                     placeholder="Fat",
                     type_="number",
-                    value=AppState.custom_food_fat,
-                    on_change=AppState.update_custom_fat,
                 ),
-                rx.input(
+                committed_input(
+                    CatalogState.custom_food_carbs,
+                    CatalogState.update_custom_carbs,
+                    id="custom_food_carbs",
                     placeholder="Carbs",
                     type_="number",
-                    value=AppState.custom_food_carbs,
-                    on_change=AppState.update_custom_carbs,
                 ),
                 gap="0.5rem",
                 wrap="wrap",
             ),
-            rx.button("Add food", on_click=AppState.log_food_entry, color_scheme="teal"),
+            rx.text("Total: ", round(food_kcal_preview()), " kcal", color="gray.600"),
+            rx.hstack(
+                rx.button("Add food", on_click=SummaryState.log_food_entry, color_scheme="teal"),
+                rx.button("Add to meal", on_click=SummaryState.add_to_meal, variant="outline"),
+            ),
+            meal_draft(),
             rx.button(
                 "Save as template",
-                on_click=lambda: AppState.add_custom_food_item(False),
+                on_click=lambda: CatalogState.add_custom_food_item(False),
                 variant="outline",
             ),
         ),
@@ -202,18 +347,36 @@ def food_form() -> rx.Component:
     )
 
 
+def meal_draft() -> rx.Component:
+    return rx.cond(
+        SummaryState.meal_items != [],
+        rx.vstack(
+            rx.foreach(
+                SummaryState.meal_items,
+                lambda item, index: rx.hstack(
+                    rx.text(item["food_name"], " × ", item["qty"], " (", item["kcal"], " kcal)"),
+                    rx.button("Remove", size="1", variant="ghost", on_click=SummaryState.remove_from_meal(index)),
+                ),
+            ),
+            rx.button("Log meal", on_click=SummaryState.log_meal_entries, color_scheme="teal"),
+            align_items="flex-start",
+        ),
+        rx.fragment(),
+    )
+
+
 def exercise_form() -> rx.Component:
     return card(
         rx.vstack(
             rx.heading("Add Exercise", size="4"),
             rx.select(
                 items=EXERCISE_TYPES,
-                value=AppState.exercise_type,
-                on_change=AppState.set_exercise_type,
+                value=SummaryState.exercise_type,
+                on_change=SummaryState.set_exercise_type,
             ),
-            rx.input(type_="time", value=AppState.exercise_start, on_change=AppState.set_exercise_start),
-            rx.input(type_="time", value=AppState.exercise_end, on_change=AppState.set_exercise_end),
-            rx.button("Log exercise", on_click=AppState.log_exercise_entry, color_scheme="purple"),
+            rx.input(type_="time", value=SummaryState.exercise_start, on_change=SummaryState.set_exercise_start),
+            rx.input(type_="time", value=SummaryState.exercise_end, on_change=SummaryState.set_exercise_end),
+            rx.button("Log exercise", on_click=SummaryState.log_exercise_entry, color_scheme="purple"),
         ),
         padding="1rem",
     )
@@ -223,8 +386,8 @@ def weight_form() -> rx.Component:
     return card(
         rx.vstack(
             rx.heading("Log Weight", size="4"),
-            rx.input(type_="number", value=AppState.weight_value, on_change=AppState.update_weight_value),
-            rx.button("Log weight", on_click=AppState.log_weight_entry, color_scheme="orange"),
+            committed_input(WeightState.weight_value, WeightState.update_weight_value, id="weight_value", type_="number"),
+            rx.button("Log weight", on_click=WeightState.log_weight_entry, color_scheme="orange"),
         ),
         padding="1rem",
     )
@@ -232,10 +395,15 @@ def weight_form() -> rx.Component:
 
 def food_table() -> rx.Component:
     return rx.cond(
-        AppState.summary_food_log != [],
+        SummaryState.summary_food_log != [],
         card(
             rx.vstack(
-            rx.heading("Today's Food", size="3"),
+                rx.hstack(
+                    rx.heading("Today's Food", size="3"),
+                    rx.spacer(),
+                    rx.button("Clear day", size="1", variant="outline", on_click=SummaryState.clear_day_food),
+                    width="100%",
+                ),
                 rx.table.root(
                     rx.table.header(
                         rx.table.row(
@@ -250,7 +418,7 @@ def food_table() -> rx.Component:
                     ),
                     rx.table.body(
                         rx.foreach(
-                            AppState.summary_food_log,
+                            SummaryState.summary_food_log,
                             lambda row: rx.table.row(
                                 rx.table.cell(row["food"]),
                                 rx.table.cell(row["qty"]),
@@ -259,10 +427,14 @@ def food_table() -> rx.Component:
                                 rx.table.cell(row["fat"]),
                                 rx.table.cell(row["carbs"]),
                                 rx.table.cell(
-                                    rx.button(
-                                        "Delete",
-                                        size="1",
-                                        on_click=lambda: AppState.delete_food_entry(row["id"]),
+                                    rx.cond(
+                                        row["archived"],
+                                        rx.text("Archived", size="1", color_scheme="gray"),
+                                        rx.button(
+                                            "Delete",
+                                            size="1",
+                                            on_click=lambda: SummaryState.delete_food_entry(row["id"]),
+                                        ),
                                     )
                                 ),
                             ),
@@ -277,7 +449,7 @@ def food_table() -> rx.Component:
 
 def exercise_table() -> rx.Component:
     return rx.cond(
-        AppState.summary_exercise_log != [],
+        SummaryState.summary_exercise_log != [],
         card(
             rx.vstack(
                 rx.heading("Today's Exercise", size="3"),
@@ -292,16 +464,20 @@ def exercise_table() -> rx.Component:
                     ),
                     rx.table.body(
                         rx.foreach(
-                            AppState.summary_exercise_log,
+                            SummaryState.summary_exercise_log,
                             lambda row: rx.table.row(
                                 rx.table.cell(row["type"]),
                                 rx.table.cell(row["mins"]),
                                 rx.table.cell(row["kcal_burn"]),
                                 rx.table.cell(
-                                    rx.button(
-                                        "Delete",
-                                        size="1",
-                                        on_click=lambda: AppState.delete_exercise_entry(row["id"]),
+                                    rx.cond(
+                                        row["archived"],
+                                        rx.text("Archived", size="1", color_scheme="gray"),
+                                        rx.button(
+                                            "Delete",
+                                            size="1",
+                                            on_click=lambda: SummaryState.delete_exercise_entry(row["id"]),
+                                        ),
                                     )
                                 ),
                             ),
@@ -314,10 +490,42 @@ def exercise_table() -> rx.Component:
     )
 
 
+def weight_chart() -> rx.Component:
+    return card(
+        rx.vstack(
+            rx.hstack(
+                rx.heading("Weight History", size="4"),
+                rx.spacer(),
+                rx.select.root(
+                    rx.select.trigger(),
+                    rx.select.content(
+                        *[rx.select.item(label, value=value) for value, label in WEIGHT_RANGES],
+                    ),
+                    value=WeightState.weight_range,
+                    on_change=WeightState.set_weight_range,
+                ),
+                width="100%",
+            ),
+            rx.recharts.line_chart(
+                rx.recharts.line(data_key="weight", dot=False),
+                rx.recharts.x_axis(data_key="date"),
+                rx.recharts.y_axis(domain=["auto", "auto"]),
+                rx.recharts.graphing_tooltip(),
+                data=WeightState.weight_history,
+                width="100%",
+                height=300,
+            ),
+            rx.text(WeightState.weight_total_points, " weigh-ins in range", color="gray.600"),
+            width="100%",
+        ),
+        width="100%",
+    )
+
+
 def weight_history_table() -> rx.Component:
     return card(
         rx.vstack(
-            rx.heading("Weight History", size="4"),
+            rx.heading("Weigh-ins", size="4"),
             rx.table.root(
                 rx.table.header(
                     rx.table.row(
@@ -327,7 +535,7 @@ def weight_history_table() -> rx.Component:
                 ),
                 rx.table.body(
                     rx.foreach(
-                        AppState.weight_history,
+                        WeightState.weight_history,
                         lambda row: rx.table.row(
                             rx.table.cell(row["date"]),
                             rx.table.cell(row["weight"]),
@@ -357,7 +565,7 @@ def food_db_table() -> rx.Component:
                 ),
                 rx.table.body(
                     rx.foreach(
-                        AppState.food_items,
+                        CatalogState.food_items,
                         lambda item: rx.table.row(
                             rx.table.cell(item["name"]),
                             rx.table.cell(item["measure"]),
@@ -371,7 +579,7 @@ def food_db_table() -> rx.Component:
                                     rx.button(
                                         "Delete",
                                         size="1",
-                                        on_click=lambda: AppState.delete_food_template(item["id"]),
+                                        on_click=lambda: CatalogState.delete_food_template(item["id"]),
                                     ),
                                     rx.badge("Global", color_scheme="purple"),
                                 )
@@ -388,9 +596,9 @@ def today_tab() -> rx.Component:
     return rx.vstack(
         rx.hstack(
             rx.heading("Daily Log"),
-            rx.text(AppState.today_date),
+            rx.text(SummaryState.today_date),
             rx.spacer(),
-            rx.input(type_="date", value=AppState.today_date, on_change=AppState.set_today, width="200px"),
+            rx.input(type_="date", value=SummaryState.today_date, on_change=SummaryState.set_today, width="200px"),
         ),
         summary_section(),
         rx.flex(
@@ -410,22 +618,121 @@ def today_tab() -> rx.Component:
     )
 
 
+def trends_table() -> rx.Component:
+    return card(
+        rx.vstack(
+            rx.heading("Trends", size="4"),
+            rx.table.root(
+                rx.table.header(
+                    rx.table.row(
+                        rx.table.column_header_cell("Period"),
+                        rx.table.column_header_cell("Days"),
+                        rx.table.column_header_cell("Avg intake"),
+                        rx.table.column_header_cell("Avg burn"),
+                        rx.table.column_header_cell("Avg deficit"),
+                        rx.table.column_header_cell("Total intake"),
+                        rx.table.column_header_cell("Total deficit"),
+                    )
+                ),
+                rx.table.body(
+                    rx.foreach(
+                        TrendsState.trend_buckets,
+                        lambda row: rx.table.row(
+                            rx.table.cell(row["period_start"]),
+                            rx.table.cell(row["days_logged"]),
+                            rx.table.cell(row["intake_avg"]),
+                            rx.table.cell(row["burn_avg"]),
+                            rx.table.cell(row["deficit_avg"]),
+                            rx.table.cell(row["intake_total"]),
+                            rx.table.cell(row["deficit_total"]),
+                        ),
+                    )
+                ),
+            ),
+        )
+    )
+
+
+def trends_tab() -> rx.Component:
+    return rx.vstack(
+        rx.hstack(
+            rx.input(type_="date", value=TrendsState.trend_start, on_change=TrendsState.set_trend_start, width="200px"),
+            rx.input(type_="date", value=TrendsState.trend_end, on_change=TrendsState.set_trend_end, width="200px"),
+            rx.select(
+                items=TREND_PERIODS,
+                value=TrendsState.trend_period,
+                on_change=TrendsState.set_trend_period,
+            ),
+            rx.button("Refresh", on_click=TrendsState.load_trends),
+        ),
+        rx.flex(
+            metric_card("Avg intake", rx.text(TrendsState.trend_avg_intake, font_size="2xl", font_weight="bold"), "kcal/day"),
+            metric_card("Avg burn", rx.text(TrendsState.trend_avg_burn, font_size="2xl", font_weight="bold"), "kcal/day"),
+            metric_card("Avg deficit", rx.text(TrendsState.trend_avg_deficit, font_size="2xl", font_weight="bold"), "kcal/day"),
+            metric_card("Current streak", rx.text(TrendsState.trend_current_streak, font_size="2xl", font_weight="bold"), "days"),
+            metric_card("Longest streak", rx.text(TrendsState.trend_longest_streak, font_size="2xl", font_weight="bold"), "days"),
+            gap="1rem",
+            wrap="wrap",
+        ),
+        trends_table(),
+        spacing="4",
+    )
+
+
 def weight_tab() -> rx.Component:
-    return rx.vstack(weight_form(), weight_history_table(), spacing="4")
+    return rx.vstack(weight_form(), weight_chart(), weight_history_table(), spacing="4")
+
+
+def recipe_form() -> rx.Component:
+    return card(
+        rx.vstack(
+            rx.heading("New Recipe", size="4"),
+            rx.input(placeholder="Recipe name", value=CatalogState.recipe_name, on_change=CatalogState.set_recipe_name),
+            rx.hstack(
+                rx.text("Servings"),
+                rx.input(type_="number", value=CatalogState.recipe_servings, on_change=CatalogState.update_recipe_servings),
+            ),
+            rx.hstack(
+                rx.select.root(
+                    rx.select.trigger(placeholder="Ingredient"),
+                    rx.select.content(
+                        rx.foreach(
+                            CatalogState.food_items,
+                            lambda item: rx.select.item(item["name"], value=item["value"]),
+                        ),
+                    ),
+                    value=CatalogState.recipe_choice,
+                    on_change=CatalogState.set_recipe_choice,
+                ),
+                rx.input(type_="number", placeholder="Qty", value=CatalogState.recipe_qty, on_change=CatalogState.update_recipe_qty),
+                rx.button("Add ingredient", on_click=CatalogState.add_recipe_ingredient, variant="outline"),
+            ),
+            rx.foreach(
+                CatalogState.recipe_ingredients,
+                lambda item, index: rx.hstack(
+                    rx.text(item["name"], " × ", item["qty"], " (", item["kcal"], " kcal)"),
+                    rx.button("Remove", size="1", variant="ghost", on_click=CatalogState.remove_recipe_ingredient(index)),
+                ),
+            ),
+            rx.button("Save recipe", on_click=CatalogState.save_recipe_item, color_scheme="green"),
+            align_items="flex-start",
+        )
+    )
 
 
 def food_db_tab() -> rx.Component:
     return rx.vstack(
         food_db_table(),
+        recipe_form(),
         rx.hstack(
             rx.button(
                 "Save personal template",
-                on_click=lambda: AppState.add_custom_food_item(False),
+                on_click=lambda: CatalogState.add_custom_food_item(False),
             ),
             rx.button(
                 "Save global template",
                 variant="outline",
-                on_click=lambda: AppState.add_custom_food_item(True),
+                on_click=lambda: CatalogState.add_custom_food_item(True),
                 is_disabled=AppState.user_id == None,
             ),
         ),
@@ -453,17 +760,19 @@ def dashboard_view() -> rx.Component:
             rx.heading("Weight Tracker", size="5"),
             rx.spacer(),
             rx.text(f"Logged in as {AppState.username}"),
-            rx.button("Logout", on_click=AppState.logout),
+            rx.button("Logout", on_click=AuthState.logout),
         ),
         message_center(),
         rx.tabs.root(
             rx.tabs.list(
                 rx.tabs.trigger("Today", value="today"),
                 rx.tabs.trigger("Weight", value="weight"),
+                rx.tabs.trigger("Trends", value="trends"),
                 rx.tabs.trigger("Food DB", value="fooddb"),
             ),
             rx.tabs.content(today_tab(), value="today"),
             rx.tabs.content(weight_tab(), value="weight"),
+            rx.tabs.content(trends_tab(), value="trends"),
             rx.tabs.content(food_db_tab(), value="fooddb"),
             default_value="today",
         ),
@@ -480,16 +789,16 @@ def auth_view() -> rx.Component:
                 rx.hstack(
                     rx.button(
                         "Login",
-                        on_click=lambda: AppState.set_auth_mode("login"),
+                        on_click=lambda: AuthState.set_auth_mode("login"),
                         variant="solid",
                     ),
                     rx.button(
                         "Register",
-                        on_click=lambda: AppState.set_auth_mode("register"),
+                        on_click=lambda: AuthState.set_auth_mode("register"),
                         variant="outline",
                     ),
                 ),
-                rx.cond(AppState.auth_mode == "login", login_form(), register_form()),
+                rx.cond(AuthState.auth_mode == "login", login_form(), register_form()),
                 message_center(),
             ),
             padding="2rem",
@@ -501,14 +810,14 @@ def auth_view() -> rx.Component:
 
 def login_form() -> rx.Component:
     return rx.vstack(
-        rx.input(placeholder="Username", value=AppState.login_username, on_change=AppState.set_login_username),
+        rx.input(placeholder="Username", value=AuthState.login_username, on_change=AuthState.set_login_username),
         rx.input(
             placeholder="Password",
-            value=AppState.login_password,
-            on_change=AppState.set_login_password,
+            value=AuthState.login_password,
+            on_change=AuthState.set_login_password,
             type_="password",
         ),
-        rx.button("Login", on_click=AppState.login, width="100%", color_scheme="blue"),
+        rx.button("Login", on_click=AuthState.login, width="100%", color_scheme="blue"),
     )
 
 
@@ -516,27 +825,29 @@ def register_form() -> rx.Component:
     return rx.vstack(
         rx.input(
             placeholder="Username",
-            value=AppState.register_username,
-            on_change=AppState.set_register_username,
+            value=AuthState.register_username,
+            on_change=AuthState.set_register_username,
         ),
         rx.input(
             placeholder="Password",
-            value=AppState.register_password,
-            on_change=AppState.set_register_password,
+            value=AuthState.register_password,
+            on_change=AuthState.set_register_password,
             type_="password",
         ),
         rx.input(
             placeholder="Confirm Password",
-            value=AppState.register_confirm,
-            on_change=AppState.set_register_confirm,
+            value=AuthState.register_confirm,
+            on_change=AuthState.set_register_confirm,
             type_="password",
         ),
-        rx.button("Create account", on_click=AppState.register, width="100%", color_scheme="green"),
+        rx.button("Create account", on_click=AuthState.register, width="100%", color_scheme="green"),
     )
 
 
 def index() -> rx.Component:
     return rx.box(
+        # Renders nothing; declares the browser-side input drafts once for the whole page.
+        *INPUT_DRAFTS.values(),
         rx.cond(AppState.user_id, dashboard_view(), auth_view()),
         padding="2rem",
         min_height="100vh",
@@ -546,28 +857,313 @@ def index() -> rx.Component:
 
 app = rx.App(_state=AppState)
 app.add_page(index, title="Weight Tracker")
+app.add_middleware(ui_events)
+
+
+def _run_sync_script():
+    """The nightly sync from ``.github/workflows/sync.yml``, for self-hosted backends."""
+    subprocess.run(
+        [sys.executable, str(ROOT / "scripts" / "run_sync.py"), os.environ["SYNC_ENDPOINT"], os.environ["SYNC_USERNAME"]],
+        check=True,
+        timeout=300,
+    )
+
+
+if os.environ.get("WEIGHT_TRACKER_SCHEDULER", "").strip().lower() in ("1", "true", "yes", "on"):
+    # Every backend worker imports this module; only the one holding the lock runs the jobs.
+    scheduler.lock_path = DATA_DIR / "scheduler.lock"
+    scheduler.add_job("db-maintenance", optimize_databases, cron="30 3 * * *", jitter=600)
+    backup_cron = os.environ.get("WEIGHT_TRACKER_BACKUP_CRON", "0 2 * * *")
+    if backup_cron:  # set it empty to turn nightly backups off
+        scheduler.add_job("db-backup", backup_all, cron=backup_cron, jitter=600)
+    scheduler.add_job("catalog-reseed", services.seed_food_items, cron="0 4 * * *", jitter=600)
+    scheduler.add_job("sync-history-compaction", services.compact_synced_history, cron="0 5 * * *", jitter=600)
+    if ARCHIVE_AFTER_DAYS > 0:
+        scheduler.add_job("log-archival", services.archive_old_logs, cron="30 4 * * 0", jitter=600)
+    # run_sync.py posts a placeholder state that replaces the user's synced state, so the
+    # job is only registered when asked for explicitly and the script can log in.
+    if os.environ.get("WEIGHT_TRACKER_NIGHTLY_SYNC", "").strip().lower() in ("1", "true", "yes", "on"):
+        missing = [name for name in ("SYNC_ENDPOINT", "SYNC_USERNAME", "SYNC_PASSWORD") if not os.environ.get(name)]
+        if missing:
+            raise RuntimeError(f"WEIGHT_TRACKER_NIGHTLY_SYNC needs {', '.join(missing)}")
+        scheduler.add_job("nightly-sync", _run_sync_script, cron=os.environ.get("SYNC_CRON", "0 3 * * *"), jitter=300)
+    app.register_lifespan_task(scheduler.lifespan)
+
+
+def _bearer_token(authorization: Optional[str]) -> str:
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise HTTPException(status_code=401, detail="Missing bearer token", headers={"WWW-Authenticate": "Bearer"})
+    return token
+
+
+async def require_session(authorization: Optional[str] = Header(default=None)) -> TokenClaims:
+    claims = verify_token(_bearer_token(authorization))
+    if not claims:
+        raise HTTPException(status_code=401, detail="Invalid or expired token", headers={"WWW-Authenticate": "Bearer"})
+    return claims
+
+
+def _authorize(claims: TokenClaims, username: str) -> None:
+    if username.strip().lower() != claims.username:
+        raise HTTPException(status_code=403, detail="Token does not belong to this user")
+
+
+@app.api.post("/api/login")
+async def api_login(payload: LoginPayload):
+    # PBKDF2 runs once per login, off the event loop.
+    user = await run_in_threadpool(services.authenticate_user, payload.username.strip(), payload.password)
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid username or password")
+    token, claims = issue_token(user.id, user.username)
+    return FastJSONResponse({"username": user.username, "token": token, "expires_at": claims.expires_at})
+
+
+@app.api.post("/api/logout")
+async def api_logout(authorization: Optional[str] = Header(default=None)):
+    if not revoke_token(_bearer_token(authorization)):
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    return FastJSONResponse({"revoked": True})
+
+
+@app.api.get("/api/metrics")
+async def metrics():
+    return FastJSONResponse(
+        {
+            "profile_cache": services.profile_cache.stats(),
+            "series_cache": series_cache.stats(),
+            "revoked_tokens": revoked_tokens.stats(),
+            "shards": shard_router.stats(),
+            "group_commit": group_commit.stats() if group_commit is not None else None,
+            "jobs": scheduler.stats(),
+            "sync_payloads": payload_stats.stats(),
+            "ui_events": ui_events.stats(),
+            "catalog": catalog.stats(),
+        }
+    )
+
+
+@app.api.get("/api/activities")
+async def activities():
+    return FastJSONResponse(
+        {
+            category: [{"name": activity.name, "met": activity.met} for activity in items]
+            for category, items in activity_catalog.by_category().items()
+        }
+    )
+
+
+def _accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    for coding in (accept_encoding or "").split(","):
+        name, _, params = coding.partition(";")
+        if name.strip().lower() in ("gzip", "*"):
+            quality = params.replace(" ", "").lower().partition("q=")[2]
+            try:
+                return float(quality or 1) > 0
+            except ValueError:
+                return True
+    return False
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    # If-None-Match uses the weak comparison.
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+@app.api.get("/api/catalog")
+async def food_catalog(
+    since: Optional[str] = None,
+    accept_encoding: Optional[str] = Header(default=None),
+    if_none_match: Optional[str] = Header(default=None),
+):
+    """The merged global catalog (see ``catalog.py``), or with ``?since=<version>`` only the foods changed since."""
+    if since:
+        encoded = await run_in_threadpool(catalog.delta, since)
+    else:
+        encoded = await run_in_threadpool(catalog.full)
+    gzipped = _accepts_gzip(accept_encoding)
+    etag = encoded.gzip_etag if gzipped else encoded.etag
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    if gzipped:
+        headers["Content-Encoding"] = "gzip"
+    return Response(encoded.gzip_body if gzipped else encoded.body, media_type="application/json", headers=headers)
 
 
 @app.api.post("/api/sync-state")
-async def sync_state(payload: SyncPayload):
+async def sync_state(request: Request, claims: TokenClaims = Depends(require_session)):
+    """Body: ``{"username", "state"}``, read with a byte limit and checked against ``syncpayload.STATE_SCHEMA``."""
     try:
-        result = services.save_synced_state(username=payload.username, state=payload.state)
+        body = await read_body(request.stream(), request.headers.get("content-length"))
+        payload = await run_in_threadpool(parse_body, body)
+    except PayloadError as exc:
+        raise HTTPException(status_code=exc.status_code, detail=str(exc))
+    _authorize(claims, payload["username"])
+    try:
+        result = await run_in_threadpool(
+            services.save_synced_state, username=payload["username"], state=payload["state"]
+        )
     except ValueError as exc:
         raise HTTPException(status_code=400, detail=str(exc))
-    return {
-        "username": result.username,
-        "state": result.state,
-        "updated_at": result.updated_at,
-    }
+    return FastJSONResponse(result.to_dict())
+
+
+@app.api.post("/api/sync-state/merge")
+async def merge_state(request: Request, claims: TokenClaims = Depends(require_session)):
+    """Body: ``{"username", "since", "changes", "state"?}``; see ``services.merge_synced_state``."""
+    try:
+        body = await read_body(request.stream(), request.headers.get("content-length"))
+        payload = await run_in_threadpool(parse_body, body, "merge")
+    except PayloadError as exc:
+        raise HTTPException(status_code=exc.status_code, detail=str(exc))
+    _authorize(claims, payload["username"])
+    try:
+        result = await run_in_threadpool(
+            services.merge_synced_state,
+            username=payload["username"],
+            since=int(payload["since"]) if payload.get("since") is not None else None,
+            changes=payload["changes"],
+            state=payload.get("state"),
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return FastJSONResponse(result.to_dict())
+
+
+@app.api.post("/api/log-meal")
+async def log_meal(payload: MealPayload, claims: TokenClaims = Depends(require_session)):
+    _authorize(claims, payload.username)
+    try:
+        count = await run_in_threadpool(
+            services.log_meal,
+            user_id=claims.user_id,
+            entry_date=payload.date,
+            items=[item.model_dump() for item in payload.items],
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return FastJSONResponse({"username": claims.username, "date": payload.date.isoformat(), "logged": count})
+
+
+@app.api.post("/api/weight")
+async def record_weight(payload: WeightPayload, claims: TokenClaims = Depends(require_session)):
+    """Record the day's weigh-in (one per date) and update the profile weight in one transaction."""
+    _authorize(claims, payload.username)
+    try:
+        weigh_in = await run_in_threadpool(
+            services.record_weight, user_id=claims.user_id, entry_date=payload.date, weight=payload.weight
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    profile = weigh_in.profile.to_dict() if weigh_in.profile else None
+    return FastJSONResponse({"username": claims.username, **weigh_in.to_dict(), "profile": profile})
+
+
+@app.api.delete("/api/food-log/{username}/{entry_date}")
+async def clear_day(
+    username: str,
+    entry_date: date,
+    exercise: bool = False,
+    claims: TokenClaims = Depends(require_session),
+):
+    _authorize(claims, username)
+    deleted = await run_in_threadpool(services.clear_day, claims.user_id, entry_date, exercise=exercise)
+    return FastJSONResponse({"username": claims.username, "date": entry_date.isoformat(), "deleted": deleted})
+
+
+@app.api.get("/api/top-foods/{username}")
+async def top_foods(username: str, k: int = services.TOP_FOODS, claims: TokenClaims = Depends(require_session)):
+    """The user's most used foods by decayed count (see ``services.top_foods``)."""
+    _authorize(claims, username)
+    if not 0 < k <= 100:
+        raise HTTPException(status_code=400, detail="k must be between 1 and 100")
+    foods = await run_in_threadpool(services.top_foods, claims.user_id, k)
+    return FastJSONResponse({"username": claims.username, "foods": foods})
+
+
+@app.api.get("/api/weight-history/{username}")
+async def weight_history(
+    username: str,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    max_points: Optional[int] = None,
+    claims: TokenClaims = Depends(require_session),
+):
+    _authorize(claims, username)
+    try:
+        history = await run_in_threadpool(
+            services.get_weight_history, claims.user_id, start=start, end=end, max_points=max_points
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return FastJSONResponse({"username": claims.username, **history.to_dict()})
+
+
+@app.api.get("/api/logs/{username}")
+async def log_range(
+    username: str,
+    start: date,
+    end: date,
+    include_archive: bool = False,
+    claims: TokenClaims = Depends(require_session),
+):
+    """Food and exercise entries in ``start..end``; archived months only with ``include_archive=true``."""
+    _authorize(claims, username)
+    try:
+        logs = await run_in_threadpool(
+            services.get_log_range, claims.user_id, start, end, include_archive=include_archive
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return FastJSONResponse({"username": claims.username, "start": start.isoformat(), "end": end.isoformat(), **logs})
+
+
+@app.api.get("/api/export/{username}")
+async def export_account(username: str, claims: TokenClaims = Depends(require_session)):
+    """Everything stored for the user as JSON Lines, streamed (see ``accounts.iter_export``)."""
+    _authorize(claims, username)
+    return StreamingResponse(
+        iter_export(claims.user_id, claims.username),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{claims.username}-export.jsonl"'},
+    )
+
+
+@app.api.post("/api/account/delete")
+async def delete_account(payload: AccountDeletePayload, claims: TokenClaims = Depends(require_session)):
+    """Delete the account and all its data; the password is asked again. Fetch ``/api/export`` first to keep a copy."""
+    _authorize(claims, payload.username)
+    user = await run_in_threadpool(services.authenticate_user, claims.username, payload.password)
+    if not user or user.id != claims.user_id:
+        raise HTTPException(status_code=401, detail="Invalid username or password")
+    try:
+        deleted = await run_in_threadpool(services.delete_account, claims.username)
+    except ValueError as exc:
+        raise HTTPException(status_code=404, detail=str(exc))
+    return FastJSONResponse({"username": claims.username, "deleted": deleted})
+
+
+@app.api.get("/api/sync-state/{username}/versions")
+async def state_versions(username: str, claims: TokenClaims = Depends(require_session)):
+    _authorize(claims, username)
+    versions = await run_in_threadpool(services.list_synced_state_versions, username)
+    return FastJSONResponse({"username": claims.username, "versions": versions})
 
 
 @app.api.get("/api/sync-state/{username}")
-async def load_state(username: str):
-    record = services.load_synced_state(username)
+async def load_state(username: str, at: Optional[datetime] = None, claims: TokenClaims = Depends(require_session)):
+    """The last synced state, or with ``?at=`` (ISO timestamp, UTC if no offset) the state as of that time."""
+    _authorize(claims, username)
+    if at is not None:
+        if at.tzinfo is not None:
+            at = at.astimezone(timezone.utc).replace(tzinfo=None)
+        record = await run_in_threadpool(services.load_synced_state_at, username, at)
+    else:
+        record = await run_in_threadpool(services.load_synced_state, username)
     if not record:
         raise HTTPException(status_code=404, detail="State not found")
-    return {
-        "username": record.username,
-        "state": record.state,
-        "updated_at": record.updated_at,
-    }
+    return FastJSONResponse(record.to_dict())
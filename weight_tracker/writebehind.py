@@ -0,0 +1,189 @@
+"""Group commit for the single-row log writes (opt-in).
+
+Every ``log_food``/``log_exercise``/``record_weight`` call normally runs its own
+transaction, so concurrent writers each pay a SQLite commit (and fsync) and queue
+up on the file's writer lock. With ``WEIGHT_TRACKER_GROUP_COMMIT=1`` those calls
+hand their row to :data:`group_commit` instead: one writer thread gathers rows for
+up to ``WEIGHT_TRACKER_GROUP_COMMIT_INTERVAL_MS`` or ``..._BATCH`` rows, writes each
+shard's rows with one multi-row INSERT per table in a single transaction, and only
+then releases the callers. A call still returns only once its row is committed.
+A write may bring ``after(session)``, which runs inside that same transaction
+(e.g. the food usage upsert), or be only such a function (weigh-ins).
+
+The queue holds at most ``..._MAX_PENDING`` rows; callers block when it is full.
+"""
+from __future__ import annotations
+
+import atexit
+from collections import defaultdict
+from concurrent.futures import Future
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import insert
+
+from . import db
+from .shards import router as shard_router
+
+_STOP = object()
+
+
+class GroupCommitQueue:
+    def __init__(self, flush_interval: float = 0.005, max_batch: int = 256, max_pending: int = 4096):
+        if max_batch < 1:
+            raise ValueError("max_batch must be at least 1")
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max_pending)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self.batches = 0
+        self.rows = 0
+        self.failed_rows = 0
+        self.max_batch_seen = 0
+        self.backpressure_waits = 0
+        self.commit_seconds = 0.0
+        self.max_commit_seconds = 0.0
+
+    def write(
+        self,
+        user_id: int,
+        model,
+        row: Optional[Dict[str, Any]],
+        after: Optional[Callable[[Any], Any]] = None,
+    ) -> Any:
+        """Queue ``row`` for ``model``'s table and block until it is committed; returns ``after``'s result.
+
+        Blocks the calling thread: call it from a worker thread, not the event loop.
+        """
+        return self.submit(user_id, model, row, after).result()
+
+    def submit(
+        self,
+        user_id: int,
+        model,
+        row: Optional[Dict[str, Any]],
+        after: Optional[Callable[[Any], Any]] = None,
+    ) -> Future:
+        """Queue a write; the future resolves to ``after(session)``'s result once the batch commits.
+
+        ``model``/``row`` may be None for a write that is only ``after``.
+        """
+        if self._closed:
+            raise RuntimeError("group commit queue is closed")
+        if row is None and after is None:
+            raise ValueError("Nothing to write")
+        self._ensure_started()
+        future: Future = Future()
+        item = (shard_router.shard_of(user_id), model, row, after, future)
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            with self._lock:
+                self.backpressure_waits += 1
+            self._queue.put(item)
+        return future
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Flush everything queued so far and stop the writer thread."""
+        self._closed = True
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+
+    def _ensure_started(self) -> None:
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="group-commit", daemon=True)
+                    self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            self._flush(batch)
+            if stop:
+                return
+
+    def _flush(self, batch: List[Tuple[str, Any, Any, Any, Future]]) -> None:
+        by_shard: Dict[str, List[Tuple[Any, Any, Any, Future]]] = defaultdict(list)
+        for shard, model, row, after, future in batch:
+            by_shard[shard].append((model, row, after, future))
+        for shard, items in by_shard.items():
+            started = time.perf_counter()
+            try:
+                results = self._commit(shard, items)
+            except Exception:
+                # Isolate the bad row(s): retry one transaction per row.
+                for item in items:
+                    try:
+                        (result,) = self._commit(shard, [item])
+                    except Exception as exc:
+                        with self._lock:
+                            self.failed_rows += 1
+                        item[3].set_exception(exc)
+                    else:
+                        item[3].set_result(result)
+            else:
+                for (_, _, _, future), result in zip(items, results):
+                    future.set_result(result)
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.batches += 1
+                self.rows += len(items)
+                self.max_batch_seen = max(self.max_batch_seen, len(items))
+                self.commit_seconds += elapsed
+                self.max_commit_seconds = max(self.max_commit_seconds, elapsed)
+
+    def _commit(self, shard: str, items: List[Tuple[Any, Any, Any, Future]]) -> List[Any]:
+        rows_by_model: Dict[Any, List[Dict[str, Any]]] = defaultdict(list)
+        for model, row, _, _ in items:
+            if row is not None:
+                rows_by_model[model].append(row)
+        with db.session_scope(shard_router.factory(shard)) as session:
+            for model, rows in rows_by_model.items():
+                session.execute(insert(model), rows)
+            return [after(session) if after is not None else None for _, _, after, _ in items]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "pending": self._queue.qsize(),
+                "batches": self.batches,
+                "rows": self.rows,
+                "failed_rows": self.failed_rows,
+                "avg_batch": round(self.rows / self.batches, 2) if self.batches else 0.0,
+                "max_batch": self.max_batch_seen,
+                "avg_commit_ms": round(1000 * self.commit_seconds / self.batches, 3) if self.batches else 0.0,
+                "max_commit_ms": round(1000 * self.max_commit_seconds, 3),
+                "backpressure_waits": self.backpressure_waits,
+            }
+
+
+group_commit: Optional[GroupCommitQueue] = None
+if os.environ.get("WEIGHT_TRACKER_GROUP_COMMIT", "").strip().lower() in ("1", "true", "yes", "on"):
+    group_commit = GroupCommitQueue(
+        flush_interval=float(os.environ.get("WEIGHT_TRACKER_GROUP_COMMIT_INTERVAL_MS", 5)) / 1000,
+        max_batch=int(os.environ.get("WEIGHT_TRACKER_GROUP_COMMIT_BATCH", 256)),
+        max_pending=int(os.environ.get("WEIGHT_TRACKER_GROUP_COMMIT_MAX_PENDING", 4096)),
+    )
+    atexit.register(group_commit.close, 5.0)